@@ -1,24 +1,61 @@
 import logging
 
 # gpx file parser options
-maximum_file_size = 10e+6
+gpx_chunk_size = 2 ** 16  # bytes read from file at once
+gpx_bytes_per_point = 100  # to estimate number of points from file size
+gpx_write_batch = 10000  # points formatted at once when writing
+gpx_write_buffer = 2 ** 20  # bytes of output file buffer
 
 # plot options
 max_zoom = 16
 map_size = 2  # number of tiles
 margin_outbounds = 0  # extra tiles to load
 click_distance = 0.25  # km TODO: this should be a function on zoom
-max_displayed_points = 100
+lod_tolerance = 0.5  # pixels, deviation of the simplified track
+lod_max_zoom = 22  # zoom with the highest level of detail
+split_max_fps = 60  # redraws per second while dragging the split line
+tile_cache_bytes = 256 * 2 ** 20  # memory for decoded tile images
+basemap_cache_size = 8  # composed maps kept in memory
 
 # fix elevation
 steep_distance = 0.2  # steep zone is always longer than X m
 steep_gap = 0.6  # threshold to consider a steep zone in elevation
 steep_k_moving_average = 20  # step for moving average if needed
 
+# elevation filters
+smooth_filter = 'savgol'  # moving_average, median, savgol or kalman
+smooth_window = 0.1  # km
+savgol_order = 2
+kalman_process_noise = 100  # m^2/km, variance of elevation along the track
+kalman_measurement_noise = 4  # m^2, variance of measured elevation
+
+# timing models
+naismith_ascent_rate = 600  # m/h of ascent in Naismith's rule
+max_grade = 1  # grade used by timing models is limited to +-100%
+
+# distance computation
+distance_method = 'vincenty'  # haversine, vincenty or geodesic (geopy)
+vincenty_tolerance = 1e-12  # radians, convergence threshold for lambda
+vincenty_max_iterations = 200
+
 # log options
 log_level = logging.DEBUG
 
+# tile catalog
+db_file = 'db_track_editor.sqlite'
+tile_db_batch = 500  # downloaded tiles stored in each transaction
+tile_store_file = None  # such as 'tiles.mbtiles', None for files in tiles/
+tile_disk_budget = 2 ** 30  # bytes of downloaded tiles
+
 # OSM request options
+tile_server = 'https://a.tile.openstreetmap.org'
+tile_workers = 8  # threads downloading tiles
+tile_connections = 2  # concurrent connections per host
+tile_hosts = 2  # hosts whose connection pool is kept
+tile_retries = 3  # retries of a failed request
+tile_backoff = 0.5  # s, retry after backoff * 2 ^ (retry - 1)
+tile_timeout = 10  # s, connection and read timeout
+prefetch_buffer = 0.5  # km, distance to the track of prefetched tiles
 version = "v0.8"
 email = "alguerre@outlook.com"
 tool = "TrackEditor"
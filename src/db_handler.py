@@ -1,60 +1,175 @@
 import sqlite3
 import logging
+import time
 import pandas as pd
 
+from src import constants as c
+
 pd.set_option('display.max_rows', 500)
 pd.set_option('display.max_columns', 500)
 pd.set_option('display.width', 220)
 
 LOGGER = logging.getLogger(__name__)
 
+TILES_TABLE = """CREATE TABLE IF NOT EXISTS Tiles (zoom INTEGER NOT NULL,
+                                                     x INTEGER NOT NULL,
+                                                     y INTEGER NOT NULL,
+                                                status BOOLEAN,
+                                                  path TEXT,
+                                                  size INTEGER,
+                                           last_access REAL DEFAULT 0,
+                                           PRIMARY KEY (zoom, x, y))
+                 WITHOUT ROWID
+              """
+
+UPSERT_TILE = """INSERT INTO Tiles (zoom, x, y, status, path, size,
+                                    last_access)
+                 VALUES(?, ?, ?, ?, ?, ?, ?)
+                 ON CONFLICT(zoom, x, y) DO UPDATE SET
+                     status=excluded.status,
+                     path=excluded.path,
+                     size=excluded.size,
+                     last_access=excluded.last_access
+              """
+
 
 class DbHandler:  # TODO: insert herency of DbTile dedicated class
                   # TODO: create a tile class?
-    def __init__(self):
+    def __init__(self, db_file: str = c.db_file):
+        self.db_file = db_file
         self.conn = None  # connection
         self.cur = None  # cursor
 
     def open_db(self):
-        self.conn = sqlite3.connect('db_track_editor.sqlite')
-        self.cur = self.conn.cursor()
         try:
-            self.cur.execute("""CREATE TABLE Tiles (zoom INTEGER, 
-                                                       x INTEGER, 
-                                                       y INTEGER, 
-                                                  status BOOLEAN, 
-                                                    path TEXT,
-                                                    size INTEGER)
-                             """)
-        except sqlite3.OperationalError as e:
-            if 'table Tiles already exists' in str(e):
-                LOGGER.info(e)
-            else:
-                LOGGER.error(f'Unexpected error initializing database: {e}')
-                return False
+            self.conn = sqlite3.connect(self.db_file)
+            self.cur = self.conn.cursor()
+            # Readers do not block the writer
+            self.cur.execute('PRAGMA journal_mode=WAL')
+            self.cur.execute('PRAGMA synchronous=NORMAL')
+            self._migrate_tiles()
+            self.cur.execute(TILES_TABLE)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            LOGGER.error(f'Unexpected error initializing database: {e}')
+            return False
 
         return True
 
+    def _migrate_tiles(self):
+        """
+        Tiles table of previous versions has no key, it is rebuilt with a
+        unique (zoom, x, y) key. For duplicated tiles the last row is kept.
+        Tables without access time get the column.
+        """
+        table_sql = self.cur.execute(
+            "SELECT sql FROM sqlite_master WHERE type='table' AND "
+            "name='Tiles'").fetchone()
+        if table_sql is None:
+            return
+
+        if 'PRIMARY KEY' not in table_sql[0]:
+            LOGGER.info('Migrating Tiles table to keyed table')
+            self.cur.execute('ALTER TABLE Tiles RENAME TO Tiles_old')
+            self.cur.execute(TILES_TABLE)
+            self.cur.execute("""INSERT OR REPLACE INTO Tiles
+                                (zoom, x, y, status, path, size)
+                                SELECT zoom, x, y, status, path, size
+                                FROM Tiles_old ORDER BY rowid""")
+            self.cur.execute('DROP TABLE Tiles_old')
+        elif 'last_access' not in table_sql[0]:
+            self.cur.execute(
+                'ALTER TABLE Tiles ADD COLUMN last_access REAL DEFAULT 0')
+
     def close_db(self):
-        self.cur.close()
+        if self.cur:
+            self.cur.close()
+        if self.conn:
+            self.conn.close()
+        self.cur = None
+        self.conn = None
 
     def insert_tile(self, zoom: int, xtile: int, ytile: int, status: bool,
                     path: str, size: int):
+        return self.insert_tiles([(zoom, xtile, ytile, status, path, size)])
+
+    def insert_tiles(self, tiles: list) -> bool:
+        """
+        Insert or update a batch of tiles in a single transaction, access
+        time is set to current time.
+        :param tiles: list of (zoom, x, y, status, path, size)
+        :return: True if tiles are stored
+        """
         if not self.cur or not self.conn:
             LOGGER.error('No connection with data base')
             return False  # not connected
 
-        if not status:
-            size = 0
+        now = time.time()
+        with self.conn:  # commit once
+            self.cur.executemany(
+                UPSERT_TILE,
+                [(zoom, x, y, status, path, size if status else 0, now)
+                 for zoom, x, y, status, path, size in tiles])
 
-        if not self._tile_exists(zoom, xtile, ytile):
-            query = f"""INSERT OR IGNORE INTO Tiles 
-                        (zoom, x, y, status, path, size) 
-                        VALUES(?, ?, ?, ?, ?, ?)
-                    """
-            self.cur.execute(query, (zoom, xtile, ytile, status, path, size))
-            self.conn.commit()
+        return True
+
+    def touch_tiles(self, tiles: list) -> bool:
+        """
+        Set access time of a batch of tiles to current time.
+        :param tiles: list of (zoom, x, y)
+        :return: True if tiles are updated
+        """
+        if not self.cur or not self.conn:
+            LOGGER.error('No connection with data base')
+            return False  # not connected
 
+        now = time.time()
+        with self.conn:  # commit once
+            self.cur.executemany(
+                'UPDATE Tiles SET last_access=? WHERE zoom=? AND x=? AND y=?',
+                [(now, zoom, x, y) for zoom, x, y in tiles])
+        return True
+
+    def get_tiles_by_access(self, limit: int = -1) -> list:
+        """
+        Least recently used tiles first.
+        :param limit: maximum number of tiles, all of them by default
+        :return: list of (zoom, x, y, path, size)
+        """
+        if not self.cur or not self.conn:
+            LOGGER.error('No connection with data base')
+            return []  # not connected
+
+        query = """SELECT zoom, x, y, path, size FROM Tiles
+                   ORDER BY last_access, zoom DESC LIMIT ?"""
+        return self.cur.execute(query, (limit,)).fetchall()
+
+    def get_size_by_zoom(self) -> dict:
+        """
+        :return: dictionary as {zoom: (number of tiles, bytes)}
+        """
+        if not self.cur or not self.conn:
+            LOGGER.error('No connection with data base')
+            return {}  # not connected
+
+        query = """SELECT zoom, COUNT(*), COALESCE(SUM(size), 0) FROM Tiles
+                   GROUP BY zoom ORDER BY zoom"""
+        return {zoom: (count, size)
+                for zoom, count, size in self.cur.execute(query)}
+
+    def remove_tiles(self, tiles: list) -> bool:
+        """
+        Remove a batch of tiles in a single transaction.
+        :param tiles: list of (zoom, x, y)
+        :return: True if tiles are removed
+        """
+        if not self.cur or not self.conn:
+            LOGGER.error('No connection with data base')
+            return False  # not connected
+
+        with self.conn:  # commit once
+            self.cur.executemany(
+                'DELETE FROM Tiles WHERE zoom=? AND x=? AND y=?', tiles)
         return True
 
     def clean_tiles(self):
@@ -63,20 +178,30 @@ class DbHandler:  # TODO: insert herency of DbTile dedicated class
 
     def update_tile_status(self, zoom: int, xtile: int, ytile: int,
                            status: bool, size: int) -> bool:
+        return self.update_tiles_status([(zoom, xtile, ytile, status, size)])
+
+    def update_tiles_status(self, tiles: list) -> bool:
+        """
+        Update status and size of a batch of tiles in a single transaction.
+        :param tiles: list of (zoom, x, y, status, size)
+        :return: True if tiles are updated
+        """
         if not self.cur or not self.conn:
             LOGGER.error('No connection with data base')
             return False  # not connected
 
-        query = f"""UPDATE Tiles SET 
+        query = """UPDATE Tiles SET
                         status=?,
-                        size=? 
-                    WHERE 
-                        x=? AND 
-                        y=? AND 
-                        zoom=?
+                        size=?
+                    WHERE
+                        zoom=? AND
+                        x=? AND
+                        y=?
                 """
-        self.cur.execute(query, (status, size, xtile, ytile, zoom))
-        self.conn.commit()
+        with self.conn:  # commit once
+            self.cur.executemany(
+                query, [(status, size, zoom, x, y)
+                        for zoom, x, y, status, size in tiles])
         return True
 
     def print_tiles(self, verbose=True) -> pd.DataFrame:
@@ -98,35 +223,57 @@ class DbHandler:  # TODO: insert herency of DbTile dedicated class
             return pd.DataFrame()
 
     def get_tile_size(self, zoom: int, xtile: int, ytile: int) -> int:
-        if self._tile_exists(zoom, xtile, ytile):
-            query = 'SELECT size FROM Tiles WHERE zoom=? AND x=? AND y=?'
-            size_query = self.cur.execute(query, (zoom, xtile, ytile))
-            size = size_query.fetchone()[0]
-            return size
-        else:
-            return 0
+        return self._get_tile_field('size', zoom, xtile, ytile)
 
     def get_tile_status(self, zoom: int, xtile: int, ytile: int) -> int:
-        if self._tile_exists(zoom, xtile, ytile):
-            query = 'SELECT status FROM Tiles WHERE zoom=? AND x=? AND y=?'
-            status_query = self.cur.execute(query, (zoom, xtile, ytile))
-            status = status_query.fetchone()[0]
-            return status
-        else:
-            return 0
+        return self._get_tile_field('status', zoom, xtile, ytile)
+
+    def get_tiles_size(self, tiles: list) -> dict:
+        """
+        Size of a batch of tiles with a single query.
+        :param tiles: list of (zoom, x, y)
+        :return: dictionary as {(zoom, x, y): size}, missing tiles are not
+            included
+        """
+        if not self.cur or not self.conn or not tiles:
+            return {}
+
+        sizes = {}
+        tiles = list(tiles)
+        batch = 300  # 3 parameters per tile, limit is 999 in old sqlite
+        for i in range(0, len(tiles), batch):
+            chunk = tiles[i:i + batch]
+            values = ', '.join(['(?, ?, ?)'] * len(chunk))
+            query = f"""SELECT zoom, x, y, size FROM Tiles
+                        WHERE (zoom, x, y) IN (VALUES {values})"""
+            rows = self.cur.execute(
+                query, [value for tile in chunk for value in tile])
+            sizes.update({(zoom, x, y): size for zoom, x, y, size in rows})
+        return sizes
+
+    def _get_tile_field(self, field: str, zoom: int, xtile: int,
+                        ytile: int) -> int:
+        if not self.cur or not self.conn:
+            LOGGER.error('No connection with data base')
+            return 0  # not connected
+
+        query = f'SELECT {field} FROM Tiles WHERE zoom=? AND x=? AND y=?'
+        row = self.cur.execute(query, (zoom, xtile, ytile)).fetchone()
+        return row[0] if row else 0
 
     def remove_tile(self, zoom: int, xtile: int, ytile: int) -> bool:
         if not self.cur or not self.conn:
             LOGGER.error('No connection with data base')
             return False  # not connected
 
-        if self._tile_exists(zoom, xtile, ytile):
-            query = 'DELETE FROM Tiles WHERE zoom=? AND x=? and y=?'
+        query = 'DELETE FROM Tiles WHERE zoom=? AND x=? and y=?'
+        with self.conn:
             self.cur.execute(query, (zoom, xtile, ytile))
+        if self.cur.rowcount > 0:
             return True
         else:
-            LOGGER.warning(f'Trying to remove non-existing tile: ' +
-                           f'({zoom},{xtile},{ytile})')
+            LOGGER.debug(f'Trying to remove non-existing tile: ' +
+                         f'({zoom},{xtile},{ytile})')
             return False
 
     def _tile_exists(self, zoom: int, xtile: int, ytile: int) -> bool:
@@ -134,16 +281,6 @@ class DbHandler:  # TODO: insert herency of DbTile dedicated class
             LOGGER.error('No connection with data base')
             return False  # not connected
 
-        query = 'SELECT COUNT(*) FROM Tiles WHERE zoom=? AND x=? AND y=?'
-        elements = self.cur.execute(query, (zoom, xtile, ytile))
-        count = elements.fetchone()[0]
-        if count == 1:
-            return True
-        elif count > 1:
-            LOGGER.error(
-                f'More than one coincidence for tile ({zoom},{xtile},{ytile})')
-            return True
-        else:
-            LOGGER.warning(
-                f'Input tile ({zoom},{xtile},{ytile}) is already in  db.')
-            return False
+        query = 'SELECT 1 FROM Tiles WHERE zoom=? AND x=? AND y=?'
+        return self.cur.execute(query, (zoom, xtile, ytile)).fetchone() \
+            is not None
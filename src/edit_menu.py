@@ -9,8 +9,12 @@ import pandas as pd
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib.widgets as widgets
 
+import src.constants as c
 import src.utils as utils
+import src.timing as timing
+import src.elevation_filters as elevation_filters
 import src.plots as plots
+import src.render as render
 from src.split_segment import SplitSegment as SplitSegmentCallback
 
 
@@ -28,6 +32,7 @@ class EditMenu(tk.Menu):
         tk.Menu.__init__(self, parent)
         self.controller = controller  # self from parent class
         self.parent = parent
+        self.split_interaction = None  # split tool in use
 
         # Define menu
         self.editmenu = tk.Menu(parent, tearoff=0)
@@ -37,6 +42,8 @@ class EditMenu(tk.Menu):
                                   command=self.insert_time)
         self.editmenu.add_command(label='Fix elevation',
                                   command=self.fix_elevation)
+        self.editmenu.add_command(label='Smooth elevation',
+                                  command=self.smooth_elevation)
         self.editmenu.add_command(label='Split segment',
                                   command=self.split_segment)
         self.editmenu.add_command(label='Remove segment',
@@ -61,14 +68,10 @@ class EditMenu(tk.Menu):
             self.controller.shared_data.obj_track.reverse_segment(segment_idx)
 
             # Update plot
-            plots.plot_track_info(
-                self.controller.shared_data.obj_track,
-                self.controller.shared_data.ax_track_info)
-
-            plots.plot_elevation(self.controller.shared_data.obj_track,
-                                 self.controller.shared_data.ax_ele)
-
-            self.controller.shared_data.canvas.draw()
+            scheduler = self.controller.shared_data.scheduler
+            scheduler.invalidate(render.ELEVATION, render.INFO,
+                                 segments=[segment_idx])
+            scheduler.flush()
 
         elif len(selected_segment) > 1:
             messagebox.showerror('Warning',
@@ -143,6 +146,16 @@ class EditMenu(tk.Menu):
         lbl_label.grid(row=i, column=0, pady=10)
         spn_speed.grid(row=i, column=1)
 
+        # Insert speed model
+        i += 1
+        top.rowconfigure(i, weight=1, minsize=50)
+        var_model = tk.StringVar(top)
+        var_model.set('constant')
+        opt_model = tk.OptionMenu(frm_form, var_model, *timing.MODELS)
+        lbl_label = tk.Label(master=frm_form, text='speed model', anchor='w')
+        lbl_label.grid(row=i, column=0, pady=10)
+        opt_model.grid(row=i, column=1)
+
         def insert_timestamp():
             """
             Check input data and insert timestamp
@@ -160,7 +173,8 @@ class EditMenu(tk.Menu):
 
                 # Insert timestamp
                 self.controller.shared_data.obj_track.\
-                    insert_timestamp(self.timestamp, self.speed)
+                    insert_timestamp(self.timestamp, self.speed,
+                                     model=var_model.get())
                 top.destroy()
 
             except (ValueError, OverflowError) as e:
@@ -172,6 +186,7 @@ class EditMenu(tk.Menu):
                 spn_time[s].insert(0, spinbox_options[s][2])
             spn_speed.delete(0, 8)
             spn_speed.insert(0, 0)
+            var_model.set('constant')
 
         # Button frame
         frm_button = tk.Frame(top)
@@ -196,22 +211,73 @@ class EditMenu(tk.Menu):
             segment_idx = selected_segment[0]
             self.controller.shared_data.obj_track.fix_elevation(segment_idx)
 
-            # Update plot
-            plots.plot_track_info(
-                self.controller.shared_data.obj_track,
-                self.controller.shared_data.ax_track_info)
+            # Update plot, the map is not modified
+            scheduler = self.controller.shared_data.scheduler
+            scheduler.invalidate(render.ELEVATION, render.INFO)
+            scheduler.flush()
 
-            plots.plot_elevation(self.controller.shared_data.obj_track,
-                                 self.controller.shared_data.ax_ele)
+        elif len(selected_segment) > 1:
+            messagebox.showerror('Warning',
+                                 'More than one segment is selected')
+        elif len(selected_segment) == 0:
+            messagebox.showerror('Warning',
+                                 'No segment is selected')
 
-            self.controller.shared_data.canvas.draw()
+    def smooth_elevation(self):
+        """
+        Apply an elevation filter on the selected segment. Open a new window
+        to choose the filter, uphill and downhill of the track with each
+        filter are shown.
+        """
+        obj_track = self.controller.shared_data.obj_track
+        selected_segment = obj_track.selected_segment_idx
 
-        elif len(selected_segment) > 1:
+        if len(selected_segment) > 1:
             messagebox.showerror('Warning',
                                  'More than one segment is selected')
+            return
         elif len(selected_segment) == 0:
             messagebox.showerror('Warning',
                                  'No segment is selected')
+            return
+
+        top = tk.Toplevel()
+        top.title('Smooth Elevation Assistant')
+        frm_form = tk.Frame(top, relief=tk.FLAT, borderwidth=3)
+        frm_form.pack()
+
+        # Gain and loss report
+        report = obj_track.compare_elevation_filters()
+        for i, (method, (uphill, downhill)) in enumerate(report.items()):
+            tk.Label(master=frm_form, text=method, anchor='w').\
+                grid(row=i, column=0, sticky='w')
+            tk.Label(master=frm_form,
+                     text=f'{uphill:.0f} m / {downhill:.0f} m',
+                     anchor='e').grid(row=i, column=1, sticky='e')
+
+        # Filter selection
+        i = len(report)
+        var_method = tk.StringVar(top)
+        var_method.set(c.smooth_filter)
+        opt_method = tk.OptionMenu(frm_form, var_method,
+                                   *elevation_filters.FILTERS)
+        lbl_label = tk.Label(master=frm_form, text='filter', anchor='w')
+        lbl_label.grid(row=i, column=0, pady=10)
+        opt_method.grid(row=i, column=1)
+
+        def apply_filter():
+            obj_track.smooth_elevation(selected_segment[0],
+                                       method=var_method.get())
+            top.destroy()
+
+            # Update plot, the map is not modified
+            scheduler = self.controller.shared_data.scheduler
+            scheduler.invalidate(render.ELEVATION, render.INFO)
+            scheduler.flush()
+
+        btn_submit = tk.Button(master=top, text='Submit',
+                               command=apply_filter)
+        btn_submit.pack(side=tk.RIGHT, padx=10, pady=5)
 
     def remove_segment(self):
         selected_segment = \
@@ -228,25 +294,16 @@ class EditMenu(tk.Menu):
                 size = self.controller.shared_data.obj_track.remove_segment(
                     segment_idx)
 
-                # Update plot
-                if size > 0:
-                    plots.plot_track_info(
-                        self.controller.shared_data.obj_track,
-                        self.controller.shared_data.ax_track_info)
-
-                    plots.plot_elevation(self.controller.shared_data.obj_track,
-                                         self.controller.shared_data.ax_ele)
-                    plots.plot_track(self.controller.shared_data.obj_track,
-                                     self.controller.shared_data.ax_track)
-                else:
-                    plots.plot_world(self.controller.shared_data.ax_track)
-                    plots.plot_no_elevation(self.controller.shared_data.ax_ele)
-                    plots.plot_no_info(
-                        self.controller.shared_data.ax_track_info)
+                # Update plot, the map is plotted again only if its
+                # extremes change
+                scheduler = self.controller.shared_data.scheduler
+                scheduler.invalidate(render.ELEVATION, render.INFO,
+                                     segments=[segment_idx])
+                scheduler.flush()
+                if size <= 0:
                     tk.messagebox.showwarning(
                         title='No segment',
                         message='Last segment has been removed.')
-                self.controller.shared_data.canvas.draw()
 
         elif len(selected_segment) > 1:
             messagebox.showerror('Warning',
@@ -273,12 +330,17 @@ class EditMenu(tk.Menu):
             df_segment = \
                 self.controller.shared_data.obj_track.get_segment(segment_idx)
 
+        # Previous split tool is closed, otherwise its done callback would
+        # divide its segment too
+        if self.split_interaction is not None:
+            self.split_interaction.close()
+
         # Create plot
-        interaction = SplitSegmentCallback(
+        self.split_interaction = SplitSegmentCallback(
             self.controller.shared_data,
             df_segment)
 
-        interaction.connect()
+        self.split_interaction.connect()
 
     def change_order(self):
         """
@@ -302,7 +364,7 @@ class EditMenu(tk.Menu):
         spn_seg = collections.defaultdict()
 
         available_segments = \
-            self.controller.shared_data.obj_track.df_track.segment.unique()
+            self.controller.shared_data.obj_track.segment_ids
 
         for i, entry in enumerate(available_segments):
             # This allow resize the window
@@ -312,7 +374,8 @@ class EditMenu(tk.Menu):
             # Create widgets
             var = tk.StringVar(top)
             var.set(i+1)
-            color = plots.rgb2hexcolor(plots.color_rgb(plots.COLOR_LIST[i]))
+            color = plots.rgb2hexcolor(
+                plots.color_rgb(plots.segment_color(i)))
 
             spn_seg[entry] = tk.Spinbox(from_=1,
                                         to=99,
@@ -362,15 +425,11 @@ class EditMenu(tk.Menu):
                 self.controller.shared_data.obj_track.change_order(new_order)
                 top.destroy()
 
-                # Update plots
-                plots.plot_elevation(self.controller.shared_data.obj_track,
-                                     self.controller.shared_data.ax_ele)
-                plots.plot_track(self.controller.shared_data.obj_track,
-                                 self.controller.shared_data.ax_track)
-                plots.plot_track_info(
-                    self.controller.shared_data.obj_track,
-                    self.controller.shared_data.ax_track_info)
-                self.controller.shared_data.canvas.draw()
+                # Update plots, segment ids point to other segments
+                scheduler = self.controller.shared_data.scheduler
+                scheduler.invalidate(render.ELEVATION, render.INFO,
+                                     segments=available_segments)
+                scheduler.flush()
 
         btn_clear = tk.Button(master=frm_button, text='Clear',
                               command=clear_box)
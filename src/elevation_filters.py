@@ -0,0 +1,197 @@
+"""
+Elevation smoothing filters. All of them are evaluated over the whole
+elevation array of a segment and take the cumulative distance into account,
+so uneven spacing between points does not distort the result:
+    - moving_average: mean of the points within a distance window, computed
+      with cumulative sums.
+    - median: running median over the track resampled at regular distance.
+    - savgol: Savitzky-Golay, polynomial fitted by least squares to the
+      neighbours of each point at their real distance.
+    - kalman: steady state Kalman filter of a random walk elevation, applied
+      forward and backward over the resampled track.
+"""
+import numpy as np
+
+from src import constants as c
+
+
+def _resample(ele: np.array, distance: np.array, window: float):
+    """
+    Resample the elevation at regular distance.
+    :param ele: elevation in m
+    :param distance: cumulative distance in km, not decreasing
+    :param window: filter window in km
+    :return: grid of distances, elevation in the grid and number of grid
+        points per window
+    """
+    steps = np.diff(distance)
+    step = np.median(steps[steps > 0]) if np.any(steps > 0) else window
+    # Limit the size of the grid for tracks with long gaps
+    step = max(step, (distance[-1] - distance[0]) / (4 * distance.size))
+    grid = np.arange(distance[0], distance[-1] + step, step)
+    return grid, np.interp(grid, distance, ele), max(int(window / step), 1)
+
+
+def moving_average(ele: np.array, distance: np.array,
+                   window: float) -> np.array:
+    """
+    Mean of the points within window / 2 before and after each point.
+    :param ele: elevation in m
+    :param distance: cumulative distance in km
+    :param window: window length in km
+    :return: smooth elevation
+    """
+    cum_ele = np.concatenate(([0], np.cumsum(ele)))
+    first = np.searchsorted(distance, distance - window / 2, side='left')
+    last = np.searchsorted(distance, distance + window / 2, side='right')
+    return (cum_ele[last] - cum_ele[first]) / (last - first)
+
+
+def median(ele: np.array, distance: np.array, window: float) -> np.array:
+    """
+    Running median, robust to isolated spikes.
+    :param ele: elevation in m
+    :param distance: cumulative distance in km
+    :param window: window length in km
+    :return: smooth elevation
+    """
+    grid, grid_ele, k = _resample(ele, distance, window)
+    half = k // 2
+    padded = np.pad(grid_ele, half, mode='edge')
+    # Overlapping windows as a view, no copy is made
+    windows = np.lib.stride_tricks.as_strided(
+        padded, shape=(grid_ele.size, 2 * half + 1),
+        strides=padded.strides * 2, writeable=False)
+    smooth = np.median(windows, axis=1)
+    return np.interp(distance, grid, smooth)
+
+
+def savgol(ele: np.array, distance: np.array, window: float,
+           order: int = c.savgol_order) -> np.array:
+    """
+    Savitzky-Golay filter for uneven spacing: a polynomial is fitted to the
+    neighbours of each point and evaluated at the point. Every fit is solved
+    at the same time.
+    :param ele: elevation in m
+    :param distance: cumulative distance in km
+    :param window: window length in km, converted to a number of points with
+        the median spacing
+    :param order: polynomial order
+    :return: smooth elevation
+    """
+    n_points = ele.size
+    steps = np.diff(distance)
+    step = np.median(steps[steps > 0]) if np.any(steps > 0) else window
+    k = min(2 * (int(window / step) // 2) + 1, n_points)
+    order = min(order, k - 1)
+    if order < 1:
+        return ele.copy()
+
+    # Window of each point, shifted at the boundaries of the track
+    first = np.clip(np.arange(n_points) - k // 2, 0, n_points - k)
+    windows = first[:, None] + np.arange(k)
+    x = distance[windows] - distance[:, None]
+    x /= np.maximum(np.abs(x).max(axis=1, keepdims=True), 1e-9)
+
+    # Normal equations of every fit from the moments of its window
+    y = ele[windows]
+    x_power = np.ones_like(x)
+    moments, rhs = [], []
+    for power in range(2 * order + 1):
+        moments.append(x_power.sum(axis=1))
+        if power <= order:
+            rhs.append((x_power * y).sum(axis=1))
+        x_power *= x
+    terms = np.arange(order + 1)
+    lhs = np.stack(moments, axis=1)[:, terms[:, None] + terms]
+    # Small ridge for windows with repeated distances (stopped points)
+    lhs += 1e-9 * np.eye(order + 1)
+
+    # Polynomial value at the point is the independent coefficient
+    return np.linalg.solve(lhs, np.stack(rhs, axis=1)[..., None])[:, 0, 0]
+
+
+def _exponential_smoothing(values: np.array, gain: float) -> np.array:
+    """
+    Steady state Kalman filter of a random walk, which is an exponential
+    smoothing, computed as a convolution with a truncated kernel.
+    :param values: evenly spaced measurements
+    :param gain: steady state Kalman gain
+    :return: filtered values
+    """
+    length = int(np.ceil(np.log(1e-6) / np.log(1 - gain))) if gain < 1 else 1
+    kernel = gain * (1 - gain) ** np.arange(min(length, values.size))
+
+    # Convolution through FFT, the kernel can be long for a small gain
+    size = 2 ** int(np.ceil(np.log2(values.size + kernel.size - 1)))
+    filtered = np.fft.irfft(np.fft.rfft(values, size) *
+                            np.fft.rfft(kernel, size), size)[:values.size]
+
+    # Normalization by the weights used at the start of the track
+    return filtered / np.cumsum(kernel)[
+        np.minimum(np.arange(values.size), kernel.size - 1)]
+
+
+def kalman(ele: np.array, distance: np.array, window: float,
+           process_noise: float = c.kalman_process_noise,
+           measurement_noise: float = c.kalman_measurement_noise) \
+        -> np.array:
+    """
+    1-D Kalman filter with a random walk model, forward and backward passes
+    are averaged to avoid the delay of a single pass.
+    :param ele: elevation in m
+    :param distance: cumulative distance in km
+    :param window: resampling distance is derived from it as the other
+        filters, the smoothing is driven by the noise parameters
+    :param process_noise: elevation variance per km in m^2/km
+    :param measurement_noise: elevation measurement variance in m^2
+    :return: smooth elevation
+    """
+    grid, grid_ele, _ = _resample(ele, distance, window)
+    step = grid[1] - grid[0] if grid.size > 1 else 0
+    q = process_noise * step
+    # Steady state predicted covariance: P^2 - qP - qR = 0
+    p = (q + np.sqrt(q ** 2 + 4 * q * measurement_noise)) / 2
+    gain = p / (p + measurement_noise) if p > 0 else 1
+
+    forward = _exponential_smoothing(grid_ele, gain)
+    backward = _exponential_smoothing(grid_ele[::-1], gain)[::-1]
+    return np.interp(distance, grid, (forward + backward) / 2)
+
+
+FILTERS = {'moving_average': moving_average,
+           'median': median,
+           'savgol': savgol,
+           'kalman': kalman}
+
+
+def smooth(ele: np.array, distance: np.array, method: str = c.smooth_filter,
+           window: float = c.smooth_window) -> np.array:
+    """
+    Smooth the elevation of a segment with the selected filter. Points
+    without elevation are not considered and are kept as nan.
+    :param ele: elevation in m
+    :param distance: cumulative distance in km
+    :param method: moving_average, median, savgol or kalman
+    :param window: window length in km
+    :return: smooth elevation
+    """
+    if method not in FILTERS:
+        raise ValueError(f'Unknown elevation filter: {method}')
+
+    ele = np.asarray(ele, dtype=np.float64)
+    distance = np.asarray(distance, dtype=np.float64)
+    valid = ~np.isnan(ele)
+    result = ele.copy()
+    if valid.sum() > 1:
+        result[valid] = FILTERS[method](ele[valid], distance[valid], window)
+    return result
+
+
+def gain_loss(ele: np.array) -> tuple:
+    """
+    :param ele: elevation in m
+    :return: total positive and negative elevation in m
+    """
+    ele_diff = np.nan_to_num(np.diff(ele))
+    return np.clip(ele_diff, 0, None).sum(), np.clip(ele_diff, None, 0).sum()
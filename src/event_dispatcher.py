@@ -0,0 +1,81 @@
+"""
+Single entry point of the canvas events. Each event type is connected once
+to the canvas and routed to the handlers registered for it. Handlers are
+registered by key, so registering a key again replaces its handler instead
+of adding a new one, and they can be restricted to the events of an axes.
+Handler and dispatch counts expose registrations which pile up.
+"""
+import logging
+from collections import Counter
+
+LOGGER = logging.getLogger(__name__)
+
+
+class EventDispatcher:
+    """
+    Dispatcher of the events of a matplotlib canvas. Handlers are kept with
+    strong references, unlike callbacks connected to the canvas.
+    """
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self._handlers = {}  # {event name: {key: (handler, axes)}}
+        self._cids = {}  # canvas connection of each event name
+
+        # Instrumentation
+        self.dispatched = Counter()  # events received by event name
+        self.calls = Counter()  # handler calls by key
+
+    def connect(self, event_name: str, key: str, handler, axes=None):
+        """
+        Register the handler of a key for an event type.
+        :param event_name: matplotlib event, such as 'button_press_event'
+        :param key: name of the handler, a handler with the same key and
+            event is replaced
+        :param handler: callable as handler(event)
+        :param axes: only events inside this axes are handled, None for
+            all of them
+        """
+        handlers = self._handlers.setdefault(event_name, {})
+        if key in handlers:
+            LOGGER.debug(f'{event_name} handler {key} replaced')
+        handlers[key] = (handler, axes)
+
+        if event_name not in self._cids:
+            self._cids[event_name] = self.canvas.mpl_connect(
+                event_name, lambda event: self._dispatch(event_name, event))
+
+    def disconnect(self, key: str, event_name: str = None):
+        """
+        Remove the handlers of a key.
+        :param key: name of the handler
+        :param event_name: event type, all of them by default
+        """
+        for name in [event_name] if event_name else list(self._handlers):
+            handlers = self._handlers.get(name, {})
+            handlers.pop(key, None)
+            if not handlers and name in self._cids:
+                self.canvas.mpl_disconnect(self._cids.pop(name))
+                self._handlers.pop(name, None)
+
+    def handler_count(self, event_name: str = None) -> int:
+        """
+        :param event_name: event type, all of them by default
+        :return: number of registered handlers
+        """
+        if event_name is not None:
+            return len(self._handlers.get(event_name, {}))
+        return sum(len(handlers) for handlers in self._handlers.values())
+
+    def _dispatch(self, event_name: str, event):
+        self.dispatched[event_name] += 1
+        # Handlers may connect or disconnect others, handlers removed or
+        # replaced by a previous one do not get the event
+        handlers = self._handlers.get(event_name, {})
+        for key, entry in list(handlers.items()):
+            handler, axes = entry
+            if handlers.get(key) is not entry:
+                continue
+            if axes is not None and getattr(event, 'inaxes', None) is not axes:
+                continue
+            self.calls[key] += 1
+            handler(event)
@@ -5,7 +5,6 @@ import tkinter.messagebox as messagebox
 import pandas as pd
 import types
 
-import src.plots as plots
 import src.track as track
 from src.utils import quit_app
 
@@ -48,20 +47,9 @@ class FileMenu(tk.Menu):
             self.controller.shared_data.obj_track.add_gpx(gpx_file.name)
 
             # Insert plot
-            plots.plot_track(self.controller.shared_data.obj_track,
-                             self.controller.shared_data.ax_track)
-            plots.plot_elevation(self.controller.shared_data.obj_track,
-                                 self.controller.shared_data.ax_ele)
-            track_info_table = plots.plot_track_info(
-                self.controller.shared_data.obj_track,
-                self.controller.shared_data.ax_track_info)
-            self.controller.shared_data.cid = plots.segment_selection(
-                self.controller.shared_data.obj_track,
-                self.controller.shared_data.ax_track,
-                self.controller.shared_data.ax_ele,
-                self.controller.shared_data.fig_track,
-                track_info_table)
-            self.controller.shared_data.canvas.draw()
+            scheduler = self.controller.shared_data.scheduler
+            scheduler.invalidate_all()
+            scheduler.flush()
 
     def load_session(self):
         proceed = True
@@ -87,22 +75,15 @@ class FileMenu(tk.Menu):
                     self.controller.shared_data.obj_track.df_track = session_track
                     self.controller.shared_data.obj_track.loaded_files = \
                         session_meta.loaded_files
-                    self.controller.shared_data.obj_track.size = \
-                        session_meta.size
                     self.controller.shared_data.obj_track.total_distance = \
                         session_meta.total_distance
                     self.controller.shared_data.obj_track.extremes = \
                         session_meta.extremes
 
                     # Insert plot
-                    plots.plot_track(self.controller.shared_data.obj_track,
-                                     self.controller.shared_data.ax_track)
-                    plots.plot_elevation(self.controller.shared_data.obj_track,
-                                         self.controller.shared_data.ax_ele)
-                    plots.plot_track_info(
-                        self.controller.shared_data.obj_track,
-                        self.controller.shared_data.ax_track_info)
-                    self.controller.shared_data.canvas.draw()
+                    scheduler = self.controller.shared_data.scheduler
+                    scheduler.invalidate_all()
+                    scheduler.flush()
 
     def new_session(self):
         proceed = True
@@ -118,10 +99,9 @@ class FileMenu(tk.Menu):
             self.controller.shared_data.obj_track = track.Track()
 
             # Plot
-            plots.plot_world(self.controller.shared_data.ax_track)
-            plots.plot_no_elevation(self.controller.shared_data.ax_ele)
-            plots.plot_no_info(self.controller.shared_data.ax_track_info)
-            self.controller.shared_data.canvas.draw()
+            scheduler = self.controller.shared_data.scheduler
+            scheduler.invalidate_all()
+            scheduler.flush()
 
     def save_session(self):
         session = self.controller.shared_data.obj_track.df_track
@@ -149,7 +129,8 @@ class FileMenu(tk.Menu):
         gpx_filename = tk.filedialog.asksaveasfilename(
             initialdir=os.getcwd(),
             title='Save track as',
-            filetypes=[('Gpx file', '*.gpx')])
+            filetypes=[('Gpx file', '*.gpx'),
+                       ('Compressed gpx file', '*.gpx.gz')])
 
         if gpx_filename:  # user may close filedialog
             self.controller.shared_data.obj_track.save_gpx(gpx_filename)
@@ -1,4 +1,6 @@
-import gpxpy
+import datetime as dt
+import gzip
+import xml.etree.ElementTree as ElementTree
 import pandas as pd
 import os
 import numpy as np
@@ -10,65 +12,316 @@ class LoadGpxError(Exception):
     pass
 
 
+POINT_FIELDS = {'lat': np.float64, 'lon': np.float64, 'ele': np.float64,
+                'time': 'datetime64[us]', 'track': np.int32,
+                'segment': np.int32}
+
+
+def _local_name(tag: str) -> str:
+    """
+    Remove the namespace from a xml tag.
+    :param tag: tag as {namespace}name
+    :return: name
+    """
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_time(text: str) -> np.datetime64:
+    """
+    Parse GPX timestamp (ISO 8601) to UTC.
+    :param text: timestamp, such as 2015-07-24T06:44:14Z
+    :return: naive UTC datetime64
+    """
+    text = text.strip()
+    if text.endswith('Z'):
+        return np.datetime64(text[:-1])
+    if len(text) > 19 and text[-6] in '+-':
+        # Offset is applied to get UTC time
+        time = dt.datetime.fromisoformat(text)
+        return np.datetime64(time.astimezone(dt.timezone.utc).
+                             replace(tzinfo=None))
+    return np.datetime64(text)
+
+
+class PointArrays:
+    """
+    Typed numpy arrays where track points are written. Capacity is
+    preallocated and doubled when needed, so no intermediate objects are
+    created per point.
+    """
+    def __init__(self, capacity: int):
+        self.size = 0
+        self.arrays = {name: np.empty(max(capacity, 1), dtype=dtype)
+                       for name, dtype in POINT_FIELDS.items()}
+
+    def append(self, lat: float, lon: float, ele: float, time: np.datetime64,
+               track: int, segment: int):
+        if self.size == len(self.arrays['lat']):
+            self._grow()
+
+        i = self.size
+        self.arrays['lat'][i] = lat
+        self.arrays['lon'][i] = lon
+        self.arrays['ele'][i] = ele
+        self.arrays['time'][i] = time
+        self.arrays['track'][i] = track
+        self.arrays['segment'][i] = segment
+        self.size += 1
+
+    def _grow(self):
+        for name, array in self.arrays.items():
+            new_array = np.empty(2 * len(array), dtype=array.dtype)
+            new_array[:len(array)] = array
+            self.arrays[name] = new_array
+
+    def trim(self) -> dict:
+        """
+        :return: dictionary of arrays with the exact number of points
+        """
+        for array in self.arrays.values():
+            array.resize(self.size, refcheck=False)  # no copy is made
+        return self.arrays
+
+
+def parse(filepath: str, progress=None, downsample: int = 1) -> dict:
+    """
+    Streaming parser of the track points in a GPX file. The file is read in
+    chunks of constants.gpx_chunk_size bytes, so the xml is never fully
+    resident in memory. Points are written in typed arrays while the xml is
+    read, parsed elements are released.
+    :param filepath: gpx file
+    :param progress: callable as progress(bytes_read, total_bytes) which is
+        called after each chunk
+    :param downsample: keep one of each downsample points, first and last
+        points of each segment are always kept
+    :return: dictionary of arrays: lat, lon, ele, time, track and segment
+    """
+    if downsample < 1:
+        raise ValueError(f'downsample must be at least 1, not {downsample}')
+
+    total_bytes = os.stat(filepath).st_size
+    points = PointArrays(total_bytes // c.gpx_bytes_per_point // downsample)
+
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    i_track = i_segment = -1
+    i_point = 0  # point index in current segment
+    pending = None  # last skipped point, kept if it ends the segment
+    parent = None  # element which contains the points
+    bytes_read = 0
+
+    with open(filepath, 'rb') as gpx_file:
+        while True:
+            chunk = gpx_file.read(c.gpx_chunk_size)
+            if chunk:
+                parser.feed(chunk)
+            else:
+                parser.close()
+
+            for event, elem in parser.read_events():
+                tag = _local_name(elem.tag)
+
+                if event == 'start':
+                    if tag == 'trk':
+                        i_track += 1
+                        i_segment = -1
+                    elif tag == 'trkseg':
+                        i_segment += 1
+                        i_point = 0
+                        parent = elem
+                    continue
+
+                if tag == 'trkpt':
+                    ele = time = None
+                    for child in elem:
+                        child_tag = _local_name(child.tag)
+                        if child_tag == 'ele':
+                            ele = child.text
+                        elif child_tag == 'time':
+                            time = child.text
+
+                    point = (float(elem.get('lat', 'nan')),
+                             float(elem.get('lon', 'nan')),
+                             float(ele) if ele else np.nan,
+                             _parse_time(time) if time else
+                             np.datetime64('NaT'),
+                             i_track, i_segment)
+
+                    if i_point % downsample == 0:
+                        points.append(*point)
+                        pending = None
+                    else:
+                        pending = point
+                    i_point += 1
+
+                    # Release memory of parsed point
+                    elem.clear()
+                    if parent is not None:
+                        parent.remove(elem)
+
+                elif tag in ('trkseg', 'trk'):
+                    if pending is not None:
+                        points.append(*pending)
+                        pending = None
+                    elem.clear()
+
+            if not chunk:
+                break
+
+            bytes_read += len(chunk)
+            if progress:
+                progress(bytes_read, total_bytes)
+
+    return points.trim()
+
+
+GPX_HEADER = \
+    '<?xml version="1.0" encoding="UTF-8"?>\n' \
+    '<gpx xmlns="http://www.topografix.com/GPX/1/1" ' \
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" ' \
+    'xsi:schemaLocation="http://www.topografix.com/GPX/1/1 ' \
+    'http://www.topografix.com/GPX/1/1/gpx.xsd" version="1.1" ' \
+    'creator="gpx.py -- https://github.com/tkrajina/gpxpy">'
+
+
+def _format_number(value: float) -> str:
+    """
+    Format a number as gpxpy does, scientific notation is illegal in GPX.
+    :param value: number
+    :return: string representation
+    """
+    result = repr(value)
+    if 'e' not in result:
+        return result
+    return format(value, '.10f').rstrip('0').rstrip('.')
+
+
+def _format_time(time: np.array) -> np.array:
+    """
+    Format timestamps as the isoformat of pandas, without fractional part
+    when it is zero.
+    :param time: datetime64 array
+    :return: array of strings, empty for NaT
+    """
+    time = time.astype('datetime64[ns]')
+    nanoseconds = time.astype(np.int64) % 10 ** 9
+    result = np.full(time.shape, '', dtype=object)
+
+    for unit, mask in (('s', nanoseconds == 0),
+                       ('us', (nanoseconds != 0) & (nanoseconds % 1000 == 0)),
+                       ('ns', nanoseconds % 1000 != 0)):
+        mask &= ~np.isnat(time)
+        result[mask] = np.datetime_as_string(time[mask], unit=unit)
+
+    return result
+
+
+def write(filepath: str, points: dict, offsets: np.array,
+          compress: bool = None):
+    """
+    Streaming GPX writer. Points are formatted from the arrays in batches and
+    written to a buffered file, output is the same xml that gpxpy generates.
+    Missing elevation (nan) and time (NaT) are not written.
+    :param filepath: output file
+    :param points: dictionary of arrays: lat, lon, ele and time
+    :param offsets: first point of each segment, last element is the number
+        of points
+    :param compress: write gzip file, by default when filepath ends in .gz
+    """
+    if compress is None:
+        compress = filepath.endswith('.gz')
+
+    if compress:
+        gpx_file = gzip.open(filepath, 'wt', encoding='utf-8')
+    else:
+        gpx_file = open(filepath, 'w', encoding='utf-8',
+                        buffering=c.gpx_write_buffer)
+
+    with gpx_file:
+        gpx_file.write(GPX_HEADER)
+        gpx_file.write('\n  <trk>')
+
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            gpx_file.write('\n    <trkseg>')
+
+            for batch in range(start, end, c.gpx_write_batch):
+                batch = slice(batch, min(batch + c.gpx_write_batch, end))
+                ele_xml = ['' if np.isnan(e) else
+                           '\n        <ele>' + _format_number(e) + '</ele>'
+                           for e in points['ele'][batch].tolist()]
+                time_xml = ['\n        <time>' + t + '</time>' if t else ''
+                            for t in _format_time(points['time'][batch])]
+
+                gpx_file.write(''.join([
+                    f'\n      <trkpt lat="{_format_number(lat)}" '
+                    f'lon="{_format_number(lon)}">{e}{t}\n      </trkpt>'
+                    for lat, lon, e, t in zip(points['lat'][batch].tolist(),
+                                              points['lon'][batch].tolist(),
+                                              ele_xml, time_xml)]))
+
+            gpx_file.write('\n    </trkseg>')
+
+        gpx_file.write('\n  </trk>\n</gpx>')
+
+
 class Gpx:
-    def __init__(self, file):
+    def __init__(self, file, progress=None, downsample: int = 1):
+        """
+        :param file: gpx file
+        :param progress: callable as progress(bytes_read, total_bytes)
+        :param downsample: keep one of each downsample points
+        """
         # Private attributes
         self.filename = os.path.basename(file)
         self.filepath = os.path.abspath(file)
         self._state = False
-        self._gpx = self._load_file()
-        if not self._gpx:
+        self._progress = progress
+        self._downsample = downsample
+        self._points = self._load_file()
+        if self._points is None or self._points['lat'].size == 0:
             raise LoadGpxError(f"Not able to load {self.filename}")
         self._gpx_dict = None
 
         # Public attributes
         self.df = None
 
-    def _load_file(self):
-        if os.stat(self.filepath).st_size < c.maximum_file_size:
-            try:
-                gpx_file = open(self.filepath, 'r')
-                self._state = True
-                return gpxpy.parse(gpx_file)
+    @property
+    def points(self) -> dict:
+        """
+        Parsed points as a dictionary of arrays: lat, lon, ele, time, track
+        and segment.
+        """
+        return self._points
 
-            except PermissionError:
-                self._state = False
-                return None
+    def _load_file(self):
+        try:
+            points = parse(self.filepath, progress=self._progress,
+                           downsample=self._downsample)
+            self._state = True
+            return points
 
-        else:
+        except (PermissionError, ElementTree.ParseError):
             self._state = False
             return None
 
     def to_dict(self):
-        self._gpx_dict = {"lat": [], "lon": [], "ele": [], "time": [],
-                          "track": [], "segment": []}
-
-        n_tracks = len(self._gpx.tracks)
-        n_segments = [len(track.segments) for track in self._gpx.tracks]
-        n_points = [[segment.points for segment in track.segments]
-                    for track in self._gpx.tracks]
-
-        for i_track in range(n_tracks):
-            for i_seg in range(n_segments[i_track]):
-                for i_point in \
-                        self._gpx.tracks[i_track].segments[i_seg].points:
-                    # TODO: implement corner case in which one gpx has missing information
-                    self._gpx_dict["lat"].append(i_point.latitude)
-                    self._gpx_dict["lon"].append(i_point.longitude)
-                    self._gpx_dict["ele"].append(i_point.elevation)
-                    self._gpx_dict["time"].append(i_point.time)  # This is
-                    # datetime.datetime format
-                    self._gpx_dict["track"].append(i_seg)
-                    self._gpx_dict["segment"].append(i_track)
+        self._gpx_dict = {
+            "lat": self._points["lat"].tolist(),
+            "lon": self._points["lon"].tolist(),
+            "ele": self._points["ele"].tolist(),
+            "time": self._points["time"].astype(object).tolist(),  # This is
+            # datetime.datetime format
+            "track": self._points["track"].tolist(),
+            "segment": self._points["segment"].tolist()}
         return self._gpx_dict
 
     def to_pandas(self):
-        if not self._gpx_dict:
-            self.to_dict()
-
-        self.df = pd.DataFrame(self._gpx_dict,
-                               columns=['lat', 'lon', 'ele',
-                                        'time', 'track', 'segment'])
-        self.df["time"] = self.df["time"].values.astype(np.datetime64)
+        self.df = pd.DataFrame(
+            {"lat": self._points["lat"],
+             "lon": self._points["lon"],
+             "ele": self._points["ele"],
+             "time": self._points["time"].astype('datetime64[ns]'),
+             "track": self._points["track"],
+             "segment": self._points["segment"]},
+            columns=['lat', 'lon', 'ele', 'time', 'track', 'segment'])
 
         return self.df.copy()
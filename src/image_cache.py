@@ -0,0 +1,124 @@
+"""
+In memory caches of decoded tile images and composed maps.
+"""
+import collections
+import logging
+import numpy as np
+import matplotlib.image as mpimg
+
+from src import constants as c, tile_store
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TileImageCache:
+    """
+    Least recently used cache of decoded tiles, limited by the total bytes
+    of the stored images. Tiles are kept as read only arrays.
+    """
+    def __init__(self, max_bytes: int = c.tile_cache_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0  # bytes of the stored images
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._images = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._images)
+
+    def __contains__(self, tile: tuple):
+        return tile in self._images
+
+    def get(self, zoom: int, xtile: int, ytile: int) -> np.array:
+        """
+        Decoded image of a tile, the file is read only if the tile is not
+        in the cache.
+        :param zoom: zoom grade
+        :param xtile: OSM X-tile
+        :param ytile: OSM Y-tile
+        :return: image array as returned by matplotlib.image.imread
+        """
+        tile = (zoom, xtile, ytile)
+        image = self._images.get(tile)
+        if image is not None:
+            self._images.move_to_end(tile)
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        image = mpimg.imread(tile_store.tile_source(zoom, xtile, ytile),
+                             format='png')
+        image.setflags(write=False)
+        self.put(tile, image)
+        return image
+
+    def put(self, tile: tuple, image: np.array):
+        """
+        Store an image, least recently used images are evicted to keep the
+        size within the budget. Images bigger than the budget are not stored.
+        :param tile: (zoom, x, y)
+        :param image: image array
+        """
+        self.discard(tile)
+        if image.nbytes > self.max_bytes:
+            return
+
+        self._images[tile] = image
+        self.size += image.nbytes
+        while self.size > self.max_bytes:
+            _, evicted = self._images.popitem(last=False)
+            self.size -= evicted.nbytes
+            self.evictions += 1
+
+    def discard(self, tile: tuple):
+        """
+        Remove a tile from the cache, if it is stored.
+        :param tile: (zoom, x, y)
+        """
+        image = self._images.pop(tile, None)
+        if image is not None:
+            self.size -= image.nbytes
+
+    def clear(self):
+        self._images.clear()
+        self.size = 0
+
+
+class BasemapCache:
+    """
+    Composed maps with their bounding box by (zoom, extreme tiles) key.
+    Only the most recently used maps are kept.
+    """
+    def __init__(self, max_maps: int = c.basemap_cache_size):
+        self.max_maps = max_maps
+        self.hits = 0
+        self.misses = 0
+        self._maps = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._maps)
+
+    def get(self, key: tuple):
+        """
+        :param key: (zoom, extreme tiles)
+        :return: (map image, bbox) or None if the map is not stored
+        """
+        basemap = self._maps.get(key)
+        if basemap is None:
+            self.misses += 1
+            return None
+
+        self._maps.move_to_end(key)
+        self.hits += 1
+        return basemap
+
+    def put(self, key: tuple, map_img: np.array, bbox: tuple):
+        map_img.setflags(write=False)
+        self._maps[key] = (map_img, bbox)
+        self._maps.move_to_end(key)
+        while len(self._maps) > self.max_maps:
+            self._maps.popitem(last=False)
+
+    def clear(self):
+        self._maps.clear()
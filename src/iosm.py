@@ -5,14 +5,24 @@ osm: open street map
 import os
 import math
 import logging
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib3 import PoolManager
+from urllib3.exceptions import HTTPError
+from urllib3.util.retry import Retry
 
-from src import constants as c
+from src import constants as c, tile_store
 from src.db_handler import DbHandler
+from src.tile_cache import TileCacheManager
 
 LOGGER = logging.getLogger(__name__)
 
 DBH = DbHandler()
+CACHE = TileCacheManager(DBH)
+
+_HTTP = None  # connection pool shared by all downloads
+_HTTP_LOCK = threading.Lock()
 
 
 def deg2num(lat_deg: float, lon_deg: float, zoom: int) -> (int, int):
@@ -45,68 +55,214 @@ def num2deg(xtile: int, ytile: int, zoom: int) -> (float, float):
     return lat_deg, lon_deg
 
 
-def _download_url(zoom: int, xtile: int, ytile: int) -> bool:
+def deg2num_array(lat_deg: np.array, lon_deg: np.array,
+                  zoom) -> (np.array, np.array):
     """
-    Manage URL request to download tiles from OSM
+    deg2num for arrays of coordinates and/or zooms, which are broadcast
+    together.
+    :param lat_deg: latitude in degrees
+    :param lon_deg: longitude in degrees
+    :param zoom: zoom grade
+    :return: x-y tile arrays
+    """
+    lat_rad = np.radians(lat_deg)
+    n = 2.0 ** np.asarray(zoom)
+    xtile = ((np.asarray(lon_deg) + 180.0) / 360.0 * n).astype(np.int64)
+    ytile = ((1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n)\
+        .astype(np.int64)
+    return xtile, ytile
+
+
+def num2deg_array(xtile: np.array, ytile: np.array,
+                  zoom) -> (np.array, np.array):
+    """
+    num2deg for arrays of tiles and/or zooms, which are broadcast together.
+    :param xtile: x index
+    :param ytile: y index
+    :param zoom: zoom grade
+    :return: latitude, longitude arrays of NW corners
+    """
+    n = 2.0 ** np.asarray(zoom)
+    lon_deg = np.asarray(xtile) / n * 360.0 - 180.0
+    lat_rad = np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(ytile) / n)))
+    return np.degrees(lat_rad), lon_deg
+
+
+def _get_http() -> PoolManager:
+    """
+    Connection pool shared by every request, connections are kept alive
+    between tiles. Up to constants.tile_hosts hosts keep a pool, each of
+    them with up to constants.tile_connections connections; extra requests
+    wait until one is released.
+    :return: pool manager
+    """
+    global _HTTP
+    with _HTTP_LOCK:
+        if _HTTP is None:
+            user_agent = {'user-agent': f'{c.tool} {c.version} {c.email}'}
+            _HTTP = PoolManager(num_pools=c.tile_hosts,
+                                maxsize=c.tile_connections, block=True,
+                                headers=user_agent)
+    return _HTTP
+
+
+def _missing_tiles(tiles: list) -> list:
+    """
+    Tiles which are not downloaded yet, the database is queried once.
+    Database must be used only from the main thread.
+    :param tiles: list of (zoom, xtile, ytile)
+    :return: list of tiles to download, without duplicates
+    """
+    tiles = list(dict.fromkeys(tiles))
+    store = tile_store.get_store()
+    if store is not None:
+        stored = store.stored_tiles(tiles)
+        return [tile for tile in tiles if tile not in stored]
+
+    sizes = DBH.get_tiles_size(tiles)
+    missing = []
+    for zoom, xtile, ytile in tiles:
+        tile_path = f'tiles/{zoom}/{xtile}/{ytile}.png'
+        if sizes.get((zoom, xtile, ytile), 0) > 0 and \
+                os.path.isfile(tile_path):
+            LOGGER.debug(f'Tile ({zoom},{xtile},{ytile}) ' +
+                         f'is already available at {tile_path}')
+        else:
+            missing.append((zoom, xtile, ytile))
+    return missing
+
+
+def _fetch_tile(zoom: int, xtile: int, ytile: int,
+                to_store: bool = False) -> tuple:
+    """
+    Request a tile and store it in the tiles directory. It is safe to run
+    this function in several threads, database is not used.
     :param zoom: zoom grade
     :param xtile: OSM X-tile
     :param ytile: OSM Y-tile
-    :return: True if tile is correct
+    :param to_store: content is returned to be saved in the tile store
+        instead of written in the tiles directory
+    :return: (zoom, xtile, ytile, validity, path, size) of the tile and its
+        content if to_store, otherwise None
     """
     # Define path
-    dir_path = f'tiles/{zoom}/{xtile}/'
-    tile_path = f'{dir_path}/{ytile}.png'
-    if not os.path.exists(dir_path):
-        LOGGER.debug(f'Creating directory: {dir_path}')
-        os.makedirs(dir_path)
-
-    # Check if request is needed
-    if os.path.isfile(tile_path):
-        if DBH.get_tile_size(zoom, xtile, ytile) > 0:
-            LOGGER.info(f'Tile ({zoom},{xtile},{ytile}) ' +
-                        f'is already available at {tile_path}')
-            return True
-        else:
-            DBH.remove_tile(zoom, xtile, ytile)
+    if to_store:
+        tile_path = c.tile_store_file
     else:
-        DBH.remove_tile(zoom, xtile, ytile)
+        dir_path = f'tiles/{zoom}/{xtile}/'
+        tile_path = f'{dir_path}/{ytile}.png'
+        os.makedirs(dir_path, exist_ok=True)
 
-    # Request
-    user_agent = {'user-agent': f'{c.tool} {c.version} {c.email}'}
-    http = PoolManager(headers=user_agent)
-    url = f'https://a.tile.openstreetmap.org/{zoom}/{xtile}/{ytile}.png'
+    # Request with retry and exponential backoff
+    url = f'{c.tile_server}/{zoom}/{xtile}/{ytile}.png'
     LOGGER.debug(f'Request to: {url}')
-
-    response = http.request('GET', url)
+    retries = Retry(total=c.tile_retries, backoff_factor=c.tile_backoff,
+                    status_forcelist=(429, 500, 502, 503, 504))
+    try:
+        response = _get_http().request('GET', url, retries=retries,
+                                       timeout=c.tile_timeout)
+    except HTTPError as e:
+        LOGGER.error(f'Error in request url={url}, reason={e}')
+        return (zoom, xtile, ytile, False, tile_path, 0), None
 
     # Store content
-    with open(tile_path, 'wb') as destination:
-        if response.status == 200:
-            destination.write(response.data)
-            LOGGER.info(f'Tile ({zoom},{xtile},{ytile})' +
-                        f'has been downloaded at {url}')
+    tile_size = 0
+    data = None
+    if response.status == 200:
+        if to_store:
+            data = response.data
+            tile_size = len(data)
         else:
-            # empty file has been created
-            LOGGER.error(f'Error in request url={url},' +
-                         f'reason={response.reason},' +
-                         f'status={response.status}')
-        destination.close()
+            with open(tile_path, 'wb') as destination:
+                destination.write(response.data)
+            tile_size = os.stat(tile_path).st_size
+        LOGGER.info(f'Tile ({zoom},{xtile},{ytile}) ' +
+                    f'has been downloaded at {url}')
+    else:
+        LOGGER.error(f'Error in request url={url},' +
+                     f'reason={response.reason},' +
+                     f'status={response.status}')
 
     # Check downloaded info
-    valid_tail = False
-    request_size = response.headers.get("Content-Length")
-    tile_size = os.stat(tile_path).st_size
-
-    if int(request_size) == tile_size:
-        valid_tail = True
-    else:
-        LOGGER.error(f'Size check has failed for tail ' +
+    request_size = response.headers.get('Content-Length')
+    valid_tile = tile_size > 0 and \
+        (request_size is None or int(request_size) == tile_size)
+    if response.status == 200 and not valid_tile:
+        LOGGER.error(f'Size check has failed for tile ' +
                      f'({zoom},{xtile},{ytile}) at {tile_path}')
+    response.release_conn()
+
+    return (zoom, xtile, ytile, valid_tile, tile_path, tile_size), \
+        data if valid_tile else None
+
+
+def _save_tiles(downloaded: list):
+    """
+    Register downloaded tiles in the database and, if it is used, save
+    their content in the tile store. Only from the main thread.
+    :param downloaded: list of results of _fetch_tile
+    """
+    store = tile_store.get_store()
+    if store is not None:
+        store.put_tiles([(*tile[:3], data) for tile, data in downloaded
+                         if data is not None])
+    DBH.insert_tiles([tile for tile, _ in downloaded])
+
+
+def _download_url(zoom: int, xtile: int, ytile: int) -> bool:
+    """
+    Manage URL request to download tiles from OSM
+    :param zoom: zoom grade
+    :param xtile: OSM X-tile
+    :param ytile: OSM Y-tile
+    :return: True if tile is correct
+    """
+    if not _missing_tiles([(zoom, xtile, ytile)]):
+        return True
+
+    result = _fetch_tile(zoom, xtile, ytile,
+                         to_store=tile_store.get_store() is not None)
+    _save_tiles([result])
+    return result[0][3]
 
-    DBH.insert_tile(zoom, xtile, ytile, valid_tail, tile_path, tile_size)
-    response.close()
 
-    return valid_tail
+def download_tile_list(tiles: list, workers: int = c.tile_workers,
+                       progress=None) -> int:
+    """
+    Download a list of tiles with a pool of threads. Missing tiles are
+    requested concurrently, the database is updated from the calling thread
+    in batches of constants.tile_db_batch downloaded tiles. Afterwards the
+    least recently used tiles are evicted if the disk budget is exceeded.
+    :param tiles: list of (zoom, xtile, ytile)
+    :param workers: number of threads
+    :param progress: callable as progress(downloaded, missing) which is
+        called after each downloaded tile
+    :return: number of available tiles
+    """
+    pending = _missing_tiles(tiles)
+    missing = set(pending)
+    CACHE.record([tile for tile in dict.fromkeys(tiles)
+                  if tile not in missing], pending)
+    total_tiles = len(set(tiles)) - len(pending)
+    to_store = tile_store.get_store() is not None
+    downloaded = []
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [executor.submit(_fetch_tile, *tile, to_store)
+                   for tile in pending]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            downloaded.append(result)
+            total_tiles += result[0][3]
+            if progress:
+                progress(done, len(futures))
+            if len(downloaded) == c.tile_db_batch:
+                _save_tiles(downloaded)
+                downloaded = []
+
+    _save_tiles(downloaded)
+    CACHE.enforce_budget(keep=tiles)
+    return total_tiles
 
 
 def download_tiles_by_deg(lat_min: float, lon_min: float,
@@ -124,7 +280,7 @@ def download_tiles_by_deg(lat_min: float, lon_min: float,
     :return: total number of tiles in the area
     """
     DBH.open_db()  # open database for tiles
-    total_tiles = 0  # initialize output counter
+    tiles = []
 
     for zoom in range(max_zoom + 1):
         xtile, ytile = deg2num(lat_max, lon_min, zoom)
@@ -134,8 +290,9 @@ def download_tiles_by_deg(lat_min: float, lon_min: float,
             for y in range(ytile - extra_tiles, final_ytile + 1 + extra_tiles,
                            1):
                 if x >= 0 and y >= 0:
-                    if _download_url(zoom, x, y):
-                        total_tiles += 1
+                    tiles.append((zoom, x, y))
+
+    total_tiles = download_tile_list(tiles)
     DBH.close_db()
 
     return total_tiles
@@ -156,14 +313,15 @@ def download_tiles_by_num(xtile: int, ytile: int,
     :return: total number of tiles in the area
     """
     DBH.open_db()  # open database for tiles
-    total_tiles = 0  # initialize output counter
+    tiles = []
 
     for x in range(xtile - extra_tiles, final_xtile + 1 + extra_tiles, 1):
         for y in range(ytile - extra_tiles, final_ytile + 1 + extra_tiles,
                        1):
             if x >= 0 and y >= 0:
-                if _download_url(max_zoom, x, y):
-                    total_tiles += 1
+                tiles.append((max_zoom, x, y))
+
+    total_tiles = download_tile_list(tiles)
     DBH.close_db()
 
     return total_tiles
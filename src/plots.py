@@ -1,20 +1,23 @@
+import math
 import logging
 from typing import Tuple
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
-import geopy.distance
 from matplotlib.font_manager import FontProperties
 import matplotlib.colors as mcolors
+import matplotlib.ticker as ticker
 
-from src import constants as c, iosm, track
+from src import constants as c, iosm, track, simplify
+from src.image_cache import TileImageCache, BasemapCache
 import sys
 # import utils
 
 
 logger = logging.getLogger(__name__)
 
+TILE_IMAGES = TileImageCache()
+BASEMAPS = BasemapCache()
+
 # TODO should be this refactor in a class? Does that make sense?
 
 # TODO function get_color for each segment
@@ -23,6 +26,42 @@ COLOR_LIST = ['orange', 'dodgerblue', 'limegreen', 'hotpink', 'salmon',
               'gold', 'turquoise', 'teal']
 
 
+def segment_color(position: int) -> str:
+    """
+    Color of a segment, colors are repeated for tracks with more segments
+    than colors.
+    :param position: position of the segment in the track
+    """
+    return COLOR_LIST[position % len(COLOR_LIST)]
+
+
+def area_verts(x: np.array, y: np.array) -> np.array:
+    """
+    Vertices of the polygon filled by fill_between(x, y), to update a filled
+    area in place with set_verts.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if x.size == 0:
+        return np.zeros((0, 2))
+    return np.column_stack((np.concatenate(([x[0]], x, [x[-1]])),
+                            np.concatenate(([0], y, [0]))))
+
+
+class UnitFormatter(ticker.Formatter):
+    """
+    Tick labels with units, integer values unless they repeat.
+    """
+    def __init__(self, unit: str):
+        self.unit = unit
+
+    def __call__(self, x, pos=None):
+        labels = [f'{int(loc)} {self.unit}' for loc in self.locs]
+        if len(labels) != len(set(labels)):
+            return f'{x:.1f} {self.unit}'
+        return f'{int(x)} {self.unit}'
+
+
 def color_rgb(color_name: str) -> Tuple[float, float, float]:
     color_collection = mcolors.CSS4_COLORS
 
@@ -47,54 +86,81 @@ def auto_zoom(lat_min: float, lon_min: float,
     """
     Compute the best zoom to show a complete track. It must contain the full
     track in a box of nxn tails (n is specified in constants.py).
+    The size of the box in tiles doubles with each zoom, so only the zooms
+    where it gets close to n are evaluated.
     :param lat_min: furthest south point
     :param lon_min: furthest west point
     :param lat_max: furthest north point
     :param lon_max: furthest east point
     :return: zoom to use to show full track
     """
-
-    for zoom in range(c.max_zoom):
-        num_x_min, num_y_min = iosm.deg2num(lat_min, lon_min, zoom)
-        num_x_max, num_y_max = iosm.deg2num(lat_max, lon_max, zoom)
-
+    # Size of the box in Web-Mercator units, the whole world is 1x1
+    merc_y_min, merc_y_max = [
+        (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0
+        for lat in (lat_min, lat_max)]
+    size = max(abs(lon_max - lon_min) / 360.0, abs(merc_y_max - merc_y_min))
+    if size == 0:
+        return c.max_zoom
+
+    # Width in tiles is below n while size * 2^zoom <= n - 1 and above n
+    # once size * 2^zoom > n + 1
+    first = 0 if c.map_size <= 1 else \
+        max(math.floor(math.log2((c.map_size - 1) / size)), 0)
+    last = min(math.ceil(math.log2((c.map_size + 1) / size)) + 1,
+               c.max_zoom - 1)
+
+    zoom = c.max_zoom
+    for candidate in range(first, last + 1):
+        num_x_min, num_y_min = iosm.deg2num(lat_min, lon_min, candidate)
+        num_x_max, num_y_max = iosm.deg2num(lat_max, lon_max, candidate)
         width = abs(num_x_max - num_x_min)
         height = abs(num_y_max - num_y_min)
 
-        logger.debug(f'auto_zoom: {zoom - 1}, ' +
-                     f'width: {width}, height: {height}')
         if width > c.map_size or height > c.map_size:
-            logger.debug(f'auto_zoom: {zoom -1},' +
-                         f'width: {width}, height: {height}')
-            return zoom - 1  # in this case previous zoom is the good one
-
+            zoom = candidate - 1  # in this case previous zoom is the good one
+            break
         if (width == c.map_size and height < c.map_size) or \
                 (width < c.map_size and height == c.map_size):
             # this provides bigger auto_zoom than using >= in previous case
-            return zoom
+            zoom = candidate
+            break
 
-    logger.debug(f'auto_zoom: {c.max_zoom} (this is c.max_zoom)')
-    return c.max_zoom
+    logger.debug(f'auto_zoom: {zoom}')
+    return zoom
 
 
 def create_map_img(extreme_tiles: Tuple[int, int, int, int],
                    zoom: int) -> np.array:
+    """
+    Mosaic of tiles, decoded tiles are taken from TILE_IMAGES.
+    :param extreme_tiles: first x, first y, last x and last y tiles
+    :param zoom: zoom grade
+    :return: image array, RGBA when tiles have different channels
+    """
     xtile, ytile, final_xtile, final_ytile = extreme_tiles
-    map_img = None
-
-    for x in range(xtile, final_xtile + 1, 1):
-
-        y_img = mpimg.imread(f'tiles/{zoom}/{x}/{ytile}.png')
-
-        for y in range(ytile + 1, final_ytile + 1, 1):
-            local_img_path = f'tiles/{zoom}/{x}/{y}.png'
-            local_img = mpimg.imread(local_img_path)
-            y_img = np.vstack((y_img, local_img))
-
-        if map_img is not None:
-            map_img = np.hstack((map_img, y_img))
-        else:
-            map_img = y_img
+    tiles = [[TILE_IMAGES.get(zoom, x, y)
+              for x in range(xtile, final_xtile + 1)]
+             for y in range(ytile, final_ytile + 1)]
+
+    # Single allocation of the mosaic
+    height, width = tiles[0][0].shape[:2]
+    channels = {tile.shape[2] if tile.ndim == 3 else 1
+                for row in tiles for tile in row}
+    channels = channels.pop() if len(channels) == 1 else 4
+    shape = (height * len(tiles), width * len(tiles[0]))
+    map_img = np.ones(shape + (channels,) if channels > 1 else shape,
+                      dtype=tiles[0][0].dtype)
+
+    for i, row in enumerate(tiles):
+        for j, tile in enumerate(row):
+            block = map_img[i * height:(i + 1) * height,
+                            j * width:(j + 1) * width]
+            if tile.ndim == 2 and channels > 1:
+                block[..., :3] = tile[..., None]
+            elif channels > 1:
+                block[..., :tile.shape[2]] = tile
+            else:
+                block[...] = tile
 
     return map_img
 
@@ -159,11 +225,17 @@ def generate_map(ob_track: track.Track) -> np.array:
     extreme_tiles = get_extreme_tiles(ob_track, zoom)
     logger.debug(f'{extreme_tiles}, {zoom}')
 
+    # Edits which do not move the map reuse it
+    basemap = BASEMAPS.get((zoom, extreme_tiles))
+    if basemap is not None:
+        return basemap
+
     # Download missing tiles
     logger.debug('download tiles')
-    iosm.download_tiles_by_num(extreme_tiles[0], extreme_tiles[1],
-                               extreme_tiles[2], extreme_tiles[3],
-                               max_zoom=zoom, extra_tiles=c.margin_outbounds)
+    available_tiles = iosm.download_tiles_by_num(
+        extreme_tiles[0], extreme_tiles[1],
+        extreme_tiles[2], extreme_tiles[3],
+        max_zoom=zoom, extra_tiles=c.margin_outbounds)
     logger.debug('generate map')
     # Generate map image
     # map_img = create_map_img(extreme_tiles_expanded, zoom)
@@ -172,6 +244,13 @@ def generate_map(ob_track: track.Track) -> np.array:
     # Define map box
     bbox = get_map_box(extreme_tiles, zoom)
 
+    # Maps with missing tiles are not stored, download is retried
+    n_tiles = (extreme_tiles[2] - extreme_tiles[0] + 1 +
+               2 * c.margin_outbounds) * \
+        (extreme_tiles[3] - extreme_tiles[1] + 1 + 2 * c.margin_outbounds)
+    if available_tiles == n_tiles:
+        BASEMAPS.put((zoom, extreme_tiles), map_img, bbox)
+
     return map_img, bbox
 
 
@@ -228,17 +307,19 @@ def get_elevation_label(ob_track: track.Track, magnitude: str,
     return label
 
 
-def plot_track_info(ob_track: track.Track, ax: plt.Figure.gca):
-    ax.cla()
-
-    # Initialize table
+def _track_info_text(ob_track: track.Track) -> (list, list):
+    """
+    Rows of the info table: one per segment plus the total of the track.
+    :return: text of each cell by row and color of each segment row
+    """
     cell_text = []
     track_color = []
 
     # Build segments info table
-    segments_id = ob_track.df_track.segment.unique()
+    segments_id = ob_track.segment_ids
 
-    for cc, seg_id in zip(COLOR_LIST, segments_id):
+    for position, seg_id in enumerate(segments_id):
+        cc = segment_color(position)
         distance_lbl = get_distance_label(ob_track, segment_id=seg_id)
         gained_elevation_lbl = get_elevation_label(ob_track, 'ele_pos_cum',
                                                    segment_id=seg_id)
@@ -264,6 +345,13 @@ def plot_track_info(ob_track: track.Track, ax: plt.Figure.gca):
                       gained_elevation_lbl,
                       lost_elevation_lbl])
 
+    return cell_text, track_color
+
+
+def plot_track_info(ob_track: track.Track, ax: plt.Figure.gca):
+    ax.cla()
+    cell_text, track_color = _track_info_text(ob_track)
+
     # Create table
     my_table = ax.table(cellText=cell_text,
                         loc='upper right',
@@ -282,6 +370,28 @@ def plot_track_info(ob_track: track.Track, ax: plt.Figure.gca):
     return my_table  # this allows table modifications after plot
 
 
+def update_track_info(ob_track: track.Track, table) -> bool:
+    """
+    Update the texts and colors of a table of plot_track_info in place.
+    :param ob_track: track
+    :param table: table returned by plot_track_info
+    :return: False if the number of segments changed, the table must be
+        plotted again
+    """
+    cell_text, track_color = _track_info_text(ob_track)
+    n_rows, n_cols = (max(key) + 1 for key in zip(*table.get_celld()))
+    if n_rows != len(cell_text) or n_cols != len(cell_text[0]):
+        return False
+
+    for row_idx, row in enumerate(cell_text):
+        for col_idx, text in enumerate(row):
+            table[row_idx, col_idx].get_text().set_text(text)
+    for row_idx, row_cc in enumerate(track_color):
+        table[row_idx, 0].set_facecolor(row_cc)
+        table[row_idx, 0].get_text().set_color(row_cc)
+    return True
+
+
 def plot_no_info(ax: plt.Figure.gca):
     ax.cla()
     ax.tick_params(axis='x', bottom=False, top=False, labelbottom=False)
@@ -290,94 +400,62 @@ def plot_no_info(ax: plt.Figure.gca):
         spine.set_visible(False)
 
 
-def point_reduction(df_segment: pd.DataFrame):
-    positions = sorted(list(set([int(pos) for pos in
-                                 np.linspace(0, len(df_segment)-1,
-                                             c.max_displayed_points)]
-                                )
-                            )
-                       )
-    return df_segment.iloc[positions]
-
-
-def plot_track(ob_track: track.Track, ax: plt.Figure.gca):
-    ax.cla()
-
-    # Plot map
-    map_img, bbox = generate_map(ob_track)
-    ax.imshow(map_img, zorder=0, extent=bbox, aspect='equal')
+def _view_zoom(ax: plt.Figure.gca) -> int:
+    """
+    Zoom of the level of detail for the current view of the map axes.
+    """
+    xlim = ax.get_xlim()
+    return simplify.view_zoom(abs(xlim[1] - xlim[0]), ax.bbox.width)
 
-    # Plot track
-    segments_id = ob_track.df_track.segment.unique()
-    for cc, seg_id in zip(COLOR_LIST, segments_id):
-        segment = ob_track.get_segment(seg_id)
-        reduced_segment = point_reduction(segment)
-        ax.plot(reduced_segment.lon, reduced_segment.lat, color=cc,
-                linewidth=1, marker='o', markersize=2, zorder=10)
-
-    # Beauty salon
-    ax.tick_params(axis='x', bottom=False, top=False, labelbottom=False)
-    ax.tick_params(axis='y', left=False, right=False, labelleft=False)
 
+def get_closest_segment(ob_track: track.Track,
+                        point: Tuple[float, float]) -> (float, int, int):
+    """
+    Closest segment to a location, answered by the spatial index of the
+    track.
+    :param ob_track: track
+    :param point: latitude and longitude in degrees
+    :return: distance in km, segment id and position of the closest point in
+        the track
+    """
+    return ob_track.closest_point(*point)
 
-def get_closest_segment(df_track: pd.DataFrame, point: Tuple[float, float]):
-    df_track['point_distance'] = df_track.apply(
-        lambda row: geopy.distance.geodesic((row.lat, row.lon), point).km,
-        axis=1)
-    min_row = \
-        df_track[df_track.point_distance == df_track.point_distance.min()]
-    min_distance = min_row.point_distance.iloc[0]
-    min_segment = min_row.segment.iloc[0]
-    df_track.drop('point_distance', axis=1, inplace=True)
-
-    return min_distance, int(min_segment)
-
-
-def segment_selection(ob_track: track.Track, ax_track: plt.Figure.gca,
-                      ax_elevation: plt.Figure.gca, fig_track: plt.Figure,
-                      track_info_table):
-
-    def deselect_segment():
-        if ob_track.selected_segment:
-            for selected_track in ob_track.selected_segment:
-                selected_track.remove()
-            ob_track.selected_segment = []
-            ob_track.selected_segment_idx = []
-
-    def select_segment(seg2select):
-        segment = ob_track.get_segment(seg2select)
-        selected_segment, = ax_track.plot(segment.lon, segment.lat,
-                                          color=COLOR_LIST[seg2select - 1],
-                                          linewidth=4,
-                                          zorder=10)
-        ob_track.selected_segment.append(selected_segment)
-        ob_track.selected_segment_idx.append(seg2select)
-
-    def select_track_info(seg2select: int = 0, deselect: bool = False):
-        table_size = sorted(track_info_table.get_celld().keys())[-1]
-        max_idx_row = table_size[0]
-        max_idx_col = table_size[1]
-
-        for i_row in range(max_idx_row + 1):
-            head_cell = track_info_table[i_row, 0]
-            segment_txt = head_cell.get_text()._text
-            if segment_txt.isnumeric():
-                if int(segment_txt) == seg2select and not deselect:
-                    for i_col in range(max_idx_col + 1):
-                        cell = track_info_table[i_row, i_col]
-                        cell.set_text_props(
-                            fontproperties=FontProperties(weight='bold'))
-                else:
-                    for i_col in range(max_idx_col + 1):
-                        cell = track_info_table[i_row, i_col]
-                        cell.set_text_props(
-                            fontproperties=FontProperties())
 
+def select_track_info(track_info_table, seg2select: int = 0):
+    """
+    Highlight the row of a segment in the info table, 0 highlights none.
+    """
+    table_size = sorted(track_info_table.get_celld().keys())[-1]
+    max_idx_row = table_size[0]
+    max_idx_col = table_size[1]
+
+    for i_row in range(max_idx_row + 1):
+        head_cell = track_info_table[i_row, 0]
+        segment_txt = head_cell.get_text()._text
+        if segment_txt.isnumeric():
+            weight = 'bold' if int(segment_txt) == seg2select else 'normal'
+            for i_col in range(max_idx_col + 1):
+                cell = track_info_table[i_row, i_col]
+                cell.set_text_props(
+                    fontproperties=FontProperties(weight=weight))
+
+
+def segment_selection(get_track, ax_track: plt.Figure.gca, select):
+    """
+    Handler of the clicks in the map which selects the closest segment. It
+    is registered once in the event dispatcher, so each click runs a single
+    search of the closest point.
+    :param get_track: callable which returns the current track, sessions
+        replace the track object
+    :param ax_track: axes of the map
+    :param select: callable as select(seg_id) which highlights a segment,
+        0 deselects
+    :return: handler as on_click(event)
+    """
     def on_click(event):
-        # TODO: for some reason this is executed as many times as available
-        #  segments, ask in stackoverflow?
-
         # Check click limits before operation
+        if event.inaxes is not ax_track:
+            return
         xlim = ax_track.get_xlim()
         ylim = ax_track.get_ylim()
         try:
@@ -389,29 +467,19 @@ def segment_selection(ob_track: track.Track, ax_track: plt.Figure.gca,
 
         # Click position to distance
         if event.xdata and event.ydata:
-            point_distance, seg2select = \
-                get_closest_segment(ob_track.df_track, (event.ydata, event.xdata))
+            point_distance, seg2select, _ = \
+                get_closest_segment(get_track(), (event.ydata, event.xdata))
         else:  # click outside plot
             point_distance = 1e+10
             seg2select = 0
 
         # Highlight track and elevation
         if point_distance < c.click_distance and seg2select > 0:
-            deselect_segment()  # deselect current segment if needed
-            select_segment(seg2select)
-
-            plot_elevation(ob_track, ax_elevation,
-                           selected_segment_idx=seg2select)
-            select_track_info(seg2select=seg2select)
+            select(seg2select)
         else:
-            deselect_segment()
-            plot_elevation(ob_track, ax_elevation)
-            select_track_info(deselect=True)
-
-        fig_track.canvas.draw()
+            select(0)
 
-    cid = fig_track.canvas.mpl_connect('button_press_event', on_click)
-    return cid
+    return on_click
 
 
 def plot_elevation(ob_track: track.Track, ax: plt.Figure.gca,
@@ -419,16 +487,13 @@ def plot_elevation(ob_track: track.Track, ax: plt.Figure.gca,
     ax.cla()
 
     # Plot elevation
-    segments_id = ob_track.df_track.segment.unique()
+    segments_id = ob_track.segment_ids
 
-    if selected_segment_idx == 0:
-        for cc, seg_id in zip(COLOR_LIST, segments_id):
-            segment = ob_track.get_segment(seg_id)
-            ax.fill_between(segment.distance, segment.ele, alpha=0.2, color=cc)
-            ax.plot(segment.distance, segment.ele, linewidth=2, color=cc)
-    else:
-        segment = ob_track.get_segment(selected_segment_idx)
-        cc = COLOR_LIST[selected_segment_idx - 1]
+    for position, seg_id in enumerate(segments_id):
+        if selected_segment_idx not in (0, seg_id):
+            continue
+        segment = ob_track.get_segment(seg_id)
+        cc = segment_color(position)
         ax.fill_between(segment.distance, segment.ele, alpha=0.2, color=cc)
         ax.plot(segment.distance, segment.ele, linewidth=2, color=cc)
 
@@ -436,14 +501,8 @@ def plot_elevation(ob_track: track.Track, ax: plt.Figure.gca,
                  ob_track.df_track.ele.max() * 1.2))
 
     # Set labels
-    dist_label = [f'{int(item)} km' for item in ax.get_xticks()]
-    ele_label = [f'{int(item)} m' for item in ax.get_yticks()]
-
-    if len(dist_label) != len(set(dist_label)):
-        dist_label = [f'{item:.1f} km' for item in ax.get_xticks()]
-
-    ax.set_xticklabels(dist_label)
-    ax.set_yticklabels(ele_label)
+    ax.xaxis.set_major_formatter(UnitFormatter('km'))
+    ax.yaxis.set_major_formatter(UnitFormatter('m'))
 
     ax.tick_params(axis='x', bottom=False, top=False, labelbottom=True)
     ax.tick_params(axis='y', left=False, right=False, labelleft=True)
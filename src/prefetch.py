@@ -0,0 +1,177 @@
+"""
+Seed the tile cache with the tiles around a track, so maps are available
+offline. Only the tiles within a buffer of the track polyline are
+downloaded, instead of the whole bounding box. Tiles which are already in the
+catalog are skipped, so an interrupted prefetch resumes where it stopped.
+
+Usage:
+    python -m src.prefetch file.gpx [file.gpx ...] [--zoom Z] [--buffer KM]
+"""
+import argparse
+import logging
+import sys
+import numpy as np
+
+from src import constants as c, iosm
+
+LOGGER = logging.getLogger(__name__)
+
+EQUATOR_LENGTH = 40075.016686  # km
+
+
+def _tile_coordinates(lat: np.array, lon: np.array, zoom: int):
+    """
+    Fractional OSM tile coordinates of each point.
+    :param lat: latitude in degrees
+    :param lon: longitude in degrees
+    :param zoom: zoom grade
+    :return: x and y arrays, integer part is the tile index
+    """
+    n = 2.0 ** zoom
+    lat_rad = np.radians(np.clip(lat, -85.0511, 85.0511))
+    x = (np.asarray(lon) + 180.0) / 360.0 * n
+    y = (1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n
+    return x, y
+
+
+def _densify(x: np.array, y: np.array, step: float):
+    """
+    Insert points in the polyline so that consecutive points are closer
+    than step. Points with nan coordinates break the polyline.
+    :param x: x coordinates
+    :param y: y coordinates
+    :param step: maximum separation
+    :return: x and y of the densified polyline, nan are removed
+    """
+    if x.size < 2:
+        return x[~np.isnan(x)], y[~np.isnan(y)]
+    separation = np.nan_to_num(
+        np.maximum(np.abs(np.diff(x)), np.abs(np.diff(y))), nan=0)
+    n_steps = np.ceil(separation / step).astype(np.int64).clip(1, None)
+
+    # Parameter of each new point along its line
+    segment = np.repeat(np.arange(n_steps.size), n_steps)
+    t = (np.arange(n_steps.sum()) -
+         np.repeat(np.cumsum(n_steps) - n_steps, n_steps)) / n_steps[segment]
+    dense_x = x[segment] + t * (x[segment + 1] - x[segment])
+    dense_y = y[segment] + t * (y[segment + 1] - y[segment])
+    dense_x = np.append(dense_x, x[-1])
+    dense_y = np.append(dense_y, y[-1])
+    valid = ~(np.isnan(dense_x) | np.isnan(dense_y))
+    return dense_x[valid], dense_y[valid]
+
+
+def corridor_tiles(lat: np.array, lon: np.array, zoom: int,
+                   buffer: float = c.prefetch_buffer) -> list:
+    """
+    Tiles within a distance of the polyline.
+    :param lat: latitude of the track points in degrees, nan breaks the
+        polyline, such as between segments
+    :param lon: longitude of the track points in degrees
+    :param zoom: zoom grade
+    :param buffer: distance to the track in km
+    :return: sorted list of (zoom, x, y) without duplicates
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if np.isnan(lat).all():
+        return []
+
+    x, y = _tile_coordinates(lat, lon, zoom)
+    # Mercator is conformal: tile size in km is the same in x and y
+    tile_km = EQUATOR_LENGTH * np.cos(np.radians(np.nanmax(np.abs(lat)))) \
+        / 2 ** zoom
+    radius = buffer / tile_km
+
+    # Points of the polyline are closer than a tile, the buffer is extended
+    # by half the step to cover the polyline between points
+    step = max(min(radius, 0.5), 1e-3)
+    x, y = _densify(x, y, step)
+    radius += step / 2
+
+    # Tiles around each point within the buffer, the distance is measured
+    # from the point to the closest point of the tile
+    k = int(np.ceil(radius))
+    dx, dy = np.meshgrid(np.arange(-k, k + 1), np.arange(-k, k + 1))
+    tile_x = np.floor(x)[:, None] + dx.ravel()
+    tile_y = np.floor(y)[:, None] + dy.ravel()
+    gap_x = np.maximum(np.maximum(tile_x - x[:, None],
+                                  x[:, None] - tile_x - 1), 0)
+    gap_y = np.maximum(np.maximum(tile_y - y[:, None],
+                                  y[:, None] - tile_y - 1), 0)
+    n = 2 ** zoom
+    inside = (gap_x ** 2 + gap_y ** 2 <= radius ** 2) & \
+        (tile_x >= 0) & (tile_x < n) & (tile_y >= 0) & (tile_y < n)
+
+    keys = np.unique(tile_x[inside].astype(np.int64) * n +
+                     tile_y[inside].astype(np.int64))
+    return [(zoom, int(key // n), int(key % n)) for key in keys]
+
+
+def prefetch(lat: np.array, lon: np.array, max_zoom: int = c.max_zoom,
+             buffer: float = c.prefetch_buffer, workers: int = c.tile_workers,
+             progress=None) -> dict:
+    """
+    Download the tiles of the corridor of a track for zooms 0 to max_zoom.
+    :param lat: latitude of the track points in degrees
+    :param lon: longitude of the track points in degrees
+    :param max_zoom: maximum level of zoom to download
+    :param buffer: distance to the track in km
+    :param workers: number of threads
+    :param progress: callable as progress(done, total) where total is the
+        number of missing tiles
+    :return: dictionary with the number of tiles in the corridor, the number
+        of tiles which were already available and the number of available
+        tiles after the download
+    """
+    tiles = [tile for zoom in range(max_zoom + 1)
+             for tile in corridor_tiles(lat, lon, zoom, buffer)]
+
+    iosm.DBH.open_db()
+    missing = len(iosm._missing_tiles(tiles))
+    LOGGER.info(f'{len(tiles)} tiles in corridor, {missing} to download')
+    available = iosm.download_tile_list(tiles, workers=workers,
+                                        progress=progress)
+    iosm.DBH.close_db()
+
+    return {'tiles': len(tiles), 'cached': len(tiles) - missing,
+            'available': available}
+
+
+def main(args: list = None):
+    from src import track
+
+    parser = argparse.ArgumentParser(
+        description='Download the map tiles around tracks.')
+    parser.add_argument('files', nargs='+', help='gpx files')
+    parser.add_argument('--zoom', type=int, default=c.max_zoom,
+                        help='maximum zoom')
+    parser.add_argument('--buffer', type=float, default=c.prefetch_buffer,
+                        help='distance to the track in km')
+    parser.add_argument('--workers', type=int, default=c.tile_workers,
+                        help='concurrent downloads')
+    args = parser.parse_args(args)
+
+    obj_track = track.Track()
+    for file in args.files:
+        obj_track.add_gpx(file)
+
+    # Segments are separated by nan
+    lat, lon = [], []
+    for seg_id in obj_track.segment_ids:
+        segment = obj_track.get_segment(seg_id)
+        lat.extend([segment.lat.to_numpy(), [np.nan]])
+        lon.extend([segment.lon.to_numpy(), [np.nan]])
+
+    def progress(done: int, total: int):
+        sys.stdout.write(f'\r{done}/{total} tiles')
+        sys.stdout.flush()
+
+    result = prefetch(np.concatenate(lat), np.concatenate(lon), args.zoom,
+                      args.buffer, args.workers, progress)
+    print(f'\n{result["available"]}/{result["tiles"]} tiles available, '
+          f'{result["cached"]} were already cached')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Partial redraws of the main figure. Edits mark the regions they change as
+dirty: the map, the elevation profile, the info table or single segments of
+the map. flush() renders only the dirty regions and requests a single
+canvas.draw_idle() for all of them. Segment artists are kept in a
+SegmentArtists registry and updated in place; the map image is replaced
+only if it is invalidated or the extremes of the track move. The info table
+is updated in place while the number of segments is the same. Selection is
+a change of properties of existing artists.
+"""
+import logging
+
+from src import plots
+from src.segment_artists import SegmentArtists
+
+LOGGER = logging.getLogger(__name__)
+
+MAP = 'map'
+ELEVATION = 'elevation'
+INFO = 'info'
+REGIONS = (MAP, ELEVATION, INFO)
+
+
+class RenderScheduler:
+    """
+    Dirty regions of the figure of a shared data namespace, which provides
+    obj_track, canvas, ax_track, ax_ele and ax_track_info.
+    """
+    def __init__(self, shared_data):
+        self.shared_data = shared_data
+        self.dirty = set()  # dirty regions
+        self.dirty_segments = set()  # ids of segments changed in the map
+        self.artists = SegmentArtists(shared_data.ax_track,
+                                      shared_data.ax_ele)
+        self.track_info_table = None  # last table of plot_track_info
+        self._map_extremes = None  # extremes of the plotted map, None for
+        # the world map
+
+        # Instrumentation: renders of each region, renders of the info
+        # table done in place and requested draws. Segment artists count
+        # their own creations and updates.
+        self.renders = {region: 0 for region in REGIONS}
+        self.info_updates = 0
+        self.draws = 0
+
+    def invalidate(self, *regions, segments=()):
+        """
+        Mark regions as dirty, they are rendered on next flush.
+        :param regions: any of MAP, ELEVATION and INFO
+        :param segments: ids of the segments whose points changed
+        """
+        unknown = set(regions) - set(REGIONS)
+        if unknown:
+            raise ValueError(f'Unknown regions: {unknown}')
+        self.dirty.update(regions)
+        self.dirty_segments.update(segments)
+
+    def invalidate_all(self):
+        self.invalidate(*REGIONS)
+
+    def flush(self) -> bool:
+        """
+        Render the dirty regions and request a single draw of the canvas.
+        :return: True if anything was dirty
+        """
+        if not self.dirty and not self.dirty_segments:
+            return False
+
+        obj_track = self.shared_data.obj_track
+        if obj_track.segment_ids:
+            self._render_track(obj_track)
+        else:
+            self._render_empty()
+
+        LOGGER.debug(f'render: {sorted(self.dirty)}, '
+                     f'{len(self.dirty_segments)} segments')
+        self.dirty.clear()
+        self.dirty_segments.clear()
+        self.shared_data.canvas.draw_idle()
+        self.draws += 1
+        return True
+
+    def select(self, seg_id: int = 0):
+        """
+        Highlight a segment in the map, the elevation profile and the info
+        table. Nothing is plotted again unless the axes were cleared, and
+        the canvas is not drawn if the selection does not change.
+        :param seg_id: segment id, 0 deselects
+        """
+        obj_track = self.shared_data.obj_track
+        if seg_id not in obj_track.segment_ids:
+            seg_id = 0
+        obj_track.selected_segment_idx = [seg_id] if seg_id else []
+
+        attached = self.artists.is_attached()
+        if seg_id == self.artists.selected and attached and \
+                self.artists.ob_track is obj_track and \
+                not self.dirty and not self.dirty_segments:
+            return
+        if not attached:
+            self.invalidate(ELEVATION)
+        self.artists.select(seg_id)
+        if self.track_info_table is not None:
+            plots.select_track_info(self.track_info_table, seg_id)
+        if not self.flush():
+            self.shared_data.canvas.draw_idle()
+            self.draws += 1
+
+    def _render_track(self, obj_track):
+        # Artists follow segments in place while the map is the same
+        if MAP in self.dirty or obj_track.extremes != self._map_extremes or \
+                self.artists.map_image not in \
+                self.shared_data.ax_track.images:
+            self.artists.set_map(*plots.generate_map(obj_track))
+            self._map_extremes = obj_track.extremes
+            self.renders[MAP] += 1
+        self.artists.update(obj_track, self.dirty_segments,
+                            elevation=ELEVATION in self.dirty)
+        self.artists.select(obj_track.selected_segment_idx[0] if
+                            obj_track.selected_segment_idx else 0)
+        if ELEVATION in self.dirty:
+            self.renders[ELEVATION] += 1
+
+        if INFO in self.dirty:
+            ax_info = self.shared_data.ax_track_info
+            if self.track_info_table in ax_info.tables and \
+                    plots.update_track_info(obj_track,
+                                            self.track_info_table):
+                self.info_updates += 1
+            else:
+                self.track_info_table = plots.plot_track_info(obj_track,
+                                                              ax_info)
+            self.renders[INFO] += 1
+        if self.track_info_table is not None:
+            plots.select_track_info(self.track_info_table,
+                                    self.artists.selected)
+        obj_track.selected_segment_idx = [self.artists.selected] \
+            if self.artists.selected else []
+
+    def _render_empty(self):
+        self.artists.clear()
+        self.shared_data.obj_track.selected_segment_idx = []
+        if MAP in self.dirty or self._map_extremes is not None:
+            plots.plot_world(self.shared_data.ax_track)
+            self._map_extremes = None
+            self.renders[MAP] += 1
+        if ELEVATION in self.dirty:
+            plots.plot_no_elevation(self.shared_data.ax_ele)
+            self.renders[ELEVATION] += 1
+        if INFO in self.dirty:
+            plots.plot_no_info(self.shared_data.ax_track_info)
+            self.track_info_table = None
+            self.renders[INFO] += 1
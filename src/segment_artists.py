@@ -0,0 +1,225 @@
+"""
+Artists of each segment of the track: a line in the map, and a line and a
+filled area in the elevation profile. They are created once per segment and
+afterwards their data, color, z-order and visibility are updated in place,
+so edits and selections do not clear the axes. The map image is a single
+artist updated in place too.
+"""
+import logging
+import numpy as np
+
+from src import plots
+
+LOGGER = logging.getLogger(__name__)
+
+LINEWIDTH = 1  # map line of a segment
+SELECTED_LINEWIDTH = 4  # map line of the selected segment
+ZORDER = 10
+SELECTED_ZORDER = 11
+
+
+def _attached(artists: dict, children: list) -> bool:
+    """
+    Artists of a registry are in their axes, clearing the axes removes all
+    of them so only one is checked.
+    """
+    return not artists or next(iter(artists.values())) in children
+
+
+class SegmentArtists:
+    """
+    Registry of the artists of the segments by segment id. The axes can be
+    cleared by other plots, such as the split tool; artists are then created
+    again on next update.
+    """
+    def __init__(self, ax_track, ax_ele):
+        self.ax_track = ax_track
+        self.ax_ele = ax_ele
+        self.ob_track = None  # track of the artists
+        self.map_image = None
+        self.lines = {}  # map line by segment id
+        self.ele_lines = {}  # elevation line by segment id
+        self.ele_areas = {}  # elevation area by segment id
+        self.selected = 0  # id of the selected segment, 0 for none
+        self.plotted_zoom = None  # level of detail of the map lines
+
+        # Instrumentation
+        self.created = 0  # created artists
+        self.updated = 0  # artists whose data was updated
+
+    def is_attached(self) -> bool:
+        """
+        :return: False if an axes was cleared after the artists were
+            created
+        """
+        return _attached(self.lines, self.ax_track.lines) and \
+            _attached(self.ele_lines, self.ax_ele.lines) and \
+            (self.map_image is None or
+             self.map_image in self.ax_track.images)
+
+    def set_map(self, map_img: np.array, bbox: tuple):
+        """
+        Show a map, limits of the axes are the map box.
+        :param map_img: image array
+        :param bbox: xmin, xmax, ymin, ymax of the image
+        """
+        if self.map_image not in self.ax_track.images:
+            self.ax_track.cla()
+            self._clear_map()
+            self.map_image = self.ax_track.imshow(
+                map_img, zorder=0, extent=bbox, aspect='equal')
+            self.ax_track.tick_params(axis='x', bottom=False, top=False,
+                                      labelbottom=False)
+            self.ax_track.tick_params(axis='y', left=False, right=False,
+                                      labelleft=False)
+            # Callbacks are reset by ax.cla()
+            self.ax_track.callbacks.connect('xlim_changed',
+                                            self._on_xlim_changed)
+        else:
+            self.map_image.set_data(map_img)
+            self.map_image.set_extent(bbox)
+        self.ax_track.set_xlim(bbox[0], bbox[1])
+        self.ax_track.set_ylim(bbox[2], bbox[3])
+
+    def update(self, ob_track, segments: set = None,
+               elevation: bool = True):
+        """
+        Follow the segments of a track: artists of removed segments are
+        removed and new segments get artists.
+        :param ob_track: track
+        :param segments: ids of the segments whose points changed in the
+            map, all of them by default
+        :param elevation: update data of every elevation profile, their
+            distance depends on the previous segments
+        """
+        self.ob_track = ob_track
+        if not _attached(self.lines, self.ax_track.lines):
+            self.lines = {}
+        if not self.ele_lines or \
+                not _attached(self.ele_lines, self.ax_ele.lines):
+            self._reset_elevation()
+            elevation = True
+
+        segment_ids = ob_track.segment_ids
+        for seg_id in set(self.lines) - set(segment_ids):
+            self.lines.pop(seg_id).remove()
+        for seg_id in set(self.ele_lines) - set(segment_ids):
+            self.ele_lines.pop(seg_id).remove()
+            self.ele_areas.pop(seg_id).remove()
+        if self.selected not in segment_ids:
+            self.selected = 0
+
+        zoom = plots._view_zoom(self.ax_track)
+        self.plotted_zoom = zoom
+        for position, seg_id in enumerate(segment_ids):
+            color = plots.segment_color(position)
+            if seg_id not in self.lines:
+                lat, lon = ob_track.get_segment_lod(seg_id, zoom)
+                self.lines[seg_id], = self.ax_track.plot(
+                    lon, lat, color=color, marker='o', markersize=2)
+                self.created += 1
+            elif segments is None or seg_id in segments:
+                lat, lon = ob_track.get_segment_lod(seg_id, zoom)
+                self.lines[seg_id].set_data(lon, lat)
+                self.updated += 1
+            self.lines[seg_id].set_color(color)
+
+            if seg_id not in self.ele_lines:
+                segment = ob_track.get_segment(seg_id)
+                self.ele_areas[seg_id] = self.ax_ele.fill_between(
+                    segment.distance, segment.ele, alpha=0.2, color=color)
+                self.ele_lines[seg_id], = self.ax_ele.plot(
+                    segment.distance, segment.ele, linewidth=2, color=color)
+                self.created += 2
+            elif elevation:
+                segment = ob_track.get_segment(seg_id)
+                self.ele_lines[seg_id].set_data(segment.distance,
+                                                segment.ele)
+                self.ele_areas[seg_id].set_verts(
+                    [plots.area_verts(segment.distance, segment.ele)])
+                self.updated += 2
+            self.ele_lines[seg_id].set_color(color)
+            self.ele_areas[seg_id].set_color(color)
+
+        if elevation:
+            ele = ob_track.df_track.ele
+            self.ax_ele.set_ylim((ele.min() * 0.8, ele.max() * 1.2))
+        self._apply_selection()
+
+    def select(self, seg_id: int = 0):
+        """
+        Highlight a segment: wider line on top of the others in the map and
+        only its profile in the elevation plot.
+        :param seg_id: segment id, 0 deselects
+        """
+        self.selected = seg_id if seg_id in self.lines else 0
+        self._apply_selection()
+
+    def clear(self):
+        """
+        Remove every artist.
+        """
+        for artists, children in ((self.lines, self.ax_track.lines),
+                                  (self.ele_lines, self.ax_ele.lines),
+                                  (self.ele_areas, self.ax_ele.collections)):
+            if _attached(artists, children):
+                for artist in artists.values():
+                    artist.remove()
+        if self.map_image in self.ax_track.images:
+            self.map_image.remove()
+        self._clear_map()
+        self.ele_lines = {}
+        self.ele_areas = {}
+        self.selected = 0
+
+    def _clear_map(self):
+        self.map_image = None
+        self.lines = {}
+        self.plotted_zoom = None
+
+    def _reset_elevation(self):
+        # Profile axes are new or were cleared by other plots, foreign
+        # artists are dropped
+        self.ax_ele.cla()
+        self.ele_lines = {}
+        self.ele_areas = {}
+        self.ax_ele.xaxis.set_major_formatter(plots.UnitFormatter('km'))
+        self.ax_ele.yaxis.set_major_formatter(plots.UnitFormatter('m'))
+        self.ax_ele.tick_params(axis='x', bottom=False, top=False,
+                                labelbottom=True)
+        self.ax_ele.tick_params(axis='y', left=False, right=False,
+                                labelleft=True)
+        self.ax_ele.grid(color='white')
+
+    def _apply_selection(self):
+        for seg_id, line in self.lines.items():
+            selected = seg_id == self.selected
+            line.set_linewidth(SELECTED_LINEWIDTH if selected else LINEWIDTH)
+            line.set_zorder(SELECTED_ZORDER if selected else ZORDER)
+
+        # Profile of the selected segment or of the full track
+        distance = []
+        for seg_id, line in self.ele_lines.items():
+            visible = self.selected in (0, seg_id)
+            line.set_visible(visible)
+            self.ele_areas[seg_id].set_visible(visible)
+            if visible:
+                distance.append(line.get_xdata())
+        if distance:
+            low = min(np.min(x) for x in distance)
+            high = max(np.max(x) for x in distance)
+            margin = self.ax_ele.margins()[0] * (high - low)
+            self.ax_ele.set_xlim(low - margin, high + margin)
+
+    def _on_xlim_changed(self, ax):
+        # Levels of detail are taken from the track cache, the canvas
+        # redraws after panning or zooming
+        zoom = plots._view_zoom(ax)
+        if zoom == self.plotted_zoom or self.ob_track is None or \
+                set(self.lines) != set(self.ob_track.segment_ids):
+            return
+        for seg_id, line in self.lines.items():
+            lat, lon = self.ob_track.get_segment_lod(seg_id, zoom)
+            line.set_data(lon, lat)
+        self.plotted_zoom = zoom
+        LOGGER.debug(f'level of detail: zoom {zoom}')
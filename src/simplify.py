@@ -0,0 +1,121 @@
+"""
+Level of detail of the track polyline. Ramer-Douglas-Peucker simplification
+is run once per segment down to zero tolerance, recording the tolerance at
+which each point is kept (its importance). The simplified polyline for any
+tolerance is then the set of points whose importance reaches it, so every
+zoom of the map is served by a single comparison.
+"""
+import math
+import numpy as np
+
+from src import constants as c
+
+TILE_PIXELS = 256  # size of OSM tiles
+
+
+def project(lat: np.array, lon: np.array) -> (np.array, np.array):
+    """
+    Local equirectangular projection, distances are in degrees of latitude.
+    :param lat: latitude in degrees
+    :param lon: longitude in degrees
+    :return: x, y coordinates
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    scale = math.cos(math.radians(np.nanmean(lat))) if lat.size else 1.0
+    return lon * scale, lat
+
+
+def rdp_importance(x: np.array, y: np.array) -> np.array:
+    """
+    Tolerance down to which each point is kept by Ramer-Douglas-Peucker. All
+    the intervals of a level of the recursion are split at the same time.
+    Importance never increases from a point to the points found inside its
+    intervals, so the simplifications of decreasing tolerance are nested.
+    :param x: x coordinates
+    :param y: y coordinates
+    :return: importance of each point, inf for the end points
+    """
+    n_points = x.size
+    importance = np.zeros(n_points)
+    importance[[0, -1]] = np.inf
+    if n_points < 3:
+        return importance
+
+    starts = np.array([0])
+    ends = np.array([n_points - 1])
+    parent = np.array([np.inf])
+    while starts.size:
+        # Interior points of every interval, flattened
+        lengths = ends - starts - 1
+        interval = np.repeat(np.arange(starts.size), lengths)
+        first = np.cumsum(lengths) - lengths
+        points = starts[interval] + 1 + np.arange(interval.size) - \
+            first[interval]
+
+        # Distance to the chord, or to the start if the chord is a point
+        chord_x = (x[ends] - x[starts])[interval]
+        chord_y = (y[ends] - y[starts])[interval]
+        rel_x = x[points] - x[starts][interval]
+        rel_y = y[points] - y[starts][interval]
+        chord = np.hypot(chord_x, chord_y)
+        distance = np.where(
+            chord > 0,
+            np.abs(chord_x * rel_y - chord_y * rel_x) /
+            np.where(chord > 0, chord, 1),
+            np.hypot(rel_x, rel_y))
+
+        # Farthest point of each interval, the first one in case of ties
+        max_distance = np.maximum.reduceat(distance, first)
+        farthest = np.flatnonzero(distance == max_distance[interval])
+        _, first_farthest = np.unique(interval[farthest], return_index=True)
+        split = points[farthest[first_farthest]]
+        importance[split] = np.minimum(max_distance, parent)
+
+        # Straight intervals have no relevant points left
+        curved = max_distance > 0
+        split, parent = split[curved], importance[split][curved]
+        new_starts = np.concatenate((starts[curved], split))
+        new_ends = np.concatenate((split, ends[curved]))
+        parent = np.concatenate((parent, parent))
+        pending = new_ends - new_starts > 1
+        starts, ends, parent = \
+            new_starts[pending], new_ends[pending], parent[pending]
+
+    return importance
+
+
+def zoom_tolerance(zoom: int, lat: float) -> float:
+    """
+    Size of constants.lod_tolerance pixels of a map at a zoom, in degrees of
+    latitude.
+    :param zoom: zoom grade
+    :param lat: latitude of the map in degrees
+    :return: tolerance in the units of project
+    """
+    return c.lod_tolerance * 360.0 * math.cos(math.radians(lat)) / \
+        (TILE_PIXELS * 2 ** zoom)
+
+
+def view_zoom(lon_span: float, width: float) -> int:
+    """
+    Zoom whose pixels are as small as the pixels of a view.
+    :param lon_span: longitude shown in degrees
+    :param width: width of the view in pixels
+    :return: zoom grade within 0 and constants.lod_max_zoom
+    """
+    if lon_span <= 0 or width <= 0:
+        return c.lod_max_zoom
+    zoom = math.ceil(math.log2(360.0 * width / (TILE_PIXELS * lon_span)))
+    return min(max(zoom, 0), c.lod_max_zoom)
+
+
+def lod_indices(importance: np.array, tolerance: float) -> np.array:
+    """
+    :param importance: importance of each point as returned by
+        rdp_importance
+    :param tolerance: maximum distance from the removed points to the
+        simplified polyline
+    :return: indices of the points of the simplified polyline
+    """
+    return np.flatnonzero(importance >= tolerance)
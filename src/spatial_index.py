@@ -0,0 +1,160 @@
+"""
+Uniform grid over the projected points of a track for nearest point queries.
+Points are sorted by cell, so the points of a cell are a slice of the sorted
+arrays and cells are found by binary search over the occupied cells.
+"""
+import math
+import numpy as np
+
+from src import geodesy
+
+RINGS = 3  # rings of cells visited one by one before filtering all cells
+
+
+class GridIndex:
+    """
+    Nearest neighbour index of a set of points. Coordinates are projected
+    with a local equirectangular projection in km, which is accurate for the
+    size of a track.
+    """
+    def __init__(self, lat: np.array, lon: np.array,
+                 points_per_cell: float = 4):
+        """
+        :param lat: latitude in degrees
+        :param lon: longitude in degrees
+        :param points_per_cell: average number of points per occupied cell
+            for evenly distributed points
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        self.size = valid.size
+        if self.size == 0:
+            return
+
+        self._lat0 = float(np.mean(lat[valid]))
+        x, y = self._project(lat[valid], lon[valid])
+        self._x_min, self._y_min = x.min(), y.min()
+
+        # Cell size from the length of the track, points lie along a line
+        extent = max(x.max() - self._x_min, y.max() - self._y_min)
+        self.cell = max(extent * points_per_cell / self.size, 1e-6)
+        self._n_x = int((x.max() - self._x_min) / self.cell) + 1
+        self._n_y = int((y.max() - self._y_min) / self.cell) + 1
+
+        cell_x, cell_y = self._cell(x, y)
+        keys = cell_x * self._n_y + cell_y
+        order = np.argsort(keys, kind='stable')
+        self._keys, self._first = np.unique(keys[order], return_index=True)
+        self._last = np.append(self._first[1:], order.size)
+        self._cell_x, self._cell_y = np.divmod(self._keys, self._n_y)
+        self._x, self._y = x[order], y[order]
+        self._index = valid[order]
+
+    def _project(self, lat, lon) -> (np.array, np.array):
+        scale = math.radians(geodesy.EARTH_RADIUS)
+        return np.asarray(lon) * scale * math.cos(math.radians(self._lat0)), \
+            np.asarray(lat) * scale
+
+    def _cell(self, x, y) -> (np.array, np.array):
+        return np.floor((x - self._x_min) / self.cell).astype(np.int64), \
+            np.floor((y - self._y_min) / self.cell).astype(np.int64)
+
+    def nearest(self, lat: float, lon: float) -> (int, float):
+        """
+        Closest point to a location. Rings of cells around the location are
+        visited until no unvisited cell can hold a closer point. Locations
+        far from the points filter the occupied cells at once instead.
+        :param lat: latitude in degrees
+        :param lon: longitude in degrees
+        :return: index of the point in the arrays given to the constructor
+            and its distance in km in the projection, (-1, inf) if the index
+            is empty
+        """
+        if self.size == 0:
+            return -1, math.inf
+
+        x, y = self._project(lat, lon)
+        cell_x, cell_y = (int(v) for v in self._cell(x, y))
+        # Rings before the first one and beyond the last one are outside the
+        # grid
+        first_ring = max(0, -cell_x, cell_x - self._n_x + 1,
+                         -cell_y, cell_y - self._n_y + 1)
+        last_ring = max(abs(cell_x), abs(cell_x - self._n_x + 1),
+                        abs(cell_y), abs(cell_y - self._n_y + 1))
+
+        best, best_distance = -1, math.inf
+        # Locations out of the grid go straight to the filter of cells
+        visited_ring = min(first_ring + RINGS, last_ring) \
+            if first_ring == 0 else -1
+        for ring in range(first_ring, visited_ring + 1):
+            # Every point out of the visited rings is farther than this
+            if best_distance <= (ring - 1) * self.cell:
+                return best, best_distance
+            keys = self._ring_keys(cell_x, cell_y, ring)
+            position = np.searchsorted(self._keys, keys)
+            found = position < self._keys.size
+            found[found] = self._keys[position[found]] == keys[found]
+            best, best_distance = self._closest(
+                position[found], x, y, best, best_distance)
+
+        if visited_ring == last_ring or \
+                best_distance <= visited_ring * self.cell:
+            return best, best_distance
+
+        # Far from the points: occupied cells are filtered by their ring
+        ring = np.maximum(np.abs(self._cell_x - cell_x),
+                          np.abs(self._cell_y - cell_y))
+        if best < 0:
+            best, best_distance = self._closest(
+                np.flatnonzero(ring == ring.min()), x, y, best, best_distance)
+        last_ring = int(best_distance / self.cell) + 1
+        return self._closest(np.flatnonzero(ring <= last_ring), x, y,
+                             best, best_distance)
+
+    def _closest(self, cells: np.array, x: float, y: float,
+                 best: int, best_distance: float) -> (int, float):
+        """
+        Closest point of some cells to a location, if it is closer than the
+        current best. Ties are solved by point order.
+        :param cells: positions of the cells in the occupied cells
+        :param x: projected x of the location
+        :param y: projected y of the location
+        :param best: current closest point
+        :param best_distance: distance of the current closest point
+        :return: closest point and its distance
+        """
+        if cells.size == 0:
+            return best, best_distance
+
+        first = self._first[cells]
+        lengths = self._last[cells] - first
+        points = np.repeat(first - np.cumsum(lengths) + lengths,
+                           lengths) + np.arange(lengths.sum())
+        distance = np.hypot(self._x[points] - x, self._y[points] - y)
+
+        min_distance = float(distance.min())
+        candidate = int(self._index[points[distance == min_distance]].min())
+        if min_distance < best_distance or \
+                (min_distance == best_distance and candidate < best):
+            return candidate, min_distance
+        return best, best_distance
+
+    def _ring_keys(self, cell_x: int, cell_y: int, ring: int) -> np.array:
+        """
+        Keys of the cells of the grid at Chebyshev distance ring from a cell.
+        """
+        if ring == 0:
+            return np.array([cell_x * self._n_y + cell_y])
+
+        # Rows and columns of the ring, clipped to the grid
+        span_x = np.arange(max(cell_x - ring, 0),
+                           min(cell_x + ring, self._n_x - 1) + 1)
+        span_y = np.arange(max(cell_y - ring + 1, 0),
+                           min(cell_y + ring - 1, self._n_y - 1) + 1)
+        keys = [span_x * self._n_y + row for row in
+                (cell_y - ring, cell_y + ring) if 0 <= row < self._n_y]
+        keys += [column * self._n_y + span_y for column in
+                 (cell_x - ring, cell_x + ring) if 0 <= column < self._n_x]
+        return np.sort(np.concatenate(keys)) if keys else \
+            np.empty(0, dtype=np.int64)
@@ -1,7 +1,54 @@
-from bisect import bisect
+import time
+import logging
+import numpy as np
 import pandas as pd
 
 import src.plots as plots
+import src.render as render
+from src import constants as c
+
+LOGGER = logging.getLogger(__name__)
+
+DISPATCH_KEY = 'split_segment'  # key of the handlers in the dispatcher
+
+
+def _decimate(distance: np.array, ele: np.array, n_bins: int) -> np.array:
+    """
+    Points which draw the same profile at a given horizontal resolution: the
+    first, last, lowest and highest points of each bin of distance.
+    :param distance: cumulative distance, not decreasing
+    :param ele: elevation
+    :param n_bins: number of bins, such as the width of the axes in pixels
+    :return: sorted positions of the kept points
+    """
+    n_points = distance.size
+    span = distance[-1] - distance[0] if n_points else 0
+    if n_points <= 4 * n_bins or span <= 0:
+        return np.arange(n_points)
+
+    bins = ((distance - distance[0]) / span * n_bins).astype(np.int64)\
+        .clip(0, n_bins - 1)
+    bounds = np.flatnonzero(np.diff(bins)) + 1
+    first = np.concatenate(([0], bounds))
+    last = np.append(bounds, n_points) - 1
+
+    # Points sorted by elevation within each bin
+    order = np.lexsort((ele, bins))
+    return np.unique(np.concatenate((first, last, order[first],
+                                     order[last])))
+
+
+def _disconnect_button(button, cid: int):
+    """
+    Disconnect a callback of a button, also from one of its own callbacks.
+    Buttons of matplotlib < 3.4 iterate their observers dict while calling
+    them, so it is replaced instead of modified.
+    """
+    if isinstance(getattr(button, 'observers', None), dict):
+        button.observers = {key: func for key, func
+                            in button.observers.items() if key != cid}
+    else:
+        button.disconnect(cid)
 
 
 class SplitSegment:
@@ -11,21 +58,54 @@ class SplitSegment:
         self.df_segment = df_segment
         self.segment_idx = self.df_segment.segment.iloc[0]  # idx selected
                                                             # segment
-        self.max_index = df_segment.index[-1]  # last index in dataframe
         self.ax = [shared_data.ax_track, shared_data.ax_ele]
         self.track = shared_data.obj_track
         self.canvas = shared_data.canvas
 
+        # Arrays of the segment by position, index_map gives the index of
+        # each position in the track
+        self.distance = df_segment.distance.to_numpy()
+        self.ele = df_segment.ele.to_numpy()
+        self.lat = df_segment.lat.to_numpy()
+        self.lon = df_segment.lon.to_numpy()
+        self.index_map = df_segment.index.to_numpy()
+
+        # Drawn profile is reduced to the resolution of the axes, so frames
+        # take the same time for any segment length
+        self.profile = _decimate(self.distance, self.ele,
+                                 max(int(self.ax[1].bbox.width), 1))
+
+        # Extra properties, the second sub-segment starts at least in the
+        # second point so none of them is empty
+        self.position = min(1, self.distance.size - 1)  # position of index
+        # in the segment arrays
+        self.index = int(self.index_map[self.position])  # first point of
+        # the second sub-segment in the track
+        self.press = None
+        self.cid_done = None  # callback of the done button
+
+        # Blitting: backgrounds without the moving artists and frame timing
+        self.backgrounds = None
+        self.pending_position = None  # position of a throttled motion event
+        self.last_frame = 0.0
+        self.frame_times = []  # s, duration of each blitted frame
+        self.timer = self.canvas.new_timer()  # shows throttled positions
+        self.timer.single_shot = True
+        self.timer.add_callback(self.on_timer)
+
         # Prepare initial plot for splitting option
         self.vline, self.filled_area, self.ele_line, self.point = \
             self.initial_plot()
+        self.move_split(self.position)
 
-        # Extra properties
-        self.index = 0  # variable to play with dataframe index
-        self.press = None
-        self.cidpress = None
-        self.cidrelease = None
-        self.cidmotion = None
+    @property
+    def animated_artists(self) -> list:
+        """
+        Artists which move with the split line, they are only drawn by
+        blitting.
+        """
+        return [self.filled_area[0], self.filled_area[1], self.ele_line[0],
+                self.ele_line[1], self.vline, self.point]
 
     def initial_plot(self):
         """
@@ -36,6 +116,8 @@ class SplitSegment:
                 elevation plot
             - point: will be display in map corresponding to vline point
             - line, area: change color to visualize each new segment
+        Every output is animated, so it is not drawn by canvas.draw() but
+        blitted over the cached background.
         """
 
         # Common objects management
@@ -46,39 +128,63 @@ class SplitSegment:
                              self.shared_data.ax_ele,
                              selected_segment_idx=self.segment_idx)
 
-        area = ax_ele.fill_between(self.df_segment.distance,
-                                   self.df_segment.ele,
-                                   color='b', alpha=0.2)
-        line = ax_ele.plot(self.df_segment.distance, self.df_segment.ele,
-                           color='b', linewidth=2)
+        # Data of the sub-segments is set when the split point is moved
+        areas = [ax_ele.fill_between([], [], color='r', alpha=0.2,
+                                     animated=True),
+                 ax_ele.fill_between([], [], color='b', alpha=0.2,
+                                     animated=True)]
+        lines = [ax_ele.plot([], [], color='r', linewidth=2,
+                             animated=True)[0],
+                 ax_ele.plot([], [], color='b', linewidth=2,
+                             animated=True)[0]]
 
-        vline = ax_ele.axvline(self.df_segment.distance.iloc[0], linewidth=2)
+        vline = ax_ele.axvline(self.distance[0], linewidth=2, animated=True)
 
-        point = self.shared_data.ax_track.scatter(
-            self.df_segment.lon.iloc[0], self.df_segment.lat.iloc[0],
-            s=35, marker='o', c='r', zorder=20)
+        point, = self.shared_data.ax_track.plot(
+            self.lon[0], self.lat[0],
+            marker='o', markersize=6, color='r', linestyle='', zorder=20,
+            animated=True)
 
         # Enable button
         self.shared_data.btn_done.label._text = 'Done'
         self.shared_data.btn_done.hovercolor = '0.95'
         self.shared_data.btn_done.label._color = '0.05'
 
-        self.shared_data.fig_track.canvas.draw()
-        self.shared_data.fig_ele.canvas.draw()
-
-        return vline, [area, None], [line, None], point
+        return vline, areas, lines, point
 
     def connect(self):
         """connect to all the events we need"""
-        self.cidpress = self.canvas.mpl_connect(
-            'button_press_event', self.on_press)
-        self.cidrelease = self.canvas.mpl_connect(
-            'button_release_event', self.on_release)
-        self.cidmotion = self.canvas.mpl_connect(
-            'motion_notify_event', self.on_motion)
-        # These prints are needed to work. They produce an exception, but
-        # they make this utility to work for some reason...
-        print(f'cidpress: {cidpress}')
+        # Handlers of a previous split tool are replaced
+        dispatcher = self.shared_data.dispatcher
+        dispatcher.connect('button_press_event', DISPATCH_KEY, self.on_press)
+        dispatcher.connect('button_release_event', DISPATCH_KEY,
+                           self.on_release)
+        dispatcher.connect('motion_notify_event', DISPATCH_KEY,
+                           self.on_motion)
+        # Backgrounds are taken again after every full draw, such as after
+        # resizing the window
+        dispatcher.connect('draw_event', DISPATCH_KEY, self.on_draw)
+        self.canvas.draw()
+
+    def on_draw(self, event):
+        """cache the background of the axes and draw the moving artists"""
+        self.backgrounds = [self.canvas.copy_from_bbox(ax.bbox)
+                            for ax in self.ax]
+        for artist in self.animated_artists:
+            artist.axes.draw_artist(artist)
+
+    def blit(self):
+        """draw the moving artists over the cached backgrounds"""
+        if self.backgrounds is None:
+            self.canvas.draw()
+            return
+
+        for ax, background in zip(self.ax, self.backgrounds):
+            self.canvas.restore_region(background)
+        for artist in self.animated_artists:
+            artist.axes.draw_artist(artist)
+        for ax in self.ax:
+            self.canvas.blit(ax.bbox)
 
     def on_press(self, event):
         """on button press we will see if the mouse is over us and store some
@@ -105,89 +211,106 @@ class SplitSegment:
         x0, xpress = self.press
         dx = event.xdata - xpress
 
-        # Move objects
-        distance = self.df_segment.distance
-        first_index = distance.index[0]
-        self.index = bisect(distance.reset_index(drop=True), x0 + dx) + \
-                     first_index
+        # First point after the cursor, as bisect. The first point always
+        # belongs to the first sub-segment
+        position = min(max(int(self.distance.searchsorted(x0 + dx,
+                                                          side='right')),
+                           1),
+                       self.distance.size - 1)
+        if position == self.position:
+            self.pending_position = None
+            return
 
-        # DEBUG print
-        # print(f'x0={x0}, dx={dx}, index={self.index}, max_index={self.max_index}')
-        if self.index < 0:
-            self.index = 0
-        elif self.index > self.max_index:
-            self.index = self.max_index
+        # Throttle: events faster than the frame rate only store the
+        # position, a one-shot timer shows it if the cursor stops
+        wait = 1 / c.split_max_fps - (time.perf_counter() - self.last_frame)
+        if wait > 0:
+            if self.pending_position is None:
+                self.timer.interval = max(int(wait * 1000), 1)
+                self.timer.start()
+            self.pending_position = position
+            return
 
-        self.vline.set_xdata(2 * [distance[self.index]])
+        self.update_split(position)
 
-        # Update position
-        try:
-            self.point.remove()
-        except Exception as e:
-            print(e)
-
-        self.point = self.ax[0].scatter(self.df_segment.lon[self.index],
-                                        self.df_segment.lat[self.index],
-                                        s=35, marker='o', c='r', zorder=20)
-
-        # Update elevation
-        try:
-            self.ele_line[0][0].remove()
-            self.ele_line[1][0].remove()
-            self.filled_area[0].remove()
-            self.filled_area[1].remove()
-        except (IndexError, TypeError) as e:
-            print(e)
-
-        self.ele_line[0] = self.ax[1].plot(
-            self.df_segment.distance.loc[:self.index+1],
-            self.df_segment.ele.loc[:self.index+1],
-            color='r', linewidth=2)
-        self.ele_line[1] = self.ax[1].plot(
-            self.df_segment.distance.loc[self.index:],
-            self.df_segment.ele.loc[self.index:],
-            color='b', linewidth=2)
-
-        self.filled_area[0] = self.ax[1].fill_between(
-            self.df_segment.distance.loc[:self.index],
-            self.df_segment.ele.loc[:self.index],
-            color='r', alpha=0.2)
-        self.filled_area[1] = self.ax[1].fill_between(
-            self.df_segment.distance.loc[self.index:],
-            self.df_segment.ele.loc[self.index:],
-            color='b', alpha=0.2)
+    def on_timer(self):
+        """show the position of the last throttled motion event"""
+        if self.pending_position is not None:
+            self.update_split(self.pending_position)
 
-        self.canvas.draw()
+    def update_split(self, position: int):
+        """
+        Move the split point and the sub-segments in place and blit them.
+        :param position: first point of the second sub-segment, as position
+            in the segment
+        """
+        start = time.perf_counter()
+        self.move_split(position)
+        self.blit()
+        self.last_frame = time.perf_counter()
+        self.frame_times.append(self.last_frame - start)
+
+    def move_split(self, position: int):
+        """
+        Set the split point and the data of the sub-segments, without
+        drawing them.
+        :param position: first point of the second sub-segment, as position
+            in the segment
+        """
+        self.position = position
+        self.index = int(self.index_map[position])
+        self.pending_position = None
+
+        self.vline.set_xdata(2 * [self.distance[position]])
+        self.point.set_data([self.lon[position]], [self.lat[position]])
+
+        # Update elevation, both sub-segments include the split point
+        first = np.append(
+            self.profile[:np.searchsorted(self.profile, position)], position)
+        second = np.concatenate(([position], self.profile[
+            np.searchsorted(self.profile, position, side='right'):]))
+        for line, area, points in ((self.ele_line[0], self.filled_area[0],
+                                    first),
+                                   (self.ele_line[1], self.filled_area[1],
+                                    second)):
+            line.set_data(self.distance[points], self.ele[points])
+            area.set_verts([plots.area_verts(self.distance[points],
+                                             self.ele[points])])
 
     def on_release(self, event):
         """on release we reset the press data"""
-
         self.press = None
+        if self.pending_position is not None:
+            self.update_split(self.pending_position)
+        if self.frame_times:
+            LOGGER.debug(f'split frames: {len(self.frame_times)}, '
+                         f'mean {np.mean(self.frame_times) * 1000:.1f} ms, '
+                         f'max {np.max(self.frame_times) * 1000:.1f} ms')
 
         def divide_segment(_event):
-            # DEBUG
-            #print()
-            #print(f'segment.iloc[0]={self.df_segment.segment.iloc[0]}')
-            #print(f'index={self.index}')
             self.track.divide_segment(
                 self.df_segment.segment.iloc[0],
                 self.index)
-            self.disconnect()
-            #print(self.shared_data.my_track.track)
-
-            # Update plot
-            plots.plot_track(self.shared_data.obj_track,
-                             self.shared_data.ax_track)
-            plots.plot_track_info(
-                self.shared_data.obj_track,
-                self.shared_data.ax_track_info)
-
-            plots.plot_elevation(self.shared_data.obj_track,
-                                 self.shared_data.ax_ele)
-
-        self.shared_data.btn_done.on_clicked(divide_segment)
-
-        self.canvas.draw()
+            self.close()  # map is not cleared by the update
+
+            # Update plot, ids of the next segments are increased
+            self.shared_data.scheduler.invalidate(
+                render.ELEVATION, render.INFO,
+                segments=[seg_id for seg_id in self.track.segment_ids
+                          if seg_id >= self.segment_idx])
+            self.shared_data.scheduler.flush()
+
+        # Each release would add another callback, so the division would
+        # run once per release
+        if self.cid_done is None:
+            self.cid_done = \
+                self.shared_data.btn_done.on_clicked(divide_segment)
+
+    def close(self):
+        """disconnect the tool and remove its point from the map"""
+        self.disconnect()
+        if self.point in self.shared_data.ax_track.lines:
+            self.point.remove()
 
     def disconnect(self):
         """disconnect all the stored connection ids"""
@@ -197,6 +320,8 @@ class SplitSegment:
         self.shared_data.btn_done.label._color = '0.6'
 
         # Disconnect
-        self.canvas.mpl_disconnect(self.cidpress)
-        self.canvas.mpl_disconnect(self.cidrelease)
-        self.canvas.mpl_disconnect(self.cidmotion)
+        self.timer.stop()
+        self.shared_data.dispatcher.disconnect(DISPATCH_KEY)
+        if self.cid_done is not None:
+            _disconnect_button(self.shared_data.btn_done, self.cid_done)
+            self.cid_done = None
@@ -0,0 +1,124 @@
+"""
+Disk budget of the downloaded tiles. The catalog records the size and the
+last access time of each tile; when the total size exceeds the budget, the
+least recently used tiles are removed from disk (tiles directory or tile
+store) and from the catalog.
+"""
+import os
+import logging
+
+from src import constants as c, tile_store
+from src.db_handler import DbHandler
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TileCacheManager:
+    """
+    Accounting and eviction of the tiles in the catalog of a DbHandler. The
+    database must be opened by the caller and used only from its thread.
+    Hits, misses and evictions are counted since the manager is created.
+    """
+    def __init__(self, dbh: DbHandler, max_bytes: int = c.tile_disk_budget):
+        self.dbh = dbh
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def record(self, available: list, missing: list):
+        """
+        Count requested tiles and refresh the access time of the available
+        ones.
+        :param available: list of (zoom, x, y) which are already stored
+        :param missing: list of (zoom, x, y) which must be downloaded
+        """
+        self.hits += len(available)
+        self.misses += len(missing)
+        if available:
+            self.dbh.touch_tiles(available)
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def size(self) -> int:
+        """
+        :return: bytes of the tiles in the catalog
+        """
+        return sum(size for _, size in self.dbh.get_size_by_zoom().values())
+
+    def enforce_budget(self, keep: list = ()) -> int:
+        """
+        Evict least recently used tiles until the size is within the budget.
+        :param keep: list of (zoom, x, y) which are not evicted, such as the
+            tiles of the map being plotted
+        :return: number of evicted tiles
+        """
+        return self.evict(self.max_bytes, keep)
+
+    def evict(self, max_bytes: int, keep: list = ()) -> int:
+        """
+        Remove least recently used tiles until the size is max_bytes or less.
+        Files are deleted before their rows, so a failure leaves at most
+        rows of missing files, which are downloaded again.
+        :param max_bytes: size to reach, 0 removes every tile
+        :param keep: list of (zoom, x, y) which are not evicted
+        :return: number of evicted tiles
+        """
+        excess = self.size() - max_bytes
+        if excess <= 0 and max_bytes > 0:
+            return 0
+
+        keep = set(keep)
+        evicted = []
+        evicted_bytes = 0
+        for zoom, x, y, _, size in self.dbh.get_tiles_by_access():
+            if evicted_bytes >= excess and max_bytes > 0:
+                break
+            if (zoom, x, y) in keep:
+                continue
+            evicted.append((zoom, x, y))
+            evicted_bytes += size or 0
+
+        # Tiles downloaded before the store was used are still files
+        store = tile_store.get_store()
+        if store is not None:
+            store.remove_tiles(evicted)
+        for zoom, x, y in evicted:
+            try:
+                os.remove(f'tiles/{zoom}/{x}/{y}.png')
+            except FileNotFoundError:
+                pass
+        self.dbh.remove_tiles(evicted)
+
+        self.evictions += len(evicted)
+        self.evicted_bytes += evicted_bytes
+        LOGGER.info(f'{len(evicted)} tiles evicted, {evicted_bytes} bytes')
+        return len(evicted)
+
+    def clear(self) -> int:
+        """
+        Remove every tile from disk and catalog, including failed
+        downloads.
+        :return: number of evicted tiles
+        """
+        return self.evict(0)
+
+    def stats(self) -> dict:
+        """
+        :return: dictionary with hits, misses, hit_rate, evictions,
+            evicted_bytes, size in bytes, budget and by_zoom as
+            {zoom: (number of tiles, bytes)}
+        """
+        by_zoom = self.dbh.get_size_by_zoom()
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hit_rate,
+                'evictions': self.evictions,
+                'evicted_bytes': self.evicted_bytes,
+                'size': sum(size for _, size in by_zoom.values()),
+                'budget': self.max_bytes,
+                'by_zoom': by_zoom}
@@ -0,0 +1,235 @@
+"""
+Single file tile store: tiles are kept as blobs in a SQLite database with the
+MBTiles layout, instead of one file per tile under tiles/{zoom}/{x}/{y}.png.
+The store is used when constants.tile_store_file is defined.
+
+Migration of the tiles directory into a store, tiles are registered in the
+tile catalog of constants.db_file:
+    python -m src.tile_store [tiles_dir] [store_file]
+"""
+import io
+import os
+import sys
+import sqlite3
+import logging
+
+from src import constants as c, db_handler
+
+LOGGER = logging.getLogger(__name__)
+
+_STORE = None  # store opened by get_store
+CATALOG = 'catalog'  # schema name of the attached tile catalog
+
+
+class TileStore:
+    """
+    MBTiles archive. Rows follow the TMS scheme, so tile_row is flipped
+    with respect to the OSM y tile index. SQLite connection must be used
+    only from the thread which opens the store.
+    """
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.path = os.path.abspath(filename)
+        self.conn = sqlite3.connect(filename)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS metadata (
+                                     name TEXT PRIMARY KEY,
+                                     value TEXT)""")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS tiles (
+                                     zoom_level INTEGER NOT NULL,
+                                     tile_column INTEGER NOT NULL,
+                                     tile_row INTEGER NOT NULL,
+                                     tile_data BLOB,
+                                     PRIMARY KEY (zoom_level, tile_column,
+                                                  tile_row))""")
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO metadata VALUES (?, ?)',
+                [('name', c.tool), ('format', 'png'),
+                 ('type', 'baselayer'), ('version', c.version)])
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _tms_row(zoom: int, ytile: int) -> int:
+        return (1 << zoom) - 1 - ytile
+
+    def get(self, zoom: int, xtile: int, ytile: int) -> bytes:
+        """
+        :param zoom: zoom grade
+        :param xtile: OSM X-tile
+        :param ytile: OSM Y-tile
+        :return: content of the tile, None if it is not stored
+        """
+        row = self.conn.execute(
+            'SELECT tile_data FROM tiles WHERE zoom_level=? AND '
+            'tile_column=? AND tile_row=?',
+            (zoom, xtile, self._tms_row(zoom, ytile))).fetchone()
+        return row[0] if row else None
+
+    def put_tiles(self, tiles: list, catalog: list = ()):
+        """
+        Store a batch of tiles in a single transaction.
+        :param tiles: list of (zoom, x, y, content)
+        :param catalog: rows upserted in the same transaction into the tile
+            catalog attached by attach_catalog, list of (zoom, x, y,
+            status, path, size, last_access)
+        """
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)',
+                [(zoom, x, self._tms_row(zoom, y), sqlite3.Binary(data))
+                 for zoom, x, y, data in tiles])
+            if catalog:
+                # Table names are case insensitive, Tiles of the catalog
+                # must be qualified
+                self.conn.executemany(
+                    db_handler.UPSERT_TILE.replace(
+                        'INTO Tiles', f'INTO {CATALOG}.Tiles', 1),
+                    catalog)
+
+    def attach_catalog(self, db_file: str):
+        """
+        Attach the tile catalog of a DbHandler, so tiles and their catalog
+        rows are written in a single transaction.
+        :param db_file: database of the catalog
+        """
+        dbh = db_handler.DbHandler(db_file)
+        dbh.open_db()  # Tiles table is created or migrated
+        dbh.close_db()
+        self.conn.execute(f'ATTACH DATABASE ? AS {CATALOG}', (db_file,))
+
+    def detach_catalog(self):
+        self.conn.execute(f'DETACH DATABASE {CATALOG}')
+
+    def stored_tiles(self, tiles: list) -> set:
+        """
+        :param tiles: list of (zoom, x, y)
+        :return: set of the tiles which are stored
+        """
+        stored = set()
+        tiles = list(tiles)
+        batch = 300  # 3 parameters per tile, limit is 999 in old sqlite
+        for i in range(0, len(tiles), batch):
+            chunk = tiles[i:i + batch]
+            values = ', '.join(['(?, ?, ?)'] * len(chunk))
+            rows = self.conn.execute(
+                f"""SELECT zoom_level, tile_column, tile_row FROM tiles
+                    WHERE (zoom_level, tile_column, tile_row)
+                    IN (VALUES {values})""",
+                [value for zoom, x, y in chunk
+                 for value in (zoom, x, self._tms_row(zoom, y))])
+            stored.update((zoom, x, self._tms_row(zoom, row))
+                          for zoom, x, row in rows)
+        return stored
+
+    def remove_tiles(self, tiles: list):
+        """
+        :param tiles: list of (zoom, x, y)
+        """
+        with self.conn:
+            self.conn.executemany(
+                'DELETE FROM tiles WHERE zoom_level=? AND tile_column=? '
+                'AND tile_row=?',
+                [(zoom, x, self._tms_row(zoom, y)) for zoom, x, y in tiles])
+
+
+def get_store():
+    """
+    Store defined by constants.tile_store_file, it is opened once.
+    :return: TileStore or None if tiles are stored as files
+    """
+    global _STORE
+    if not c.tile_store_file:
+        return None
+    if _STORE is None or _STORE.path != os.path.abspath(c.tile_store_file):
+        _STORE = TileStore(c.tile_store_file)
+    return _STORE
+
+
+def tile_source(zoom: int, xtile: int, ytile: int):
+    """
+    Source to read a tile with matplotlib.image.imread.
+    :param zoom: zoom grade
+    :param xtile: OSM X-tile
+    :param ytile: OSM Y-tile
+    :return: file path or file-like object with the content in the store
+    """
+    store = get_store()
+    if store is None:
+        return f'tiles/{zoom}/{xtile}/{ytile}.png'
+
+    data = store.get(zoom, xtile, ytile)
+    if data is None:
+        raise FileNotFoundError(
+            f'Tile ({zoom},{xtile},{ytile}) is not in {store.filename}')
+    return io.BytesIO(data)
+
+
+def migrate(tiles_dir: str, store: TileStore, batch: int = 1000,
+            db_file: str = None) -> int:
+    """
+    Copy the tiles of a directory with tiles/{zoom}/{x}/{y}.png layout into
+    a store. Empty files, which are failed downloads, are skipped.
+    :param tiles_dir: tiles directory
+    :param store: destination store
+    :param batch: tiles stored in each transaction
+    :param db_file: tile catalog where migrated tiles are registered with
+        their size and modification time as last access, so they count in
+        the disk budget. None to skip the catalog.
+    :return: number of migrated tiles
+    """
+    if db_file is not None:
+        store.attach_catalog(db_file)
+
+    def save(pending: list):
+        catalog = [(zoom, x, y, True, store.filename, len(data), mtime)
+                   for (zoom, x, y, data), mtime in pending] \
+            if db_file is not None else ()
+        store.put_tiles([tile for tile, _ in pending], catalog)
+
+    pending = []  # ((zoom, x, y, content), modification time)
+    total_tiles = 0
+    try:
+        for root, _, files in os.walk(tiles_dir):
+            parts = os.path.relpath(root, tiles_dir).split(os.sep)
+            if len(parts) != 2 or not all(p.isdigit() for p in parts):
+                continue
+            zoom, xtile = map(int, parts)
+
+            for filename in files:
+                name, extension = os.path.splitext(filename)
+                path = os.path.join(root, filename)
+                stat = os.stat(path)
+                if extension != '.png' or not name.isdigit() or \
+                        stat.st_size == 0:
+                    continue
+                with open(path, 'rb') as tile_file:
+                    pending.append(((zoom, xtile, int(name),
+                                     tile_file.read()), stat.st_mtime))
+
+                if len(pending) == batch:
+                    save(pending)
+                    total_tiles += len(pending)
+                    pending = []
+
+        save(pending)
+        total_tiles += len(pending)
+    finally:
+        if db_file is not None:
+            store.detach_catalog()
+
+    LOGGER.info(f'{total_tiles} tiles migrated from {tiles_dir} to '
+                f'{store.filename}')
+    return total_tiles
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else 'tiles'
+    destination = sys.argv[2] if len(sys.argv) > 2 else 'tiles.mbtiles'
+    tile_store = TileStore(destination)
+    print(f'{migrate(source, tile_store, db_file=c.db_file)} tiles '
+          f'migrated to {destination}')
+    tile_store.close()
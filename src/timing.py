@@ -0,0 +1,76 @@
+"""
+Timing models to synthesize timestamps along a track. All of them are
+evaluated over whole arrays of point to point steps.
+"""
+import numpy as np
+
+from src import constants as c
+
+
+def constant_hours(step: np.array, ele_diff: np.array,
+                   speed: np.array) -> np.array:
+    """
+    Constant speed, elevation is not considered.
+    :param step: distance from previous point in km
+    :param ele_diff: elevation difference from previous point in m
+    :param speed: speed in km/h
+    :return: hours from previous point
+    """
+    return step / speed
+
+
+def tobler_hours(step: np.array, ele_diff: np.array,
+                 speed: np.array) -> np.array:
+    """
+    Tobler's hiking function, scaled such way that speed is kept on flat
+    terrain: v = speed * exp(-3.5 * |grade + 0.05|) / exp(-3.5 * 0.05)
+    :param step: distance from previous point in km
+    :param ele_diff: elevation difference from previous point in m
+    :param speed: speed on flat terrain in km/h
+    :return: hours from previous point
+    """
+    grade = np.divide(ele_diff, step * 1000,
+                      out=np.zeros(np.shape(step)), where=step > 0)
+    grade = np.clip(grade, -c.max_grade, c.max_grade)
+    tobler_speed = speed * np.exp(-3.5 * (np.abs(grade + 0.05) - 0.05))
+    return step / tobler_speed
+
+
+def naismith_hours(step: np.array, ele_diff: np.array,
+                   speed: np.array) -> np.array:
+    """
+    Naismith's rule, time at constant speed plus a penalty for ascent.
+    :param step: distance from previous point in km
+    :param ele_diff: elevation difference from previous point in m
+    :param speed: speed on flat terrain in km/h
+    :return: hours from previous point
+    """
+    return step / speed + np.clip(ele_diff, 0, None) / c.naismith_ascent_rate
+
+
+MODELS = {'constant': constant_hours,
+          'tobler': tobler_hours,
+          'naismith': naismith_hours}
+
+
+def timestamps(initial_time, distance: np.array, ele: np.array,
+               speed: np.array, model: str = 'constant') -> np.array:
+    """
+    Timestamp of each point of a track.
+    :param initial_time: time at first point
+    :param distance: cumulative distance in km
+    :param ele: elevation in m
+    :param speed: speed for each point in km/h
+    :param model: constant, tobler or naismith
+    :return: datetime64[ns] array
+    """
+    if model not in MODELS:
+        raise ValueError(f'Unknown timing model: {model}')
+
+    step = np.diff(np.asarray(distance, dtype=float), prepend=0)
+    ele_diff = np.nan_to_num(np.diff(np.asarray(ele, dtype=float),
+                                     prepend=np.nan))
+    hours = np.cumsum(MODELS[model](step, ele_diff, speed))
+
+    elapsed = np.round(hours * 3600e9).astype('timedelta64[ns]')
+    return np.datetime64(initial_time, 'ns') + elapsed
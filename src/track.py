@@ -1,16 +1,32 @@
 import pandas as pd
 import numpy as np
-import datetime as dt
-import geopy.distance
-import gpxpy.gpx
-from src import utils, gpx
+from src import utils, gpx, geodesy, timing, elevation_filters, simplify
+from src import spatial_index
 from src import constants as c
 
 
 class Track:
+    """
+    Track made of segments. Points are stored in a columnar way: a contiguous
+    numpy array per field plus a segment offset table, so segment operations
+    are slices of the arrays. df_track is materialized from the arrays when
+    requested.
+    """
     def __init__(self):
         self.columns = ['lat', 'lon', 'ele', 'segment', 'time']
-        self.df_track = pd.DataFrame(columns=self.columns)
+        self._data = {'lat': np.empty(0), 'lon': np.empty(0),
+                      'ele': np.empty(0),
+                      'time': np.empty(0, dtype='datetime64[ns]'),
+                      'ele_pos_cum': np.empty(0, dtype='float32'),
+                      'ele_neg_cum': np.empty(0, dtype='float32'),
+                      'distance': np.empty(0, dtype='float32')}
+        self._segment_ids = []  # id of each segment in track order
+        self._offsets = np.zeros(1, dtype=np.int64)  # first point of each
+        # segment, last element is the number of points
+        self._segment_position = {}  # segment id -> position in track
+        self._df_track = None  # materialized DataFrame
+        self._spatial_index = None  # GridIndex of the points
+        self.version = 0  # increased on each modification of the track
         self.size = 0  # number of gpx in track
         self.last_index = 0
         self.extremes = (0, 0, 0, 0)  # lat min, lat max, lon min, lon max
@@ -18,240 +34,536 @@ class Track:
         self.total_uphill = 0
         self.total_downhill = 0
         self.loaded_files = []  # md5 of files in Track
-        self.selected_segment = []  # line object from matplotlib
         self.selected_segment_idx = []  # index of the segment
-
-    def add_gpx(self, file: str):
+        self._segment_summary = {}  # cached SegmentSummary by segment id
+
+    def add_gpx(self, file: str, progress=None, downsample: int = 1):
+        """
+        Insert a gpx file as a new segment of the track. Files of any size
+        are read in chunks.
+        :param file: gpx file
+        :param progress: callable as progress(bytes_read, total_bytes)
+        :param downsample: keep one of each downsample points
+        """
         md5_gpx = utils.md5sum(file)
 
         if md5_gpx not in self.loaded_files:
-            gpx_track = gpx.Gpx(file)
-            df_gpx = gpx_track.to_pandas()
-            df_gpx = df_gpx[self.columns]
+            gpx_track = gpx.Gpx(file, progress=progress,
+                                downsample=downsample)
+            points = gpx_track.points
             self.loaded_files.append(md5_gpx)
             self.size += 1
             self.last_index += 1
-            df_gpx['segment'] = self.last_index
 
-            self.df_track = pd.concat([self.df_track, df_gpx])
-            self.df_track = self.df_track.reset_index(drop=True)
-            self._update_summary()  # for full track
+            # Append points as a new segment
+            for field in ('lat', 'lon', 'ele'):
+                self._data[field] = np.concatenate(
+                    (self._data[field], points[field]))
+            self._data['time'] = np.concatenate(
+                (self._data['time'],
+                 points['time'].astype('datetime64[ns]')))
+            self._set_segments(
+                self._segment_ids + [self.last_index],
+                np.append(self._offsets,
+                          self._offsets[-1] + points['lat'].size))
+
+            self._update_summary([self.last_index])
+
+    @property
+    def df_track(self) -> pd.DataFrame:
+        """
+        Full track as a DataFrame. It is materialized from the arrays the
+        first time it is requested after a modification.
+        """
+        if self._df_track is None:
+            self._df_track = self._to_pandas(0, self._offsets[-1])
+        return self._df_track
+
+    @df_track.setter
+    def df_track(self, df_track: pd.DataFrame):
+        """
+        Load track from a DataFrame, segments must be contiguous. Ids of
+        new segments follow the highest loaded id.
+        """
+        segment = df_track['segment'].to_numpy(dtype=np.int64)
+        starts = np.flatnonzero(np.diff(segment, prepend=np.nan) != 0)
+        segment_ids = [int(seg_id) for seg_id in segment[starts]]
+
+        self._data['lat'] = df_track['lat'].to_numpy(dtype=float)
+        self._data['lon'] = df_track['lon'].to_numpy(dtype=float)
+        self._data['ele'] = df_track['ele'].to_numpy(dtype=float)
+        self._data['time'] = \
+            pd.to_datetime(df_track['time']).to_numpy(dtype='datetime64[ns]')
+        self._set_segments(segment_ids, np.append(starts, segment.size))
+        self.size = len(segment_ids)
+        self.last_index = max(segment_ids, default=0)
+
+        self._update_summary()
 
-    def _update_summary(self):
-        self._insert_positive_elevation()
-        self._insert_negative_elevation()
-        self._insert_distance()
-        self._update_extremes()
-        self.total_distance = self.df_track.distance.iloc[-1]
-        self.total_uphill = self.df_track.ele_pos_cum.iloc[-1]
-        self.total_downhill = self.df_track.ele_neg_cum.iloc[-1]
+    def _to_pandas(self, start: int, end: int) -> pd.DataFrame:
+        """
+        Build a DataFrame with a range of points of the track.
+        :param start: first point
+        :param end: last point (not included)
+        :return: DataFrame indexed by point position in the track
+        """
+        lengths = np.diff(self._offsets)
+        segment = np.repeat(np.array(self._segment_ids, dtype=np.int64),
+                            lengths)[start:end]
+
+        return pd.DataFrame(
+            {'lat': self._data['lat'][start:end],
+             'lon': self._data['lon'][start:end],
+             'ele': self._data['ele'][start:end],
+             'segment': segment,
+             'time': self._data['time'][start:end],
+             'ele_pos_cum': self._data['ele_pos_cum'][start:end],
+             'ele_neg_cum': self._data['ele_neg_cum'][start:end],
+             'distance': self._data['distance'][start:end]},
+            index=pd.RangeIndex(start, end))
+
+    def _set_segments(self, segment_ids: list, offsets: np.array):
+        """
+        Define segments of the track and update the segment index.
+        :param segment_ids: id of each segment in track order
+        :param offsets: first point of each segment plus number of points
+        """
+        self._segment_ids = list(segment_ids)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        self._segment_position = {seg_id: position for position, seg_id
+                                  in enumerate(self._segment_ids)}
+
+    @property
+    def segment_ids(self) -> list:
+        """
+        Id of the segments in track order.
+        """
+        return list(self._segment_ids)
+
+    def get_segment_bounds(self, index: int) -> (int, int):
+        """
+        Segment lookup in the segment index.
+        :param index: segment id
+        :return: first and last (not included) points of the segment, (0, 0)
+            if the segment does not exist
+        """
+        position = self._segment_position.get(index)
+        if position is None:
+            return 0, 0
+        return int(self._offsets[position]), int(self._offsets[position + 1])
+
+    def _modified(self):
+        """
+        Drop materialized data after a modification of the track.
+        """
+        self._df_track = None
+        self._spatial_index = None
+        self.version += 1
+
+    def _update_summary(self, segments: list = None):
+        """
+        Rebuild track summary from the cached summary of each segment. Only
+        the given segments are recomputed, the rest of them reuse the cache.
+        :param segments: id of the modified segments, None to recompute all
+        """
+        segments_id = self._segment_ids
+
+        # Refresh cache for modified segments
+        self._segment_summary = {
+            seg_id: summary
+            for seg_id, summary in self._segment_summary.items()
+            if seg_id in segments_id and
+            (segments is not None and seg_id not in segments)}
+
+        for seg_id in segments_id:
+            if seg_id not in self._segment_summary:
+                start, end = self.get_segment_bounds(seg_id)
+                self._segment_summary[seg_id] = SegmentSummary(
+                    self._data['lat'][start:end],
+                    self._data['lon'][start:end],
+                    self._data['ele'][start:end])
+
+        self._modified()
+
+        if len(segments_id) == 0:
+            for field in ('ele_pos_cum', 'ele_neg_cum', 'distance'):
+                self._data[field] = np.empty(0, dtype='float32')
+            self.extremes = (0, 0, 0, 0)
+            self.total_distance = 0
+            self.total_uphill = 0
+            self.total_downhill = 0
+            return
+
+        # Track totals in O(segments), junctions between consecutive
+        # segments are part of the track
+        summaries = [self._segment_summary[seg_id] for seg_id in segments_id]
+        first = np.array([summary.first for summary in summaries])
+        last = np.array([summary.last for summary in summaries])
+
+        junction_distance = geodesy.p2p_distance(
+            np.column_stack((first[:, 0], last[:, 0])).ravel(),
+            np.column_stack((first[:, 1], last[:, 1])).ravel())[::2]
+        junction_ele = np.nan_to_num(
+            first[:, 2] - np.concatenate(([np.nan], last[:-1, 2])))
+
+        distance_offset = self._cumulative_offset(
+            [summary.distance for summary in summaries], junction_distance)
+        uphill_offset = self._cumulative_offset(
+            [summary.uphill for summary in summaries],
+            np.clip(junction_ele, 0, None))
+        downhill_offset = self._cumulative_offset(
+            [summary.downhill for summary in summaries],
+            np.clip(junction_ele, None, 0))
+
+        # Track columns are cumulative along the full track
+        self._data['ele_pos_cum'] = np.concatenate(
+            [summary.ele_pos_cum + offset
+             for summary, offset in zip(summaries, uphill_offset)]
+        ).astype('float32')
+        self._data['ele_neg_cum'] = np.concatenate(
+            [summary.ele_neg_cum + offset
+             for summary, offset in zip(summaries, downhill_offset)]
+        ).astype('float32')
+        self._data['distance'] = np.concatenate(
+            [summary.p2p_cum + offset
+             for summary, offset in zip(summaries, distance_offset)]
+        ).astype('float32')
+
+        extremes = np.array([summary.extremes for summary in summaries])
+        self.extremes = (np.nanmin(extremes[:, 0]), np.nanmax(extremes[:, 1]),
+                         np.nanmin(extremes[:, 2]), np.nanmax(extremes[:, 3]))
+        self.total_distance = np.float32(
+            distance_offset[-1] + summaries[-1].distance)
+        self.total_uphill = np.float32(
+            uphill_offset[-1] + summaries[-1].uphill)
+        self.total_downhill = np.float32(
+            downhill_offset[-1] + summaries[-1].downhill)
+
+    @staticmethod
+    def _cumulative_offset(segment_total: list,
+                           junction: np.array) -> np.array:
+        """
+        Value of a cumulative magnitude at the beginning of each segment.
+        :param segment_total: magnitude accumulated inside each segment
+        :param junction: magnitude from previous segment to each segment
+        :return: offset for each segment
+        """
+        offset = np.cumsum(junction)
+        offset[1:] += np.cumsum(segment_total)[:-1]
+        return offset
 
     def get_segment(self, index: int):
-        return self.df_track[self.df_track['segment'] == index]
+        start, end = self.get_segment_bounds(index)
+        return self._to_pandas(start, end)
+
+    def closest_point(self, lat: float, lon: float) -> (float, int, int):
+        """
+        Closest point of the track to a location. The spatial index is built
+        on the first query after each modification of the track.
+        :param lat: latitude in degrees
+        :param lon: longitude in degrees
+        :return: geodesic distance in km, segment id and position of the
+            point in the track (index of df_track), (inf, 0, -1) for an
+            empty track
+        """
+        if self._spatial_index is None:
+            self._spatial_index = spatial_index.GridIndex(self._data['lat'],
+                                                          self._data['lon'])
+        point, _ = self._spatial_index.nearest(lat, lon)
+        if point < 0:
+            return np.inf, 0, -1
+
+        position = np.searchsorted(self._offsets, point, side='right') - 1
+        distance = geodesy.distance(
+            self._data['lat'][point:point + 1],
+            self._data['lon'][point:point + 1],
+            np.array([lat]), np.array([lon]), method='geodesic')[0]
+        return float(distance), self._segment_ids[position], point
+
+    def get_segment_lod(self, index: int, zoom: int) -> (np.array, np.array):
+        """
+        Segment simplified to the level of detail of a zoom. Levels are
+        cached with the segment summary, so they are computed again only
+        after the segment is modified.
+        :param index: segment id
+        :param zoom: zoom grade of the view
+        :return: latitude and longitude of the kept points
+        """
+        start, end = self.get_segment_bounds(index)
+        lat = self._data['lat'][start:end]
+        lon = self._data['lon'][start:end]
+
+        summary = self._segment_summary[index]
+        if zoom not in summary.lod:
+            if summary.importance is None:
+                summary.importance = simplify.rdp_importance(
+                    *simplify.project(lat, lon))
+            tolerance = simplify.zoom_tolerance(
+                zoom, (summary.extremes[0] + summary.extremes[1]) / 2)
+            summary.lod[zoom] = simplify.lod_indices(summary.importance,
+                                                     tolerance)
+
+        points = summary.lod[zoom]
+        return lat[points], lon[points]
 
     def reverse_segment(self, index: int):
-        segment = self.get_segment(index)
-        rev_segment = pd.DataFrame(segment.values[::-1].astype('float32'),
-                                   segment.index,
-                                   segment.columns)
-        self.df_track.loc[self.df_track['segment'] == index] = rev_segment
-        self._update_summary()  # for full track
-
-    def insert_timestamp(self, initial_time, speed):
-        self.df_track['time'] = \
-            self.df_track.apply(
-                lambda row: initial_time +
-                            dt.timedelta(hours=row['distance']/speed),
-                axis=1)
-
-    def _insert_positive_elevation(self):
-        self.df_track['ele diff'] = self.df_track['ele'].diff()
-        negative_gain = self.df_track['ele diff'] < 0
-        self.df_track.loc[negative_gain, 'ele diff'] = 0
-
-        # Define new column
-        self.df_track['ele_pos_cum'] = \
-            self.df_track['ele diff'].cumsum().astype('float32')
-
-        # Drop temporary columns
-        self.df_track = self.df_track.drop(labels=['ele diff'], axis=1)
-
-    def _insert_negative_elevation(self):
-        self.df_track['ele diff'] = self.df_track['ele'].diff()
-        negative_gain = self.df_track['ele diff'] > 0
-        self.df_track.loc[negative_gain, 'ele diff'] = 0
-
-        # Define new column
-        self.df_track['ele_neg_cum'] = \
-            self.df_track['ele diff'].cumsum().astype('float32')
-
-        # Drop temporary columns
-        self.df_track = self.df_track.drop(labels=['ele diff'], axis=1)
-
-    def _insert_distance(self):
-        # Shift latitude and longitude (such way that first point is 0km)
-        self.df_track['lat_shift'] = pd.concat(
-            [pd.Series(np.nan), self.df_track.lat[0:-1]]).\
-            reset_index(drop=True)
-        self.df_track['lon_shift'] = pd.concat(
-            [pd.Series(np.nan), self.df_track.lon[0:-1]]).\
-            reset_index(drop=True)
-
-        def compute_distance(row):
-            from_coor = (row.lat, row.lon)
-            to_coor = (row.lat_shift, row.lon_shift)
-            try:
-                return abs(geopy.distance.geodesic(from_coor, to_coor).km)
-            except ValueError:
-                return 0
-
-        # Define new columns
-        self.df_track['p2p_distance'] = self.df_track.apply(compute_distance,
-                                                            axis=1)
-        self.df_track['distance'] = \
-            self.df_track.p2p_distance.cumsum().astype('float32')
-
-        # Drop temporary columns
-        self.df_track = self.df_track.drop(
-            labels=['lat_shift', 'lon_shift', 'p2p_distance'], axis=1)
-
-    def _update_extremes(self):
-        self.extremes = \
-            (self.df_track["lat"].min(), self.df_track["lat"].max(),
-             self.df_track["lon"].min(), self.df_track["lon"].max())
-
-    def save_gpx(self, gpx_filename: str):
-        # Create track
-        ob_gpxpy = gpxpy.gpx.GPX()
-        gpx_track = gpxpy.gpx.GPXTrack()
-        ob_gpxpy.tracks.append(gpx_track)
-
-        # Create segments in track
-        for seg_id in self.df_track.segment.unique():
-            gpx_segment = gpxpy.gpx.GPXTrackSegment()
-            gpx_track.segments.append(gpx_segment)
-
-            df_segment = self.get_segment(seg_id)
-
-            # Insert points to segment
-            for idx in df_segment.index:
-                latitude = df_segment.loc[idx, 'lat']
-                longitude = df_segment.loc[idx, 'lon']
-                elevation = df_segment.loc[idx, 'ele']
-                time = df_segment.loc[idx, 'time']
-                gpx_point = gpxpy.gpx.GPXTrackPoint(latitude, longitude,
-                                                    elevation=elevation,
-                                                    time=time)
-                gpx_segment.points.append(gpx_point)
-
-        # Write file
-        with open(gpx_filename, 'w') as f:
-            f.write(ob_gpxpy.to_xml())
+        start, end = self.get_segment_bounds(index)
+        for field in ('lat', 'lon', 'ele', 'time'):
+            self._data[field][start:end] = self._data[field][start:end][::-1]
+        self._update_summary([index])
+
+    def insert_timestamp(self, initial_time, speed, model: str = 'constant'):
+        """
+        Insert a synthetic timestamp in each point of the track.
+        :param initial_time: time at first point
+        :param speed: speed in km/h, a number for the full track or a
+            dictionary with the speed of each segment id
+        :param model: constant, tobler or naismith, grade-dependent models
+            use speed as the speed on flat terrain
+        """
+        if isinstance(speed, dict):
+            speed = np.repeat(
+                np.array([speed[seg_id] for seg_id in self._segment_ids],
+                         dtype=float),
+                np.diff(self._offsets))
+
+        self._data['time'] = timing.timestamps(
+            initial_time, self._data['distance'], self._data['ele'],
+            speed, model=model)
+        self._modified()
+
+    def save_gpx(self, gpx_filename: str, compress: bool = None):
+        """
+        Write track as a GPX file, each segment is a track segment.
+        :param gpx_filename: output file
+        :param compress: write gzip file, by default when filename ends
+            in .gz
+        """
+        gpx.write(gpx_filename, self._data, self._offsets, compress=compress)
+
+    @staticmethod
+    def _steep_mask(ele: np.array, distance: np.array) -> np.array:
+        """
+        Points in steep zones: elevation gap with previous point above
+        steep_gap, and the points within steep_distance after such gap.
+        :param ele: elevation of the segment
+        :param distance: cumulative distance from the start of the segment
+        :return: boolean numpy array
+        """
+        with np.errstate(invalid='ignore'):
+            gap = np.abs(np.diff(ele, prepend=np.nan)) > c.steep_gap
+        # Distance is not decreasing, so the running maximum is the distance
+        # at the last gap
+        last_gap = np.maximum.accumulate(np.where(gap, distance, 0))
+        return gap | ((distance - last_gap < c.steep_distance) &
+                      (distance > c.steep_distance))
 
     def fix_elevation(self, index: int):
-        df_segment = self.get_segment(index)
-
-        # Identify and remove steep zones
-        steep_zone = [False] * df_segment.shape[0]
-        last_steep = 0
-
-        for i, (e, d) in enumerate(zip(df_segment['ele'].diff(),
-                                       df_segment['distance'])):
-            if abs(e) > c.steep_gap:
-                steep_zone[i] = True
-                last_steep = d
-
-            elif d - last_steep < c.steep_distance:
-                if d > c.steep_distance:
-                    steep_zone[i] = True
-
-        df_segment['steep_zone'] = steep_zone
-        df_no_steep = df_segment.copy()
-        df_no_steep['ele_to_fix'] = np.where(df_segment['steep_zone'] == False,
-                                             df_segment['ele'], -1)
-
-        # Fill steep zones
-        fixed_elevation = df_no_steep['ele_to_fix'].to_numpy()
-        original_elevation = df_no_steep['ele'].to_numpy()
-        fixed_steep_zone = df_no_steep['steep_zone']
-        before_x = before_y = after_x = after_y = None  # initialization
-
-        for i in range(1, len(fixed_elevation)):
-            if not df_no_steep['steep_zone'].loc[i - 1] and \
-                    df_no_steep['steep_zone'].loc[i]:
-                before_x = np.arange(i - 11, i - 1)
-                before_y = fixed_elevation[i - 11:i - 1]
-                after_x = None
-                after_y = None
-
-            if df_no_steep['steep_zone'].loc[i - 1] and not \
-                    df_no_steep['steep_zone'].loc[i]:
-                after_x = np.arange(i, i + 10)
-                after_y = fixed_elevation[i:i + 10]
-                coef = np.polyfit(np.concatenate((before_x, after_x)),
-                                  np.concatenate((before_y, after_y)),
-                                  3)
-                for j in range(before_x[-1], after_x[0]):
-                    fixed_elevation[j] = np.polyval(coef, j)
-                    fixed_steep_zone[j] = False
-
-        if not after_y and not after_x and before_x and before_y:
+        """
+        Replace the elevation of steep zones in a segment. Each zone is filled
+        with a cubic fitted to the 10 points before and after it, all zones
+        are fitted at once. A zone reaching the end of the segment is
+        smoothed with a moving average.
+        :param index: segment id
+        """
+        start, end = self.get_segment_bounds(index)
+        ele = self._data['ele'][start:end].astype(np.float64)
+        distance = self._data['distance'][start:end].astype(np.float64)
+        if ele.size < 2:
+            return
+        distance -= distance[0]
+
+        steep = self._steep_mask(ele, distance)
+        zone_start, zone_end = utils.mask_runs(steep)
+        fixed_elevation = ele.copy()
+
+        # Zone reaching the end of the segment
+        n_points = ele.size
+        if zone_end.size and zone_end[-1] == n_points:
+            first = max(zone_start[-1] - 2, 0)
             n = c.steep_k_moving_average
-            fixed_elevation[before_x[-1]:] = np.concatenate((
-                original_elevation[before_x[-1]:before_x[-1] + n - 1],
-                utils.moving_average(original_elevation[before_x[-1]:], n)))
-            fixed_steep_zone[before_x[-1]:] = True
+            if n_points - first >= n:
+                fixed_elevation[first:] = np.concatenate((
+                    ele[first:first + n - 1],
+                    utils.moving_average(ele[first:], n)))
+            zone_start, zone_end = zone_start[:-1], zone_end[:-1]
+
+        if zone_start.size:
+            # Fit window of each zone, steep points are not considered
+            window = np.concatenate(
+                (zone_start[:, None] + np.arange(-11, -1),
+                 zone_end[:, None] + np.arange(10)), axis=1)
+            valid = (window >= 0) & (window < n_points)
+            window = np.clip(window, 0, n_points - 1)
+            valid &= ~steep[window] & ~np.isnan(ele[window])
+
+            # Centered and scaled abscissa for a well conditioned fit
+            scale = (zone_end - zone_start + 12)[:, None]
+            powers = np.arange(4)
+            design = ((window - zone_start[:, None]) / scale)[..., None] ** \
+                powers * valid[..., None]
+            target = np.where(valid, ele[window], 0)[..., None]
+            coef = (np.linalg.pinv(design) @ target)[..., 0]
+
+            # Evaluate the cubic of each zone in the points to fill
+            fill_start = np.maximum(zone_start - 2, 0)
+            fitted = valid.any(axis=1)
+            fill_start, zone_start, zone_end, scale, coef = \
+                fill_start[fitted], zone_start[fitted], zone_end[fitted], \
+                scale[fitted, 0], coef[fitted]
+            lengths = zone_end - fill_start
+            zone = np.repeat(np.arange(lengths.size), lengths)
+            points = np.arange(lengths.sum()) - \
+                np.repeat(np.cumsum(lengths) - lengths - fill_start, lengths)
+            x = (points - zone_start[zone]) / scale[zone]
+            fixed_elevation[points] = np.sum(
+                coef[zone] * x[:, None] ** powers, axis=1)
 
         # Insert new elevation in track
-        df_segment['ele'] = fixed_elevation
-        self.df_track.loc[self.df_track['segment'] == index] = df_segment
+        self._data['ele'][start:end] = fixed_elevation
+        self._update_summary([index])
+
+    def smooth_elevation(self, index: int, method: str = c.smooth_filter,
+                         window: float = c.smooth_window):
+        """
+        Apply an elevation filter on a segment.
+        :param index: segment id
+        :param method: moving_average, median, savgol or kalman
+        :param window: filter window in km
+        """
+        start, end = self.get_segment_bounds(index)
+        if end > start:
+            self._data['ele'][start:end] = elevation_filters.smooth(
+                self._data['ele'][start:end],
+                self._data['distance'][start:end], method, window)
+            self._update_summary([index])
+
+    def compare_elevation_filters(self, window: float = c.smooth_window) \
+            -> dict:
+        """
+        Uphill and downhill of the track if each filter were applied to every
+        segment. Track is not modified.
+        :param window: filter window in km
+        :return: dictionary as {filter: (uphill, downhill)}, current values
+            are under the 'original' key
+        """
+        report = {'original': (self.total_uphill, self.total_downhill)}
+        for method in elevation_filters.FILTERS:
+            uphill = downhill = 0
+            for start, end in zip(self._offsets[:-1], self._offsets[1:]):
+                if end - start < 2:
+                    continue
+                gain, loss = elevation_filters.gain_loss(
+                    elevation_filters.smooth(
+                        self._data['ele'][start:end],
+                        self._data['distance'][start:end], method, window))
+                uphill += gain
+                downhill += loss
+            report[method] = (uphill, downhill)
+        return report
 
     def remove_segment(self, index: int):
-        # Drop rows in dataframe
-        idx_segment = self.df_track[(self.df_track['segment'] == index)].index
-        self.df_track = self.df_track.drop(idx_segment)
-        self.df_track = self.df_track.reset_index(drop=True)
+        # Drop points of the segment
+        start, end = self.get_segment_bounds(index)
+        if end > start:
+            for field in ('lat', 'lon', 'ele', 'time'):
+                self._data[field] = np.concatenate(
+                    (self._data[field][:start], self._data[field][end:]))
+            position = self._segment_position[index]
+            offsets = np.delete(self._offsets, position + 1)
+            offsets[position + 1:] -= end - start
+            self._set_segments(self._segment_ids[:position] +
+                               self._segment_ids[position + 1:], offsets)
         self.size -= 1
 
         # Update metadata
-        self._update_summary()
+        self._update_summary([])
         self.loaded_files[index-1] = None
 
-        # Clean full track if needed
-        if self.size == 0:
-            self.df_track = self.df_track.drop(self.df_track.index)
-
         return self.size
 
     def divide_segment(self, segment_index: int, div_index: int):
-        self.df_track['index'] = self.df_track.index
-
-        def segment_index_modifier(row):
-            if row['segment'] < segment_index:
-                return row['segment']
-            elif row['segment'] > segment_index:
-                return row['segment'] + 1
-            else:
-                if row['index'] < div_index:
-                    return row['segment']
-                else:
-                    return row['segment'] + 1
-
-        self.df_track['segment'] = \
-            self.df_track.apply(lambda row: segment_index_modifier(row),
-                                axis=1)
-
-        self.df_track = self.df_track.drop(['index'], axis=1)
+        """
+        Split a segment in two, the second one starts at div_index. Next
+        segments increase their id.
+        :param segment_index: id of the segment to divide
+        :param div_index: point of the track where new segment starts
+        :return: False if div_index does not leave points in both segments,
+            the track is not modified
+        """
+        position = self._segment_position[segment_index]
+        start, end = self._offsets[position], self._offsets[position + 1]
+        if not start < div_index < end:
+            return False
+
+        segment_ids = [seg_id + 1 if seg_id > segment_index else seg_id
+                       for seg_id in self._segment_ids]
+        segment_ids.insert(position + 1, segment_index + 1)
+        self._set_segments(segment_ids,
+                           np.insert(self._offsets, position + 1, div_index))
+
+        # Shift cached summaries, divided segment is computed again
+        self._segment_summary = {
+            (seg_id + 1 if seg_id > segment_index else seg_id): summary
+            for seg_id, summary in self._segment_summary.items()}
+        self._update_summary([segment_index, segment_index + 1])
 
         return True
 
     def change_order(self, new_order: dict):
-        self.df_track.segment = self.df_track.apply(
-            lambda row: new_order[row.segment],
-            axis=1)
-
-        self.df_track['index1'] = self.df_track.index
-        self.df_track = self.df_track.sort_values(by=['segment', 'index1'])
-        self.df_track = self.df_track.drop(labels=['index1'], axis=1)
-        self.df_track = self.df_track.reset_index(drop=True)
-        self._update_summary()  # for full track
+        """
+        Modify order of segments.
+        :param new_order: new id for each segment id
+        """
+        segment_ids = [new_order[seg_id] for seg_id in self._segment_ids]
+        order = np.argsort(segment_ids, kind='stable')
+
+        # Gather points following new order
+        points = np.concatenate(
+            [np.arange(self._offsets[i], self._offsets[i + 1])
+             for i in order]).astype(np.int64)
+        for field in ('lat', 'lon', 'ele', 'time'):
+            self._data[field] = self._data[field][points]
+        lengths = np.diff(self._offsets)[order]
+        self._set_segments([segment_ids[i] for i in order],
+                           np.concatenate(([0], np.cumsum(lengths))))
+
+        # Segments are not modified, only their order
+        self._segment_summary = {
+            new_order[seg_id]: summary
+            for seg_id, summary in self._segment_summary.items()}
+        self._update_summary([])
+
+
+class SegmentSummary:
+    """
+    Summary of a single segment. Cumulative magnitudes start at 0 in the first
+    point of the segment.
+    """
+    def __init__(self, lat: np.array, lon: np.array, ele: np.array):
+        ele_diff = np.nan_to_num(np.diff(ele, prepend=np.nan))
+
+        # Cumulative magnitudes
+        self.p2p_cum = np.cumsum(geodesy.p2p_distance(lat, lon))
+        self.ele_pos_cum = np.cumsum(np.clip(ele_diff, 0, None))
+        self.ele_neg_cum = np.cumsum(np.clip(ele_diff, None, 0))
+
+        # Totals, an empty segment has zero totals and no boundaries
+        if lat.size == 0:
+            self.distance = self.uphill = self.downhill = 0
+            self.first = self.last = (np.nan, np.nan, np.nan)
+            self.extremes = (np.nan, np.nan, np.nan, np.nan)
+        else:
+            self.distance = self.p2p_cum[-1]
+            self.uphill = self.ele_pos_cum[-1]
+            self.downhill = self.ele_neg_cum[-1]
+
+            # Boundaries
+            self.first = (lat[0], lon[0], ele[0])
+            self.last = (lat[-1], lon[-1], ele[-1])
+            self.extremes = (np.nanmin(lat), np.nanmax(lat),
+                             np.nanmin(lon), np.nanmax(lon))
+
+        # Level of detail, computed when the segment is plotted
+        self.importance = None  # RDP tolerance which keeps each point
+        self.lod = {}  # kept points by zoom
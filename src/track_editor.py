@@ -10,9 +10,11 @@ import types
 
 import src.constants as c
 import src.plots as plots
+import src.render as render
 import src.track as track
 from src.file_menu import FileMenu
 from src.edit_menu import EditMenu
+from src.event_dispatcher import EventDispatcher
 from src.utils import quit_app
 
 
@@ -38,10 +40,21 @@ class MainApplication(tk.Frame):
         self.shared_data.canvas = backend_tkagg.FigureCanvasTkAgg(self.fig,
                                                                   self)
         self.shared_data.obj_track = track.Track()
-        self.shared_data.cid = None
 
         # Initialize user interface
         self.init_ui()  # Insert default image
+        self.shared_data.scheduler = render.RenderScheduler(self.shared_data)
+
+        # Single connection of the canvas events, clicks in the map select
+        # segments
+        self.shared_data.dispatcher = EventDispatcher(
+            self.shared_data.canvas)
+        self.shared_data.dispatcher.connect(
+            'button_press_event', 'segment_selection',
+            plots.segment_selection(lambda: self.shared_data.obj_track,
+                                    self.shared_data.ax_track,
+                                    self.shared_data.scheduler.select),
+            axes=self.shared_data.ax_track)
 
         # Create menu
         self.menubar = tk.Menu(self.parent)
@@ -13,9 +13,9 @@ def md5sum(file: str) -> str:
     """
     md5_hash = hashlib.md5()
 
-    a_file = open(file, "rb")
-    content = a_file.read()
-    md5_hash.update(content)
+    with open(file, "rb") as a_file:  # read by blocks, file can be big
+        for block in iter(lambda: a_file.read(2 ** 20), b""):
+            md5_hash.update(block)
 
     digest = md5_hash.hexdigest()
 
@@ -69,6 +69,16 @@ def moving_average(a, n: int = 3):
     return ret[n - 1:] / n
 
 
+def mask_runs(mask: np.array):
+    """
+    Run-length grouping of a boolean array
+    :param mask: boolean numpy array
+    :return: first index of each run of True values and index after its end
+    """
+    edges = np.diff(np.concatenate(([False], mask, [False])).astype(np.int8))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
 def quit_app(parent: tk.Tk):
     """
     Quit the app safely when using exit option or cross symbol.
@@ -0,0 +1,1195 @@
+"""
+Performance benchmarks for TrackEditor. They are not part of the test suite,
+run them from the repository root:
+    python test/benchmark.py [name ...]
+"""
+import os
+import sys
+import time
+import datetime as dt
+import tempfile
+import tracemalloc
+import threading
+import http.server
+import numpy as np
+import pandas as pd
+import gpxpy
+import geopy.distance
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import geodesy, gpx, track, elevation_filters, iosm  # noqa: E402
+from src import constants as c  # noqa: E402
+
+TEST_PATH = os.path.dirname(os.path.abspath(__file__))
+TEST_CASES = sorted(f for f in os.listdir(f'{TEST_PATH}/test_cases')
+                    if f.endswith('.gpx'))
+
+
+def timeit(function, repeat: int = 3) -> float:
+    """
+    Best execution time of a function.
+    :param function: callable without arguments
+    :param repeat: number of executions
+    :return: time in seconds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(function) -> int:
+    """
+    Peak of memory allocated by a function.
+    :param function: callable without arguments
+    :return: bytes
+    """
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def synthetic_gpx(filename: str, n_points: int, n_segments: int = 1):
+    """
+    Write a GPX file with a random walk route.
+    :param filename: output file
+    :param n_points: total number of points
+    :param n_segments: number of segments in the track
+    """
+    rng = np.random.default_rng(0)
+    lat = 40 + np.cumsum(rng.normal(0, 1e-4, n_points))
+    lon = -3 + np.cumsum(rng.normal(0, 1e-4, n_points))
+    ele = 600 + np.cumsum(rng.normal(0, 0.5, n_points))
+    time = np.datetime64('2020-01-01T00:00:00') + \
+        np.arange(n_points).astype('timedelta64[s]')
+
+    with open(filename, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<gpx version="1.1" creator="benchmark" '
+                'xmlns="http://www.topografix.com/GPX/1/1">\n<trk>\n')
+        for segment in np.array_split(np.arange(n_points), n_segments):
+            f.write('<trkseg>\n')
+            f.writelines(
+                f'<trkpt lat="{lat[i]:.7f}" lon="{lon[i]:.7f}">'
+                f'<ele>{ele[i]:.1f}</ele><time>{time[i]}Z</time></trkpt>\n'
+                for i in segment)
+            f.write('</trkseg>\n')
+        f.write('</trk>\n</gpx>\n')
+
+
+def load_coordinates(filename: str):
+    with open(f'{TEST_PATH}/test_cases/{filename}') as gpx_file:
+        route = gpxpy.parse(gpx_file)
+    points = [point for track in route.tracks
+              for segment in track.segments
+              for point in segment.points]
+    return np.array([p.latitude for p in points]), \
+        np.array([p.longitude for p in points])
+
+
+def bench_distance():
+    print(f'{"file":<35}{"points":>8}{"geodesic":>12}{"vincenty":>12}'
+          f'{"haversine":>12}{"speedup":>10}{"max err (m)":>14}')
+    for filename in TEST_CASES:
+        lat, lon = load_coordinates(filename)
+
+        t_ref = timeit(lambda: geodesy.p2p_distance(lat, lon, 'geodesic'), 1)
+        t_vin = timeit(lambda: geodesy.p2p_distance(lat, lon, 'vincenty'))
+        t_hav = timeit(lambda: geodesy.p2p_distance(lat, lon, 'haversine'))
+
+        error = np.max(np.abs(
+            geodesy.p2p_distance(lat, lon, 'vincenty') -
+            geodesy.p2p_distance(lat, lon, 'geodesic'))) * 1000
+
+        print(f'{filename:<35}{lat.size:>8}{t_ref:>11.4f}s{t_vin:>11.4f}s'
+              f'{t_hav:>11.4f}s{t_ref / t_vin:>9.0f}x{error:>14.2e}')
+
+
+def gpxpy_to_pandas(filename: str) -> pd.DataFrame:
+    # Loading path previous to the streaming parser
+    with open(filename) as gpx_file:
+        route = gpxpy.parse(gpx_file)
+    data = {'lat': [], 'lon': [], 'ele': [], 'time': []}
+    for track in route.tracks:
+        for segment in track.segments:
+            for point in segment.points:
+                data['lat'].append(point.latitude)
+                data['lon'].append(point.longitude)
+                data['ele'].append(point.elevation)
+                data['time'].append(point.time)
+    return pd.DataFrame(data)
+
+
+def bench_parser():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = [f'{TEST_PATH}/test_cases/basic_sample.gpx',
+                 f'{TEST_PATH}/test_cases/nominal_route.gpx',
+                 f'{tmp_dir}/synthetic_100k.gpx']
+        synthetic_gpx(files[-1], 100000)
+
+        print(f'{"file":<25}{"points":>8}{"gpxpy":>10}{"stream":>10}'
+              f'{"speedup":>9}{"gpxpy B/pt":>12}{"stream B/pt":>13}')
+        for filename in files:
+            n_points = gpx.parse(filename)['lat'].size
+            t_old = timeit(lambda: gpxpy_to_pandas(filename), 1)
+            t_new = timeit(lambda: gpx.parse(filename))
+            m_old = peak_memory(lambda: gpxpy_to_pandas(filename))
+            m_new = peak_memory(lambda: gpx.parse(filename))
+
+            print(f'{os.path.basename(filename):<25}{n_points:>8}'
+                  f'{t_old:>9.3f}s{t_new:>9.3f}s{t_old / t_new:>8.1f}x'
+                  f'{m_old / n_points:>12.0f}{m_new / n_points:>13.0f}')
+
+
+def bench_large_file(n_points: int = 500000):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = f'{tmp_dir}/synthetic_large.gpx'
+        synthetic_gpx(filename, n_points, n_segments=4)
+        file_size = os.stat(filename).st_size
+        print(f'file size: {file_size / 1e6:.1f} MB, points: {n_points}')
+
+        print(f'{"downsample":>10}{"points":>10}{"time":>9}'
+              f'{"peak MB":>10}{"peak/file":>11}')
+        for downsample in (1, 10):
+            def load():
+                return gpx.parse(filename, downsample=downsample)
+            n_loaded = load()['lat'].size
+            t_load = timeit(load, 1)
+            memory = peak_memory(load)
+            print(f'{downsample:>10}{n_loaded:>10}{t_load:>8.2f}s'
+                  f'{memory / 1e6:>10.1f}{memory / file_size:>10.1%}')
+
+
+def gpxpy_save(obj_track, filename: str):
+    # Writing path previous to the streaming writer
+    import gpxpy.gpx
+    ob_gpxpy = gpxpy.gpx.GPX()
+    gpx_track = gpxpy.gpx.GPXTrack()
+    ob_gpxpy.tracks.append(gpx_track)
+    for seg_id in obj_track.segment_ids:
+        gpx_segment = gpxpy.gpx.GPXTrackSegment()
+        gpx_track.segments.append(gpx_segment)
+        df_segment = obj_track.get_segment(seg_id)
+        for idx in df_segment.index:
+            gpx_segment.points.append(gpxpy.gpx.GPXTrackPoint(
+                df_segment.loc[idx, 'lat'], df_segment.loc[idx, 'lon'],
+                elevation=df_segment.loc[idx, 'ele'],
+                time=df_segment.loc[idx, 'time']))
+    with open(filename, 'w') as f:
+        f.write(ob_gpxpy.to_xml())
+
+
+def bench_writer(n_points: int = 200000):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_gpx(f'{tmp_dir}/input.gpx', n_points, n_segments=4)
+        obj_track = track.Track()
+        obj_track.add_gpx(f'{tmp_dir}/input.gpx')
+        print(f'points: {n_points}')
+
+        print(f'{"writer":<12}{"time":>9}{"peak MB":>10}{"size MB":>10}')
+        for name, filename, function in (
+                ('gpxpy', 'old.gpx', gpxpy_save),
+                ('stream', 'new.gpx', track.Track.save_gpx),
+                ('stream gz', 'new.gpx.gz', track.Track.save_gpx)):
+            filename = f'{tmp_dir}/{filename}'
+            t_write = timeit(lambda: function(obj_track, filename), 1)
+            memory = peak_memory(lambda: function(obj_track, filename))
+            print(f'{name:<12}{t_write:>8.2f}s{memory / 1e6:>10.1f}'
+                  f'{os.stat(filename).st_size / 1e6:>10.1f}')
+
+
+def bench_timestamp(n_points: int = 100000):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_gpx(f'{tmp_dir}/input.gpx', n_points)
+        obj_track = track.Track()
+        obj_track.add_gpx(f'{tmp_dir}/input.gpx')
+    initial_time = dt.datetime(2020, 1, 1)
+    df_track = obj_track.df_track
+
+    def row_wise():
+        # Implementation previous to vectorized timing models
+        df_track.apply(lambda row: initial_time +
+                       dt.timedelta(hours=row['distance'] / 20), axis=1)
+
+    print(f'points: {n_points}')
+    t_old = timeit(row_wise, 1)
+    print(f'{"row-wise apply":<18}{t_old:>9.4f}s')
+    for model in ('constant', 'tobler', 'naismith'):
+        t_new = timeit(lambda: obj_track.insert_timestamp(
+            initial_time, 20, model=model))
+        print(f'{model:<18}{t_new:>9.4f}s{t_old / t_new:>9.0f}x')
+
+
+def loop_fix_elevation(df_segment: pd.DataFrame) -> np.array:
+    # Implementation previous to vectorized steep zones, the final check
+    # for a zone open at the end of the segment is not included
+    from src import constants as c
+    df_segment = df_segment.reset_index(drop=True)
+    steep_zone = [False] * df_segment.shape[0]
+    last_steep = 0
+    for i, (e, d) in enumerate(zip(df_segment['ele'].diff(),
+                                   df_segment['distance'])):
+        if abs(e) > c.steep_gap:
+            steep_zone[i] = True
+            last_steep = d
+        elif d - last_steep < c.steep_distance:
+            if d > c.steep_distance:
+                steep_zone[i] = True
+    df_segment['steep_zone'] = steep_zone
+    fixed_elevation = np.where(df_segment['steep_zone'] == False,  # noqa
+                               df_segment['ele'], -1)
+    before_x = before_y = None
+    for i in range(1, len(fixed_elevation)):
+        if not df_segment['steep_zone'].loc[i - 1] and \
+                df_segment['steep_zone'].loc[i]:
+            before_x = np.arange(i - 11, i - 1)
+            before_y = fixed_elevation[i - 11:i - 1]
+        if df_segment['steep_zone'].loc[i - 1] and not \
+                df_segment['steep_zone'].loc[i]:
+            after_x = np.arange(i, i + 10)
+            after_y = fixed_elevation[i:i + 10]
+            coef = np.polyfit(np.concatenate((before_x, after_x)),
+                              np.concatenate((before_y, after_y)), 3)
+            for j in range(before_x[-1], after_x[0]):
+                fixed_elevation[j] = np.polyval(coef, j)
+    return fixed_elevation
+
+
+def bench_fix_elevation(n_points: int = 100000):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_gpx(f'{tmp_dir}/input.gpx', n_points)
+        obj_track = track.Track()
+        obj_track.add_gpx(f'{tmp_dir}/input.gpx')
+
+    # Smooth profile with a spike each 500 points
+    rng = np.random.default_rng(0)
+    ele = 600 + 50 * np.sin(np.arange(n_points) / 2000)
+    spikes = np.arange(250, n_points - 250, 500)
+    ele[spikes] += rng.uniform(5, 30, spikes.size)
+    obj_track._data['ele'][:] = ele
+    obj_track._update_summary()
+    df_segment = obj_track.get_segment(1)
+
+    print(f'points: {n_points}, steep zones: {spikes.size}')
+    t_old = timeit(lambda: loop_fix_elevation(df_segment), 1)
+
+    def vectorized():
+        obj_track._data['ele'][:] = ele
+        obj_track.fix_elevation(1)
+    t_new = timeit(vectorized)
+    print(f'{"loop":<12}{t_old:>9.3f}s')
+    print(f'{"vectorized":<12}{t_new:>9.3f}s{t_old / t_new:>8.0f}x')
+
+
+def bench_elevation_filters(n_points: int = 100000):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_gpx(f'{tmp_dir}/input.gpx', n_points)
+        obj_track = track.Track()
+        obj_track.add_gpx(f'{tmp_dir}/input.gpx')
+    ele = obj_track._data['ele'].copy()
+    distance = obj_track._data['distance'].copy()
+
+    print(f'points: {n_points}, window: {elevation_filters.c.smooth_window} '
+          f'km')
+    print(f'{"filter":<16}{"time":>9}{"uphill":>10}{"downhill":>10}')
+    print(f'{"original":<16}{"":>9}{obj_track.total_uphill:>10.0f}'
+          f'{obj_track.total_downhill:>10.0f}')
+    for method in elevation_filters.FILTERS:
+        t_filter = timeit(
+            lambda: elevation_filters.smooth(ele, distance, method))
+        uphill, downhill = elevation_filters.gain_loss(
+            elevation_filters.smooth(ele, distance, method))
+        print(f'{method:<16}{t_filter * 1000:>7.1f}ms{uphill:>10.0f}'
+              f'{downhill:>10.0f}')
+
+
+class TileHandler(http.server.BaseHTTPRequestHandler):
+    # Local tile server with constant latency
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    disable_nagle_algorithm = True
+    latency = 0.03
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        body = bytes(20000)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def sequential_download(tiles: list):
+    # Download previous to the concurrent downloader: one pool per tile
+    from urllib3 import PoolManager
+    for zoom, x, y in tiles:
+        http = PoolManager()
+        response = http.request('GET', f'{c.tile_server}/{zoom}/{x}/{y}.png')
+        os.makedirs(f'tiles/{zoom}/{x}', exist_ok=True)
+        with open(f'tiles/{zoom}/{x}/{y}.png', 'wb') as destination:
+            destination.write(response.data)
+        iosm.DBH.insert_tile(zoom, x, y, True, '', len(response.data))
+
+
+def bench_tiles(n_tiles: int = 200):
+    import logging
+    logging.disable(logging.WARNING)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), TileHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    c.tile_server = f'http://127.0.0.1:{server.server_port}'
+    cwd = os.getcwd()
+
+    print(f'tiles: {n_tiles}, server latency: {TileHandler.latency}s')
+    print(f'{"downloader":<24}{"time":>8}{"tiles/s":>10}')
+    for name, workers, connections in (('sequential', 1, 1),
+                                       ('concurrent', 8, 2),
+                                       ('concurrent', 8, 8),
+                                       ('concurrent', 32, 32)):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            iosm.DBH.open_db()
+            tiles = [(18, x, y) for x in range(n_tiles // 10)
+                     for y in range(10)]
+            c.tile_connections = connections
+            iosm._HTTP = None
+            if workers == 1:
+                t_download = timeit(lambda: sequential_download(tiles), 1)
+            else:
+                t_download = timeit(
+                    lambda: iosm.download_tile_list(tiles, workers), 1)
+            iosm.DBH.close_db()
+            os.chdir(cwd)
+
+        label = f'{name} ({workers}/{connections})'
+        print(f'{label:<24}{t_download:>7.2f}s{n_tiles / t_download:>10.0f}')
+
+    server.shutdown()
+
+
+def bench_tile_catalog(n_cached: int = 100000, n_batch: int = 1000):
+    import sqlite3
+    from src.db_handler import DbHandler
+    cached = [(16, x, y, True, f'tiles/16/{x}/{y}.png', 20000)
+              for x in range(n_cached // 100) for y in range(100)]
+    batch = [(17, x, y, True, f'tiles/17/{x}/{y}.png', 20000)
+             for x in range(n_batch // 10) for y in range(10)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Catalog previous to keyed table: no index, count before each write
+        # and one commit per tile
+        conn = sqlite3.connect(f'{tmp_dir}/old.sqlite')
+        cur = conn.cursor()
+        cur.execute('CREATE TABLE Tiles (zoom INTEGER, x INTEGER, '
+                    'y INTEGER, status BOOLEAN, path TEXT, size INTEGER)')
+        cur.executemany('INSERT INTO Tiles VALUES (?, ?, ?, ?, ?, ?)', cached)
+        conn.commit()
+
+        def old_lookup():
+            for tile in batch:
+                cur.execute('SELECT COUNT(*) FROM Tiles WHERE zoom=? AND '
+                            'x=? AND y=?', tile[:3]).fetchone()
+
+        def old_insert():
+            for tile in batch:
+                count = cur.execute('SELECT COUNT(*) FROM Tiles WHERE '
+                                    'zoom=? AND x=? AND y=?',
+                                    tile[:3]).fetchone()[0]
+                if not count:
+                    cur.execute('INSERT INTO Tiles VALUES (?, ?, ?, ?, ?, ?)',
+                                tile)
+                    conn.commit()
+            cur.execute('DELETE FROM Tiles WHERE zoom=17')
+            conn.commit()
+
+        t_old_lookup = timeit(old_lookup, 1)
+        t_old_insert = timeit(old_insert, 1)
+        conn.close()
+
+        dbh = DbHandler(f'{tmp_dir}/new.sqlite')
+        dbh.open_db()
+        dbh.insert_tiles(cached)
+        t_new_lookup = timeit(
+            lambda: dbh.get_tiles_size([tile[:3] for tile in batch]))
+        t_new_insert = timeit(lambda: dbh.insert_tiles(batch))
+        dbh.close_db()
+
+    print(f'cached tiles: {n_cached}, batch: {n_batch} tiles')
+    print(f'{"operation":<12}{"old":>10}{"new":>10}{"speedup":>9}')
+    for name, t_old, t_new in (('lookup', t_old_lookup, t_new_lookup),
+                               ('insert', t_old_insert, t_new_insert)):
+        print(f'{name:<12}{t_old:>9.3f}s{t_new:>9.4f}s'
+              f'{t_old / t_new:>8.0f}x')
+
+
+def stack_map_img(extreme_tiles: tuple, zoom: int) -> np.array:
+    # Mosaic previous to the tile image cache
+    import matplotlib.image as mpimg
+    xtile, ytile, final_xtile, final_ytile = extreme_tiles
+    map_img = None
+    for x in range(xtile, final_xtile + 1, 1):
+        y_img = mpimg.imread(f'tiles/{zoom}/{x}/{ytile}.png')
+        for y in range(ytile + 1, final_ytile + 1, 1):
+            y_img = np.vstack(
+                (y_img, mpimg.imread(f'tiles/{zoom}/{x}/{y}.png')))
+        map_img = y_img if map_img is None else np.hstack((map_img, y_img))
+    return map_img
+
+
+def bench_map_img():
+    import matplotlib.image as mpimg
+    from src import plots
+    from src.image_cache import TileImageCache
+    cwd = os.getcwd()
+    rng = np.random.default_rng(0)
+
+    print(f'{"tiles":<8}{"stack":>10}{"cold":>10}{"warm":>10}{"speedup":>9}')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        for n in (3, 8):
+            for x in range(n):
+                os.makedirs(f'tiles/10/{x}', exist_ok=True)
+                for y in range(n):
+                    mpimg.imsave(f'tiles/10/{x}/{y}.png',
+                                 rng.uniform(size=(256, 256, 3)))
+            extreme_tiles = (0, 0, n - 1, n - 1)
+
+            t_old = timeit(lambda: stack_map_img(extreme_tiles, 10))
+            plots.TILE_IMAGES = TileImageCache()
+            t_cold = timeit(lambda: plots.create_map_img(extreme_tiles, 10), 1)
+            t_warm = timeit(lambda: plots.create_map_img(extreme_tiles, 10))
+            print(f'{n}x{n:<6}{t_old * 1000:>8.1f}ms{t_cold * 1000:>8.1f}ms'
+                  f'{t_warm * 1000:>8.1f}ms{t_old / t_warm:>8.0f}x')
+        os.chdir(cwd)
+
+
+def bench_basemap():
+    import matplotlib.image as mpimg
+    from src import plots
+    from src.image_cache import BasemapCache, TileImageCache
+    cwd = os.getcwd()
+    obj_track = track.Track()
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/nominal_route.gpx')
+
+    def local_tiles(xtile, ytile, final_xtile, final_ytile, max_zoom,
+                    extra_tiles):
+        # Tiles with database check, written instead of downloaded
+        iosm.DBH.open_db()
+        tiles = [(max_zoom, x, y) for x in range(xtile, final_xtile + 1)
+                 for y in range(ytile, final_ytile + 1)]
+        for zoom, x, y in iosm._missing_tiles(tiles):
+            os.makedirs(f'tiles/{zoom}/{x}', exist_ok=True)
+            mpimg.imsave(f'tiles/{zoom}/{x}/{y}.png', np.zeros((256, 256)))
+            iosm.DBH.insert_tile(zoom, x, y, True, '', 1)
+        iosm.DBH.close_db()
+        return len(tiles)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        download = iosm.download_tiles_by_num
+        iosm.download_tiles_by_num = local_tiles
+        plots.generate_map(obj_track)
+
+        def miss():
+            plots.BASEMAPS.clear()
+            plots.TILE_IMAGES = TileImageCache()
+            plots.generate_map(obj_track)
+
+        plots.BASEMAPS = BasemapCache()
+        t_miss = timeit(miss)
+        t_hit = timeit(lambda: plots.generate_map(obj_track))
+        iosm.download_tiles_by_num = download
+        os.chdir(cwd)
+
+    print(f'{"basemap":<8}{"time":>10}')
+    print(f'{"miss":<8}{t_miss * 1000:>8.2f}ms')
+    print(f'{"hit":<8}{t_hit * 1000:>8.2f}ms{t_miss / t_hit:>8.0f}x')
+    print(f'hits: {plots.BASEMAPS.hits}, misses: {plots.BASEMAPS.misses}')
+
+
+def bench_tile_store(n_tiles: int = 5000, n_reads: int = 2000):
+    from src import tile_store
+    cwd = os.getcwd()
+    rng = np.random.default_rng(0)
+    tiles = [(15, x, y) for x in range(n_tiles // 50) for y in range(50)]
+    reads = [tiles[i] for i in rng.integers(0, len(tiles), n_reads)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        for zoom, x, y in tiles:
+            os.makedirs(f'tiles/{zoom}/{x}', exist_ok=True)
+            with open(f'tiles/{zoom}/{x}/{y}.png', 'wb') as tile_file:
+                tile_file.write(rng.bytes(20000))
+
+        store = tile_store.TileStore('tiles.mbtiles')
+        t_migrate = timeit(lambda: tile_store.migrate('tiles', store), 1)
+
+        def read_files():
+            for zoom, x, y in reads:
+                with open(f'tiles/{zoom}/{x}/{y}.png', 'rb') as tile_file:
+                    tile_file.read()
+
+        def check_files():
+            return [os.path.isfile(f'tiles/{zoom}/{x}/{y}.png')
+                    for zoom, x, y in tiles]
+
+        t_read_files = timeit(read_files)
+        t_read_store = timeit(
+            lambda: [store.get(*tile) for tile in reads])
+        t_check_files = timeit(check_files)
+        t_check_store = timeit(lambda: store.stored_tiles(tiles))
+        store.close()
+        os.chdir(cwd)
+
+    print(f'tiles: {n_tiles} of 20 kB, migration: {t_migrate:.2f}s')
+    print(f'{"operation":<22}{"files":>10}{"store":>10}')
+    print(f'{"read (us/tile)":<22}{t_read_files / n_reads * 1e6:>10.1f}'
+          f'{t_read_store / n_reads * 1e6:>10.1f}')
+    print(f'{"check all tiles (ms)":<22}{t_check_files * 1000:>10.1f}'
+          f'{t_check_store * 1000:>10.1f}')
+
+
+def bench_prefetch(max_zoom: int = 16, buffer: float = 0.5):
+    from src import prefetch
+    obj_track = track.Track()
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/nominal_route.gpx')
+    routes = {'nominal_route': (obj_track.df_track.lat.to_numpy(),
+                                obj_track.df_track.lon.to_numpy()),
+              'diagonal 150 km': (np.linspace(40, 41, 1000),
+                                  np.linspace(-3, -4.3, 1000))}
+
+    print(f'max zoom: {max_zoom}, buffer: {buffer} km')
+    print(f'{"route":<18}{"bbox tiles":>12}{"corridor":>10}{"ratio":>8}'
+          f'{"time":>9}')
+    for name, (lat, lon) in routes.items():
+        n_box = 0
+        for zoom in range(max_zoom + 1):
+            x_min, y_min = iosm.deg2num(lat.max(), lon.min(), zoom)
+            x_max, y_max = iosm.deg2num(lat.min(), lon.max(), zoom)
+            n_box += (x_max - x_min + 1) * (y_max - y_min + 1)
+
+        def corridor():
+            return [tile for zoom in range(max_zoom + 1) for tile in
+                    prefetch.corridor_tiles(lat, lon, zoom, buffer)]
+        n_corridor = len(corridor())
+        t_corridor = timeit(corridor)
+        print(f'{name:<18}{n_box:>12}{n_corridor:>10}'
+              f'{n_box / n_corridor:>7.1f}x{t_corridor * 1000:>7.1f}ms')
+
+
+def bench_tile_cache(n_tiles: int = 100000, n_touch: int = 1000):
+    from src.db_handler import DbHandler
+    from src.tile_cache import TileCacheManager
+    tiles = [(16, x, y, True, f'tiles/16/{x}/{y}.png', 20000)
+             for x in range(n_tiles // 100) for y in range(100)]
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        dbh = DbHandler('catalog.sqlite')
+        dbh.open_db()
+        dbh.insert_tiles(tiles)
+        cache = TileCacheManager(dbh, max_bytes=int(0.9 * n_tiles * 20000))
+
+        t_touch = timeit(lambda: dbh.touch_tiles(
+            [tile[:3] for tile in tiles[-n_touch:]]))
+        t_stats = timeit(cache.stats)
+        t_evict = timeit(cache.enforce_budget, 1)
+        evicted = cache.evictions
+        dbh.close_db()
+        os.chdir(cwd)
+
+    print(f'catalog: {n_tiles} tiles')
+    print(f'touch {n_touch} tiles: {t_touch * 1000:.1f}ms')
+    print(f'stats: {t_stats * 1000:.1f}ms')
+    print(f'evict {evicted} tiles: {t_evict * 1000:.1f}ms')
+
+
+def loop_auto_zoom(lat_min: float, lon_min: float,
+                   lat_max: float, lon_max: float) -> int:
+    # Zoom by zoom search with logging of previous versions
+    import logging
+    logger = logging.getLogger('src.plots')
+    for zoom in range(c.max_zoom):
+        num_x_min, num_y_min = iosm.deg2num(lat_min, lon_min, zoom)
+        num_x_max, num_y_max = iosm.deg2num(lat_max, lon_max, zoom)
+        width = abs(num_x_max - num_x_min)
+        height = abs(num_y_max - num_y_min)
+        logger.debug(f'auto_zoom: {zoom - 1}, ' +
+                     f'width: {width}, height: {height}')
+        if width > c.map_size or height > c.map_size:
+            return zoom - 1
+        if (width == c.map_size and height < c.map_size) or \
+                (width < c.map_size and height == c.map_size):
+            return zoom
+    return c.max_zoom
+
+
+def bench_auto_zoom(n_boxes: int = 2000, n_points: int = 1000000):
+    from src import plots
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(-60, 60, n_boxes)
+    lon = rng.uniform(-170, 170, n_boxes)
+    size = 10 ** rng.uniform(-4, 1, n_boxes)
+    boxes = list(zip(lat, lon, lat + size, lon + size))
+
+    assert [plots.auto_zoom(*box) for box in boxes] == \
+        [loop_auto_zoom(*box) for box in boxes]
+    t_loop = timeit(lambda: [loop_auto_zoom(*box) for box in boxes])
+    t_new = timeit(lambda: [plots.auto_zoom(*box) for box in boxes])
+    print(f'auto_zoom of {n_boxes} boxes: loop {t_loop * 1000:.1f}ms, '
+          f'closed form {t_new * 1000:.1f}ms, {t_loop / t_new:.1f}x')
+
+    lat = rng.uniform(40, 41, n_points)
+    lon = rng.uniform(-4, -3, n_points)
+    t_loop = timeit(lambda: [iosm.deg2num(*point, 16)
+                             for point in zip(lat, lon)], 1)
+    t_new = timeit(lambda: iosm.deg2num_array(lat, lon, 16))
+    print(f'deg2num of {n_points} points: loop {t_loop:.3f}s, '
+          f'array {t_new:.3f}s, {t_loop / t_new:.0f}x')
+
+
+def max_deviation(x: np.array, y: np.array, kept: np.array) -> float:
+    # Distance of every point to the chord of the kept points around it
+    right = np.searchsorted(kept, np.arange(x.size)).clip(1, kept.size - 1)
+    start, end = kept[right - 1], kept[right]
+    chord_x, chord_y = x[end] - x[start], y[end] - y[start]
+    chord = np.maximum(np.hypot(chord_x, chord_y), 1e-15)
+    return np.max(np.abs(chord_x * (y - y[start]) -
+                         chord_y * (x - x[start])) / chord)
+
+
+def bench_lod(n_points: int = 500000):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from src import simplify
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_gpx(f'{tmp_dir}/large.gpx', n_points)
+        routes = {'nominal_route': f'{TEST_PATH}/test_cases/nominal_route.gpx',
+                  f'synthetic {n_points}': f'{tmp_dir}/large.gpx'}
+        tracks = {}
+        for name, filename in routes.items():
+            tracks[name] = track.Track()
+            tracks[name].add_gpx(filename)
+
+    fig, ax = plt.subplots(figsize=(8, 6), dpi=100)
+    print(f'{"route":<18}{"zoom":>5}{"method":>8}{"points":>9}'
+          f'{"error px":>10}{"render":>10}')
+    for name, obj_track in tracks.items():
+        segment = obj_track.get_segment(1)
+        lat, lon = segment.lat.to_numpy(), segment.lon.to_numpy()
+        x, y = simplify.project(lat, lon)
+        t_importance = timeit(lambda: simplify.rdp_importance(x, y), 1)
+
+        def render(points):
+            ax.cla()
+            ax.plot(lon[points], lat[points], linewidth=1, marker='o',
+                    markersize=2)
+            ax.set_xlim(lon.min(), lon.max())
+            ax.set_ylim(lat.min(), lat.max())
+            fig.canvas.draw()
+
+        for zoom in (12, 15, 18):
+            pixel = simplify.zoom_tolerance(zoom, lat.mean()) / \
+                c.lod_tolerance
+            even = np.unique(np.linspace(0, lat.size - 1, 100).astype(int))
+            t_level = timeit(lambda: obj_track.get_segment_lod(1, zoom))
+            lod = obj_track._segment_summary[1].lod[zoom]
+            for method, points in (('even', even), ('lod', lod),
+                                   ('all', np.arange(lat.size))):
+                error = max_deviation(x, y, points) / pixel
+                print(f'{name:<18}{zoom:>5}{method:>8}{points.size:>9}'
+                      f'{error:>10.1f}'
+                      f'{timeit(lambda: render(points), 1) * 1000:>8.1f}ms')
+            print(f'{"":<18}level lookup: {t_level * 1e6:.0f}us')
+        print(f'{name}: importance computed once in '
+              f'{t_importance * 1000:.0f}ms')
+    plt.close(fig)
+
+
+def apply_closest_segment(df_track: pd.DataFrame, point: tuple):
+    # Click hit-testing of previous versions
+    df_track['point_distance'] = df_track.apply(
+        lambda row: geopy.distance.geodesic((row.lat, row.lon), point).km,
+        axis=1)
+    min_row = \
+        df_track[df_track.point_distance == df_track.point_distance.min()]
+    min_distance = min_row.point_distance.iloc[0]
+    min_segment = min_row.segment.iloc[0]
+    df_track.drop('point_distance', axis=1, inplace=True)
+    return min_distance, int(min_segment)
+
+
+def bench_closest_segment(n_clicks: int = 100):
+    obj_track = track.Track()
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/nominal_route.gpx')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_gpx(f'{tmp_dir}/large.gpx', 100000)
+        obj_track.add_gpx(f'{tmp_dir}/large.gpx')
+    rng = np.random.default_rng(0)
+    lat_min, lat_max, lon_min, lon_max = obj_track.extremes
+    clicks = list(zip(rng.uniform(lat_min, lat_max, n_clicks),
+                      rng.uniform(lon_min, lon_max, n_clicks)))
+    points = rng.integers(0, 15016, n_clicks)
+    near_clicks = list(zip(
+        obj_track.df_track.lat.to_numpy()[points] + 1e-4,
+        obj_track.df_track.lon.to_numpy()[points] - 1e-4))
+
+    print(f'{"points":<10}{"apply":>10}{"build":>10}{"query":>10}'
+          f'{"near":>10}{"speedup":>10}')
+    for n_points in (15016, len(obj_track.df_track)):
+        small = track.Track()
+        small.df_track = obj_track.df_track.iloc[:n_points]
+        df_track = small.df_track
+        start = time.perf_counter()
+        reference = apply_closest_segment(df_track, clicks[0])
+        t_apply = time.perf_counter() - start
+
+        def build():
+            small._spatial_index = None
+            return small.closest_point(*clicks[0])
+        t_build = timeit(build, 1)
+        assert build()[1] == reference[1]
+        t_query = timeit(lambda: [small.closest_point(*click)
+                                  for click in clicks]) / n_clicks
+        t_near = timeit(lambda: [small.closest_point(*click)
+                                 for click in near_clicks]) / n_clicks
+        print(f'{n_points:<10}{t_apply:>9.2f}s{t_build * 1000:>8.1f}ms'
+              f'{t_query * 1e6:>8.0f}us{t_near * 1e6:>8.0f}us'
+              f'{t_apply / t_query:>9.0f}x')
+
+
+def split_tool(obj_track, seg_id: int):
+    import types
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib import widgets
+    from src.event_dispatcher import EventDispatcher
+    from src.split_segment import SplitSegment
+    fig = plt.figure(figsize=(12, 8), dpi=100)
+    shared_data = types.SimpleNamespace(
+        obj_track=obj_track, fig_track=fig, fig_ele=fig, canvas=fig.canvas,
+        ax_track=fig.add_subplot(2, 1, 1), ax_ele=fig.add_subplot(2, 1, 2),
+        btn_done=widgets.Button(fig.add_axes([0.8, 0.01, 0.1, 0.04]),
+                                '$Done$'))
+    shared_data.dispatcher = EventDispatcher(fig.canvas)
+    tool = SplitSegment(shared_data, obj_track.get_segment(seg_id))
+    tool.connect()
+    return tool
+
+
+def redraw_split(tool, index: int, artists: dict):
+    # Motion handling of previous versions: artists are created again and
+    # the full figure is drawn
+    segment = tool.df_segment
+    for artist in artists.values():
+        artist.remove()
+    artists['point'] = tool.ax[0].scatter(segment.lon[index],
+                                          segment.lat[index], s=35,
+                                          marker='o', c='r', zorder=20)
+    artists['line_0'], = tool.ax[1].plot(segment.distance.loc[:index + 1],
+                                         segment.ele.loc[:index + 1],
+                                         color='r', linewidth=2)
+    artists['line_1'], = tool.ax[1].plot(segment.distance.loc[index:],
+                                         segment.ele.loc[index:],
+                                         color='b', linewidth=2)
+    artists['area_0'] = tool.ax[1].fill_between(
+        segment.distance.loc[:index], segment.ele.loc[:index], color='r',
+        alpha=0.2)
+    artists['area_1'] = tool.ax[1].fill_between(
+        segment.distance.loc[index:], segment.ele.loc[index:], color='b',
+        alpha=0.2)
+    tool.canvas.draw()
+
+
+def bench_split_drag(n_frames: int = 30):
+    import logging
+    import warnings
+    import matplotlib.pyplot as plt
+    logging.disable(logging.CRITICAL)
+    warnings.filterwarnings('ignore', category=UserWarning)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_gpx(f'{tmp_dir}/large.gpx', 100000)
+        segments = {}
+        for name, filename in (
+                ('island_part1', 'Innacessible_Island_part1.gpx'),
+                ('nominal_route', 'nominal_route.gpx'),
+                ('synthetic', f'{tmp_dir}/large.gpx')):
+            obj_track = track.Track()
+            obj_track.add_gpx(filename if name == 'synthetic' else
+                              f'{TEST_PATH}/test_cases/{filename}')
+            segments[name] = obj_track
+
+    print(f'{"segment":<15}{"points":>8}{"redraw":>10}{"blit":>10}'
+          f'{"fps":>7}{"speedup":>9}')
+    for name, obj_track in segments.items():
+        tool = split_tool(obj_track, 1)
+        n_points = len(tool.df_segment)
+        frames = np.linspace(0, n_points - 1, n_frames).astype(int)
+        indices = tool.df_segment.index[frames]
+
+        artists = {}
+        t_redraw = timeit(lambda: [redraw_split(tool, index, artists)
+                                   for index in indices], 1) / n_frames
+        for artist in artists.values():
+            artist.remove()
+        tool.canvas.draw()
+        tool.frame_times = []
+        for position in frames:
+            tool.update_split(position)
+        t_blit = np.mean(tool.frame_times)
+        print(f'{name:<15}{n_points:>8}{t_redraw * 1000:>8.1f}ms'
+              f'{t_blit * 1000:>8.1f}ms{1 / t_blit:>7.0f}'
+              f'{t_redraw / t_blit:>8.1f}x')
+        plt.close(tool.shared_data.fig_track)
+    logging.disable(logging.NOTSET)
+
+
+def bench_split_cursor(n_events: int = 1000):
+    from bisect import bisect
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_gpx(f'{tmp_dir}/large.gpx', 100000)
+        obj_track = track.Track()
+        obj_track.add_gpx(f'{tmp_dir}/large.gpx')
+    df_segment = obj_track.get_segment(1)
+    distance = df_segment.distance
+    distance_array = distance.to_numpy()  # as kept by SplitSegment
+    cursor = np.random.default_rng(0).uniform(
+        distance.iloc[0], distance.iloc[-1], n_events)
+
+    def series_bisect():
+        return [bisect(distance.reset_index(drop=True), x) +
+                distance.index[0] for x in cursor]
+
+    def array_searchsorted():
+        return [distance_array.searchsorted(x, side='right')
+                for x in cursor]
+
+    assert np.array_equal(np.array(series_bisect()) - distance.index[0],
+                          array_searchsorted())
+    t_bisect = timeit(series_bisect, 1) / n_events
+    t_search = timeit(array_searchsorted, 1) / n_events
+    print(f'{len(df_segment)} points, per motion event: '
+          f'bisect {t_bisect * 1e6:.1f}us, searchsorted '
+          f'{t_search * 1e6:.2f}us, speedup {t_bisect / t_search:.0f}x')
+
+
+def full_render(shared_data):
+    # Menu actions of previous versions: every axes is plotted again
+    from src import plots
+    from src.segment_artists import SegmentArtists
+    artists = SegmentArtists(shared_data.ax_track, shared_data.ax_ele)
+    artists.set_map(*plots.generate_map(shared_data.obj_track))
+    artists.update(shared_data.obj_track)
+    plots.plot_track_info(shared_data.obj_track, shared_data.ax_track_info)
+    shared_data.canvas.draw()
+
+
+def bench_render(n_edits: int = 10):
+    import types
+    import logging
+    import warnings
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from src import plots, render
+    logging.disable(logging.CRITICAL)
+    warnings.filterwarnings('ignore', category=UserWarning)
+
+    obj_track = track.Track()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_gpx(f'{tmp_dir}/large.gpx', 100000)
+        obj_track.add_gpx(f'{tmp_dir}/large.gpx')
+    for part in range(1, 6):
+        obj_track.add_gpx(f'{TEST_PATH}/test_cases/'
+                          f'Innacessible_Island_part{part}.gpx')
+
+    # Basemap is cached between edits, a blank one avoids downloads
+    generate_map = plots.generate_map
+    blank = np.ones((768, 768, 3))
+    plots.generate_map = lambda ob_track: (blank, (
+        ob_track.extremes[2], ob_track.extremes[3],
+        ob_track.extremes[0], ob_track.extremes[1]))
+
+    fig = plt.figure(figsize=(12, 8), dpi=100)
+    shared_data = types.SimpleNamespace(
+        obj_track=obj_track, canvas=fig.canvas,
+        ax_track=fig.add_subplot(2, 2, 1), ax_ele=fig.add_subplot(2, 2, 3),
+        ax_track_info=fig.add_subplot(1, 2, 2))
+    scheduler = render.RenderScheduler(shared_data)
+    scheduler.invalidate_all()
+    scheduler.flush()
+
+    segment_ids = obj_track.segment_ids
+    order = dict(zip(segment_ids, segment_ids[1:] + segment_ids[:1]))
+    edits = {'reverse': (lambda: obj_track.reverse_segment(2),
+                         (render.ELEVATION, render.INFO), [2]),
+             'fix_elevation': (lambda: obj_track.fix_elevation(2),
+                               (render.ELEVATION, render.INFO), []),
+             'change_order': (lambda: obj_track.change_order(order),
+                              (render.ELEVATION, render.INFO), segment_ids)}
+
+    print(f'{len(segment_ids)} segments, {obj_track.df_track.shape[0]} '
+          f'points')
+    print(f'{"edit":<15}{"full":>10}{"partial":>10}{"speedup":>9}')
+    for name, (edit, regions, segments) in edits.items():
+        def partial():
+            edit()
+            scheduler.invalidate(*regions, segments=segments)
+            scheduler.flush()
+
+        t_full = timeit(lambda: [(edit(), full_render(shared_data))
+                                 for _ in range(n_edits)], 1) / n_edits
+        scheduler.invalidate_all()
+        scheduler.flush()
+        t_partial = timeit(lambda: [partial() for _ in range(n_edits)],
+                           1) / n_edits
+        print(f'{name:<15}{t_full * 1000:>8.1f}ms{t_partial * 1000:>8.1f}ms'
+              f'{t_full / t_partial:>8.1f}x')
+
+    print(f'renders: {scheduler.renders}, artists updated: '
+          f'{scheduler.artists.updated}, draws: {scheduler.draws}')
+    plots.generate_map = generate_map
+    plt.close(fig)
+    logging.disable(logging.NOTSET)
+
+
+def replot_selection(shared_data, seg_id: int, highlight: list):
+    # Selection of previous versions: a highlight line is plotted and the
+    # elevation profile is plotted again
+    from src import plots
+    obj_track = shared_data.obj_track
+    for line in highlight:
+        line.remove()
+    highlight.clear()
+    segment = obj_track.get_segment(seg_id)
+    highlight.append(shared_data.ax_track.plot(
+        segment.lon, segment.lat, linewidth=4, zorder=10,
+        color=plots.segment_color(seg_id - 1))[0])
+    plots.plot_elevation(obj_track, shared_data.ax_ele,
+                         selected_segment_idx=seg_id)
+    shared_data.canvas.draw()
+
+
+def bench_segment_artists(n_segments: int = 20, n_points: int = 100000):
+    import types
+    import logging
+    import warnings
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from src import plots, render
+    logging.disable(logging.CRITICAL)
+    warnings.filterwarnings('ignore', category=UserWarning)
+
+    obj_track = track.Track()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_gpx(f'{tmp_dir}/large.gpx', n_points)
+        obj_track.add_gpx(f'{tmp_dir}/large.gpx')
+    for index in np.linspace(0, n_points, n_segments + 1)[-2:0:-1]:
+        obj_track.divide_segment(1, int(index))
+
+    generate_map = plots.generate_map
+    blank = np.ones((768, 768, 3))
+    plots.generate_map = lambda ob_track: (blank, (
+        ob_track.extremes[2], ob_track.extremes[3],
+        ob_track.extremes[0], ob_track.extremes[1]))
+
+    def figure():
+        fig = plt.figure(figsize=(12, 8), dpi=100)
+        return types.SimpleNamespace(
+            obj_track=obj_track, canvas=fig.canvas,
+            ax_track=fig.add_subplot(2, 2, 1),
+            ax_ele=fig.add_subplot(2, 2, 3),
+            ax_track_info=fig.add_subplot(1, 2, 2))
+
+    previous = figure()
+    full_render(previous)
+    shared_data = figure()
+    scheduler = render.RenderScheduler(shared_data)
+    scheduler.invalidate_all()
+    scheduler.flush()
+
+    segment_ids = obj_track.segment_ids
+    highlight = []
+
+    def select_times():
+        t_replot = timeit(lambda: [replot_selection(previous, seg_id,
+                                                    highlight)
+                                   for seg_id in segment_ids], 1)
+        t_select = timeit(lambda: [scheduler.select(seg_id)
+                                   for seg_id in segment_ids], 1)
+        return t_replot / n_segments, t_select / n_segments
+
+    # Selection work alone, then with the draw of the figure
+    canvas_class = type(shared_data.canvas)
+    draw = canvas_class.draw
+    canvas_class.draw = lambda canvas, *args, **kwargs: None
+    t_replot_work, t_select_work = select_times()
+    canvas_class.draw = draw
+    t_replot, t_select = select_times()
+    t_plot = timeit(lambda: plots.plot_elevation(obj_track,
+                                                 previous.ax_ele))
+    t_update = timeit(lambda: scheduler.artists.update(obj_track))
+
+    order = dict(zip(segment_ids, segment_ids[1:] + segment_ids[:1]))
+
+    def partial():
+        obj_track.change_order(order)
+        scheduler.invalidate(render.ELEVATION, render.INFO,
+                             segments=segment_ids)
+        scheduler.flush()
+
+    t_full = timeit(lambda: (obj_track.change_order(order),
+                             full_render(previous)), 1)
+    t_partial = timeit(partial, 1)
+
+    print(f'{n_segments} segments, {n_points} points')
+    print(f'select segment: re-plot {t_replot_work * 1000:.1f}ms, '
+          f'properties {t_select_work * 1000:.1f}ms, speedup '
+          f'{t_replot_work / t_select_work:.0f}x')
+    print(f'select segment and draw: re-plot {t_replot * 1000:.1f}ms, '
+          f'properties {t_select * 1000:.1f}ms, speedup '
+          f'{t_replot / t_select:.1f}x')
+    print(f'elevation artists: plot {t_plot * 1000:.1f}ms, update '
+          f'{t_update * 1000:.1f}ms, speedup {t_plot / t_update:.1f}x')
+    print(f'change order: full render {t_full * 1000:.1f}ms, partial '
+          f'{t_partial * 1000:.1f}ms, speedup {t_full / t_partial:.1f}x')
+    print(f'artists created: {scheduler.artists.created}, updated: '
+          f'{scheduler.artists.updated}')
+    plots.generate_map = generate_map
+    plt.close('all')
+    logging.disable(logging.NOTSET)
+
+
+
+def bench_event_dispatch(n_loads: int = 10, n_clicks: int = 20):
+    import types
+    import logging
+    import warnings
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.backend_bases import MouseEvent
+    from src import plots, render
+    from src.event_dispatcher import EventDispatcher
+    logging.disable(logging.CRITICAL)
+    warnings.filterwarnings('ignore', category=UserWarning)
+
+    obj_track = track.Track()
+    for part in range(1, 6):
+        obj_track.add_gpx(f'{TEST_PATH}/test_cases/'
+                          f'Innacessible_Island_part{part}.gpx')
+
+    generate_map = plots.generate_map
+    blank = np.ones((768, 768, 3))
+    plots.generate_map = lambda ob_track: (blank, (
+        ob_track.extremes[2], ob_track.extremes[3],
+        ob_track.extremes[0], ob_track.extremes[1]))
+
+    fig = plt.figure(figsize=(12, 8), dpi=100)
+    shared_data = types.SimpleNamespace(
+        obj_track=obj_track, canvas=fig.canvas,
+        ax_track=fig.add_subplot(2, 2, 1), ax_ele=fig.add_subplot(2, 2, 3),
+        ax_track_info=fig.add_subplot(1, 2, 2))
+    scheduler = render.RenderScheduler(shared_data)
+    scheduler.invalidate_all()
+    scheduler.flush()
+
+    # Clicks on the first point of each segment
+    clicks = []
+    for index in range(n_clicks):
+        seg_id = obj_track.segment_ids[index % len(obj_track.segment_ids)]
+        segment = obj_track.get_segment(seg_id)
+        x, y = shared_data.ax_track.transData.transform(
+            (segment.lon.iloc[0], segment.lat.iloc[0]))
+        clicks.append(MouseEvent('button_press_event', fig.canvas, x, y,
+                                 button=1))
+
+    searches = []
+
+    def get_track():
+        searches.append(1)
+        return obj_track
+
+    def on_click():
+        return plots.segment_selection(get_track,
+                                       shared_data.ax_track,
+                                       scheduler.select)
+
+    def click_all():
+        for event in clicks:
+            fig.canvas.callbacks.process('button_press_event', event)
+
+    # Previous versions connected a new handler on every track load
+    cids = [fig.canvas.mpl_connect('button_press_event', on_click())
+            for _ in range(n_loads)]
+    draws = scheduler.draws
+    t_piled = timeit(click_all, 1) / n_clicks
+    piled_draws = (scheduler.draws - draws) / n_clicks
+    piled_searches = len(searches) / n_clicks
+    searches.clear()
+    for cid in cids:
+        fig.canvas.mpl_disconnect(cid)
+
+    dispatcher = EventDispatcher(fig.canvas)
+    for _ in range(n_loads):
+        dispatcher.connect('button_press_event', 'segment_selection',
+                           on_click(), axes=shared_data.ax_track)
+    draws = scheduler.draws
+    t_dispatch = timeit(click_all, 1) / n_clicks
+    dispatch_draws = (scheduler.draws - draws) / n_clicks
+    dispatch_searches = len(searches) / n_clicks
+
+    print(f'{n_loads} track loads, {len(obj_track.segment_ids)} segments')
+    print(f'{"per click":<18}{"time":>10}{"searches":>10}{"draws":>7}')
+    print(f'{"piled handlers":<18}{t_piled * 1000:>8.1f}ms'
+          f'{piled_searches:>10.0f}{piled_draws:>7.0f}')
+    print(f'{"dispatcher":<18}{t_dispatch * 1000:>8.1f}ms'
+          f'{dispatch_searches:>10.0f}{dispatch_draws:>7.0f}')
+    print(f'speedup {t_piled / t_dispatch:.1f}x')
+    print(f'handlers: {dispatcher.handler_count()}, dispatched: '
+          f'{dict(dispatcher.dispatched)}, calls: {dict(dispatcher.calls)}')
+    plots.generate_map = generate_map
+    plt.close(fig)
+    logging.disable(logging.NOTSET)
+
+
+BENCHMARKS = {'distance': bench_distance,
+              'parser': bench_parser,
+              'large_file': bench_large_file,
+              'writer': bench_writer,
+              'timestamp': bench_timestamp,
+              'fix_elevation': bench_fix_elevation,
+              'elevation_filters': bench_elevation_filters,
+              'tiles': bench_tiles,
+              'tile_catalog': bench_tile_catalog,
+              'map_img': bench_map_img,
+              'basemap': bench_basemap,
+              'tile_store': bench_tile_store,
+              'prefetch': bench_prefetch,
+              'tile_cache': bench_tile_cache,
+              'auto_zoom': bench_auto_zoom,
+              'lod': bench_lod,
+              'closest_segment': bench_closest_segment,
+              'split_drag': bench_split_drag,
+              'split_cursor': bench_split_cursor,
+              'render': bench_render,
+              'segment_artists': bench_segment_artists,
+              'event_dispatch': bench_event_dispatch}
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        print(f'--- {name} ---')
+        BENCHMARKS[name]()
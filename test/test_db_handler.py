@@ -125,3 +125,42 @@ def test_update_tile_status():
 def test_tile_exists():
     # Method under tests is used by other cases
     assert True
+
+
+def test_upsert_and_batches(tmp_path):
+    dbh = DbHandler(f'{tmp_path}/tiles.sqlite')
+    assert dbh.open_db()
+    tiles = [(10, x, y, True, f'tiles/10/{x}/{y}.png', 100 + x)
+             for x in range(20) for y in range(5)]
+    dbh.insert_tiles(tiles)
+    dbh.insert_tile(10, 3, 3, True, '/other', 7)  # upsert
+    assert dbh.print_tiles(verbose=False).shape[0] == 100
+    assert dbh.get_tile_size(10, 3, 3) == 7
+
+    dbh.update_tiles_status([(10, x, 0, False, 0) for x in range(20)])
+    assert not dbh.get_tile_status(10, 5, 0)
+    assert dbh.get_tiles_size([(10, 4, 0), (10, 4, 1), (11, 0, 0)]) == \
+        {(10, 4, 0): 0, (10, 4, 1): 104}
+
+    # Connection is shared by readers and writer
+    assert dbh.cur.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    dbh.close_db()
+
+
+def test_migrate_tiles(tmp_path):
+    import sqlite3
+    db_file = f'{tmp_path}/old.sqlite'
+    conn = sqlite3.connect(db_file)
+    conn.execute('CREATE TABLE Tiles (zoom INTEGER, x INTEGER, y INTEGER, '
+                 'status BOOLEAN, path TEXT, size INTEGER)')
+    conn.executemany('INSERT INTO Tiles VALUES (?, ?, ?, ?, ?, ?)',
+                     [(1, 0, 0, True, '/a', 10), (1, 0, 1, True, '/b', 20),
+                      (1, 0, 0, True, '/a', 30)])  # duplicated tile
+    conn.commit()
+    conn.close()
+
+    dbh = DbHandler(db_file)
+    assert dbh.open_db()
+    assert dbh.print_tiles(verbose=False).shape[0] == 2
+    assert dbh.get_tile_size(1, 0, 0) == 30
+    dbh.close_db()
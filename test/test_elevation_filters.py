@@ -0,0 +1,44 @@
+import pytest
+import numpy as np
+
+from src import elevation_filters
+
+
+def noisy_profile(n_points: int = 5000):
+    # Uneven spacing between 5 and 20 m
+    rng = np.random.default_rng(0)
+    distance = np.cumsum(rng.uniform(0.005, 0.02, n_points))
+    profile = 600 + 50 * np.sin(distance)
+    return distance, profile, profile + rng.normal(0, 2, n_points)
+
+
+@pytest.mark.parametrize('method', list(elevation_filters.FILTERS))
+def test_filters_reduce_noise(method):
+    distance, profile, ele = noisy_profile()
+    smooth = elevation_filters.smooth(ele, distance, method)
+
+    assert smooth.shape == ele.shape
+    assert np.std(smooth - profile) < 0.6 * np.std(ele - profile)
+    uphill, downhill = elevation_filters.gain_loss(smooth)
+    assert uphill < elevation_filters.gain_loss(ele)[0]
+    assert downhill > elevation_filters.gain_loss(ele)[1]
+
+
+def test_moving_average():
+    distance, _, ele = noisy_profile(500)
+    window = 0.1
+    expected = [ele[np.abs(distance - d) <= window / 2].mean()
+                for d in distance]
+    assert np.allclose(
+        elevation_filters.moving_average(ele, distance, window), expected)
+
+
+def test_smooth_missing_elevation():
+    distance, _, ele = noisy_profile(500)
+    ele[[0, 100, 101]] = np.nan
+    smooth = elevation_filters.smooth(ele, distance, 'savgol')
+    assert np.isnan(smooth[[0, 100, 101]]).all()
+    assert not np.isnan(np.delete(smooth, [0, 100, 101])).any()
+
+    with pytest.raises(ValueError):
+        elevation_filters.smooth(ele, distance, 'unknown')
@@ -0,0 +1,118 @@
+import os
+import types
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+from matplotlib.backend_bases import MouseEvent  # noqa: E402
+
+from src import plots, render, track  # noqa: E402
+from src.event_dispatcher import EventDispatcher  # noqa: E402
+
+TEST_PATH = os.path.dirname(__file__)
+
+
+def click(ax, x: float, y: float) -> MouseEvent:
+    x, y = ax.transData.transform((x, y))
+    event = MouseEvent('button_press_event', ax.figure.canvas, x, y,
+                       button=1)
+    ax.figure.canvas.callbacks.process('button_press_event', event)
+    return event
+
+
+def test_connect_replaces():
+    fig = plt.figure(figsize=(4, 4), dpi=50)
+    ax = fig.add_subplot(1, 1, 1)
+    dispatcher = EventDispatcher(fig.canvas)
+    callbacks = fig.canvas.callbacks.callbacks
+    n_callbacks = len(callbacks.get('button_press_event', {}))
+    calls = []
+
+    # Registering a key again does not pile up handlers
+    for _ in range(5):
+        dispatcher.connect('button_press_event', 'click',
+                           lambda event: calls.append(event))
+    assert dispatcher.handler_count('button_press_event') == 1
+    assert len(callbacks['button_press_event']) == n_callbacks + 1
+    click(ax, 0.5, 0.5)
+    assert len(calls) == 1
+    assert dispatcher.calls['click'] == 1
+
+    dispatcher.disconnect('click')
+    assert dispatcher.handler_count() == 0
+    assert len(callbacks['button_press_event']) == n_callbacks
+    click(ax, 0.5, 0.5)
+    assert len(calls) == 1
+    plt.close(fig)
+
+
+def test_axes_filter():
+    fig = plt.figure(figsize=(4, 4), dpi=50)
+    ax_map = fig.add_subplot(2, 1, 1)
+    ax_ele = fig.add_subplot(2, 1, 2)
+    dispatcher = EventDispatcher(fig.canvas)
+    dispatcher.connect('button_press_event', 'map', lambda event: None,
+                       axes=ax_map)
+    dispatcher.connect('button_press_event', 'any', lambda event: None)
+    assert dispatcher.handler_count() == 2
+
+    click(ax_map, 0.5, 0.5)
+    click(ax_ele, 0.5, 0.5)
+    assert dispatcher.dispatched['button_press_event'] == 2
+    assert dispatcher.calls == {'map': 1, 'any': 2}
+    plt.close(fig)
+
+
+def test_segment_selection(monkeypatch):
+    # Map without tiles
+    def generate_map(ob_track):
+        lat_min, lat_max, lon_min, lon_max = ob_track.extremes
+        return np.ones((4, 4, 3)), (lon_min, lon_max, lat_min, lat_max)
+    monkeypatch.setattr(plots, 'generate_map', generate_map)
+
+    obj_track = track.Track()
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/Innacessible_Island_part1.gpx')
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/Innacessible_Island_part2.gpx')
+    fig = plt.figure(figsize=(8, 6), dpi=50)
+    shared_data = types.SimpleNamespace(
+        obj_track=obj_track, canvas=fig.canvas,
+        ax_track=fig.add_subplot(3, 1, 1), ax_ele=fig.add_subplot(3, 1, 2),
+        ax_track_info=fig.add_subplot(3, 1, 3))
+    scheduler = render.RenderScheduler(shared_data)
+    scheduler.invalidate_all()
+    scheduler.flush()
+    counted = _counter(plots.get_closest_segment)
+    monkeypatch.setattr(plots, 'get_closest_segment', counted)
+
+    dispatcher = EventDispatcher(fig.canvas)
+    dispatcher.connect('button_press_event', 'segment_selection',
+                       plots.segment_selection(lambda: obj_track,
+                                               shared_data.ax_track,
+                                               scheduler.select),
+                       axes=shared_data.ax_track)
+
+    # A click runs a single search and a single draw
+    segment = obj_track.get_segment(2)
+    draws = scheduler.draws
+    click(shared_data.ax_track, segment.lon.iloc[0], segment.lat.iloc[0])
+    assert obj_track.selected_segment_idx == [2]
+    assert counted.calls == 1
+    assert scheduler.draws == draws + 1
+
+    # Same selection, nothing is drawn
+    click(shared_data.ax_track, segment.lon.iloc[0], segment.lat.iloc[0])
+    assert counted.calls == 2
+    assert scheduler.draws == draws + 1
+
+    # Clicks in other axes are not searched
+    click(shared_data.ax_ele, 0.5, 0.5)
+    assert counted.calls == 2
+    plt.close(fig)
+
+
+def _counter(function):
+    def counted(*args, **kwargs):
+        counted.calls += 1
+        return function(*args, **kwargs)
+    counted.calls = 0
+    return counted
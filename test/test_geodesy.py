@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import gpxpy
+
+from src import geodesy
+
+TEST_PATH = os.path.dirname(__file__)
+
+
+def route_coordinates(filename: str):
+    with open(f'{TEST_PATH}/test_cases/{filename}') as gpx_file:
+        route = gpxpy.parse(gpx_file)
+    points = [point for track in route.tracks
+              for segment in track.segments
+              for point in segment.points]
+    return np.array([p.latitude for p in points]), \
+        np.array([p.longitude for p in points])
+
+
+def long_pairs():
+    # Madrid-Moscow, Sydney-Lima, pole to equator and same point
+    lat1 = np.array([40.4168, -33.8688, 90.0, 10.0])
+    lon1 = np.array([-3.7038, 151.2093, 0.0, 10.0])
+    lat2 = np.array([55.7558, -12.0464, 0.0, 10.0])
+    lon2 = np.array([37.6173, -77.0428, 45.0, 10.0])
+    return lat1, lon1, lat2, lon2
+
+
+def test_vincenty_error_bound():
+    lat, lon = route_coordinates('basic_sample.gpx')
+    reference = geodesy.geodesic(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    vincenty = geodesy.vincenty(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    assert np.max(np.abs(vincenty - reference)) < 1e-6  # below 1 mm
+
+    reference = geodesy.geodesic(*long_pairs())
+    vincenty = geodesy.vincenty(*long_pairs())
+    assert np.max(np.abs(vincenty - reference)) < 1e-6
+
+
+def test_haversine_error_bound():
+    reference = geodesy.geodesic(*long_pairs())[:-1]
+    haversine = geodesy.haversine(*long_pairs())[:-1]
+    assert np.all(np.abs(haversine - reference) / reference < 0.0056)
+
+
+def test_antipodal_fallback():
+    distance = geodesy.distance(0.0, 0.0, 0.5, 179.7, method='vincenty')
+    reference = geodesy.geodesic(0.0, 0.0, 0.5, 179.7)
+    assert abs(distance - reference) < 1e-6
+
+
+def test_p2p_distance():
+    lat, lon = route_coordinates('Innacessible_Island_part1.gpx')
+    lat[5] = np.nan  # invalid points have no distance
+
+    p2p = geodesy.p2p_distance(lat, lon)
+    assert p2p.shape == lat.shape
+    assert p2p[0] == 0
+    assert p2p[5] == 0 and p2p[6] == 0
+    assert np.all(p2p >= 0)
@@ -16,9 +16,31 @@ def test_load_file():
     assert route._load_file()
 
 
-def test_load_file_big():
-    route = gpx.Gpx(f"{TEST_PATH}/test_cases/over_10mb.gpx")
-    assert route._load_file() is None
+def test_load_file_big(monkeypatch):
+    # Big files are read by chunks, force several chunks in a small file
+    monkeypatch.setattr(gpx.c, "gpx_chunk_size", 4096)
+    filename = f"{TEST_PATH}/test_cases/nominal_route.gpx"
+    calls = []
+
+    route = gpx.Gpx(filename, progress=lambda *args: calls.append(args))
+    assert route._state
+    assert len(calls) > 1
+    assert calls[-1] == (os.stat(filename).st_size,) * 2
+    assert route.to_dict()["lat"] == gpx.parse(filename)["lat"].tolist()
+
+
+def test_load_file_downsample():
+    full = gpx.parse(f"{TEST_PATH}/test_cases/basic_sample.gpx")
+    reduced = gpx.parse(f"{TEST_PATH}/test_cases/basic_sample.gpx",
+                        downsample=10)
+
+    assert reduced["lat"].size == (full["lat"].size - 1) // 10 + 2
+    assert reduced["lat"][0] == full["lat"][0]
+    assert reduced["lat"][-1] == full["lat"][-1]
+    assert reduced["lat"][1] == full["lat"][10]
+
+    with pytest.raises(ValueError):
+        gpx.parse(f"{TEST_PATH}/test_cases/basic_sample.gpx", downsample=0)
 
 
 def test_load_file_no_permission():
@@ -62,6 +84,67 @@ def test_to_pandas():
     assert fail()
 
 
-@pytest.mark.xfail
-def test_write():
-    assert fail()
+def test_parse_matches_gpxpy():
+    import gpxpy
+    import numpy as np
+
+    filename = f"{TEST_PATH}/test_cases/nominal_route.gpx"
+    points = gpx.parse(filename)
+
+    with open(filename) as gpx_file:
+        reference = [p for track in gpxpy.parse(gpx_file).tracks
+                     for segment in track.segments for p in segment.points]
+
+    assert points["lat"].dtype == np.float64
+    assert points["time"].dtype == np.dtype("datetime64[us]")
+    assert np.array_equal(points["lat"], [p.latitude for p in reference])
+    assert np.array_equal(points["lon"], [p.longitude for p in reference])
+    assert np.array_equal(points["ele"], [p.elevation for p in reference])
+    assert points["time"][-1].astype(object) == \
+        reference[-1].time.replace(tzinfo=None)
+
+
+def test_parse_time_offset():
+    assert gpx._parse_time("2015-07-24T08:44:14+02:00") == \
+        gpx._parse_time("2015-07-24T06:44:14Z")
+
+
+def gpxpy_xml(points, offsets):
+    # Reference output generated by gpxpy
+    import gpxpy.gpx
+    import numpy as np
+
+    ob_gpxpy = gpxpy.gpx.GPX()
+    gpx_track = gpxpy.gpx.GPXTrack()
+    ob_gpxpy.tracks.append(gpx_track)
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        gpx_segment = gpxpy.gpx.GPXTrackSegment()
+        gpx_track.segments.append(gpx_segment)
+        for i in range(start, end):
+            ele = points["ele"][i]
+            time = points["time"][i].astype("datetime64[us]").astype(object)
+            gpx_segment.points.append(gpxpy.gpx.GPXTrackPoint(
+                float(points["lat"][i]), float(points["lon"][i]),
+                elevation=None if np.isnan(ele) else float(ele),
+                time=time))
+    return ob_gpxpy.to_xml()
+
+
+def test_write(tmp_path):
+    import gzip
+    import numpy as np
+
+    points = gpx.parse(f"{TEST_PATH}/test_cases/basic_sample.gpx")
+    points["ele"][3] = np.nan
+    points["time"][4] = np.datetime64("NaT")
+    points["time"][5] += np.timedelta64(500, "ms")
+    points["lat"][6] = 1e-05
+    offsets = np.array([0, 100, 100, points["lat"].size])
+
+    gpx.write(f"{tmp_path}/track.gpx", points, offsets)
+    with open(f"{tmp_path}/track.gpx") as f:
+        assert f.read() == gpxpy_xml(points, offsets)
+
+    gpx.write(f"{tmp_path}/track.gpx.gz", points, offsets)
+    with gzip.open(f"{tmp_path}/track.gpx.gz", "rt") as f:
+        assert f.read() == gpxpy_xml(points, offsets)
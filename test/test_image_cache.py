@@ -0,0 +1,89 @@
+import os
+import numpy as np
+import matplotlib.image as mpimg
+
+from src import plots
+from src.image_cache import TileImageCache
+
+
+def write_tiles(zoom: int, xtiles: range, ytiles: range):
+    rng = np.random.default_rng(0)
+    for x in xtiles:
+        os.makedirs(f'tiles/{zoom}/{x}', exist_ok=True)
+        for y in ytiles:
+            mpimg.imsave(f'tiles/{zoom}/{x}/{y}.png',
+                         rng.uniform(size=(16, 16, 3)))
+
+
+def test_lru_eviction(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_tiles(5, range(3), range(2))
+    tile_bytes = mpimg.imread('tiles/5/0/0.png').nbytes
+
+    cache = TileImageCache(max_bytes=3 * tile_bytes)
+    for x in range(3):
+        cache.get(5, x, 0)
+    cache.get(5, 0, 0)  # most recently used
+    cache.get(5, 0, 1)  # evicts (5, 1, 0)
+
+    assert len(cache) == 3 and cache.size == 3 * tile_bytes
+    assert (5, 1, 0) not in cache and (5, 0, 0) in cache
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 4, 1)
+
+    # Tiles are served from memory
+    os.remove('tiles/5/0/0.png')
+    assert not cache.get(5, 0, 0).flags.writeable
+
+
+def test_create_map_img(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_tiles(7, range(10, 13), range(20, 22))
+    monkeypatch.setattr(plots, 'TILE_IMAGES', TileImageCache())
+
+    map_img = plots.create_map_img((10, 20, 12, 21), 7)
+    expected = np.hstack([
+        np.vstack([mpimg.imread(f'tiles/7/{x}/{y}.png') for y in (20, 21)])
+        for x in (10, 11, 12)])
+    assert np.array_equal(map_img, expected)
+
+    # Redraw does not read files
+    misses = plots.TILE_IMAGES.misses
+    plots.create_map_img((10, 20, 12, 21), 7)
+    assert plots.TILE_IMAGES.misses == misses
+
+
+def test_basemap_cache(tmp_path, monkeypatch):
+    from src import iosm, track
+
+    obj_track = track.Track()
+    test_path = os.path.dirname(os.path.abspath(__file__))
+    for i in (1, 2):
+        obj_track.add_gpx(
+            f'{test_path}/test_cases/Innacessible_Island_part{i}.gpx')
+
+    # Tiles are written instead of downloaded
+    monkeypatch.chdir(tmp_path)
+    downloads = []
+
+    def download_tiles_by_num(xtile, ytile, final_xtile, final_ytile,
+                              max_zoom, extra_tiles):
+        downloads.append(max_zoom)
+        write_tiles(max_zoom, range(xtile, final_xtile + 1),
+                    range(ytile, final_ytile + 1))
+        return (final_xtile - xtile + 1) * (final_ytile - ytile + 1)
+
+    monkeypatch.setattr(iosm, 'download_tiles_by_num', download_tiles_by_num)
+    monkeypatch.setattr(plots, 'BASEMAPS', plots.BasemapCache())
+
+    map_img, bbox = plots.generate_map(obj_track)
+    obj_track.reverse_segment(1)
+    obj_track.change_order({1: 2, 2: 1})
+    assert plots.generate_map(obj_track)[0] is map_img
+    assert plots.generate_map(obj_track)[1] == bbox
+    assert len(downloads) == 1
+    assert (plots.BASEMAPS.hits, plots.BASEMAPS.misses) == (2, 1)
+
+    # Bounding box changes
+    obj_track.remove_segment(2)
+    plots.generate_map(obj_track)
+    assert plots.BASEMAPS.misses == 2
@@ -1,5 +1,9 @@
 import pytest
 import os
+import threading
+import time
+import http.server
+import numpy as np
 
 from src import constants as c, iosm
 
@@ -72,3 +76,135 @@ def test_download_tiles_nominal():
     (lon_min, lon_max, lat_min, lat_max) = area_coor()
     assert iosm.download_tiles(lat_min, lon_min, lat_max, lon_max,
                                max_zoom=my_zoom) == total_tiles
+
+
+class TileHandler(http.server.BaseHTTPRequestHandler):
+    # Stand-in tile server: fake png for zoom up to 19, 503 once for flaky
+    # tiles and some latency to overlap requests
+    lock = threading.Lock()
+    active = max_active = 0
+    requests = []
+    flaky = set()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+            cls.requests.append(self.path)
+        time.sleep(0.02)
+
+        zoom = int(self.path.split('/')[1])
+        if self.path in cls.flaky:
+            cls.flaky.discard(self.path)
+            self.send_response(503)
+            body = b''
+        elif zoom < 20:
+            self.send_response(200)
+            body = b'PNG' + self.path.encode()
+        else:
+            self.send_response(404)
+            body = b''
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        with cls.lock:
+            cls.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def tile_server(tmp_path, monkeypatch):
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), TileHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(c, 'tile_server',
+                        f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setattr(c, 'tile_backoff', 0)
+    TileHandler.active = TileHandler.max_active = 0
+    TileHandler.requests = []
+    yield TileHandler
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_tiles_concurrent(tile_server):
+    tile_server.flaky = {'/5/1/2.png'}
+    assert iosm.download_tiles_by_num(0, 0, 3, 3, max_zoom=5) == 16
+
+    # Every tile is stored, flaky tile is retried
+    assert len(tile_server.requests) == 17
+    assert tile_server.requests.count('/5/1/2.png') == 2
+    with open('tiles/5/1/2.png', 'rb') as tile:
+        assert tile.read() == b'PNG/5/1/2.png'
+    iosm.DBH.open_db()
+    assert iosm.DBH.get_tile_size(5, 3, 3) == len(b'PNG/5/3/3.png')
+
+    # Requests overlap up to the limit of connections per host
+    assert 1 < tile_server.max_active <= c.tile_connections
+
+    # Available tiles are not requested again
+    assert iosm.download_tiles_by_num(0, 0, 3, 3, max_zoom=5) == 16
+    assert len(tile_server.requests) == 17
+
+
+def test_download_tiles_missing(tile_server):
+    iosm.DBH.open_db()
+    assert not iosm._download_url(25, 1, 1)
+    assert iosm.download_tile_list([(25, 1, 1), (4, 1, 1), (4, 1, 1)]) == 1
+    assert iosm.DBH.get_tile_size(25, 1, 1) == 0
+
+
+def test_download_tiles_store(tile_server, monkeypatch):
+    from src import tile_store
+    monkeypatch.setattr(c, 'tile_store_file', 'tiles.mbtiles')
+
+    assert iosm.download_tiles_by_num(0, 0, 1, 1, max_zoom=3) == 4
+    assert not os.path.exists('tiles')
+    assert tile_store.get_store().get(3, 1, 0) == b'PNG/3/1/0.png'
+
+    # Stored tiles are not requested again
+    assert iosm.download_tiles_by_num(0, 0, 1, 1, max_zoom=3) == 4
+    assert len(tile_server.requests) == 4
+
+
+def test_download_tiles_budget(tile_server, monkeypatch):
+    monkeypatch.setattr(iosm.CACHE, 'max_bytes', 60)
+    monkeypatch.setattr(iosm.CACHE, 'hits', 0)
+    monkeypatch.setattr(iosm.CACHE, 'misses', 0)
+    assert iosm.download_tiles_by_num(0, 0, 1, 1, max_zoom=5) == 4
+    assert iosm.download_tiles_by_num(2, 2, 3, 3, max_zoom=5) == 4
+
+    # Tiles of the first map are evicted, the requested ones are kept
+    iosm.DBH.open_db()
+    assert iosm.DBH.get_size_by_zoom() == {5: (4, 4 * len(b'PNG/5/2/2.png'))}
+    assert not os.path.exists('tiles/5/0/0.png')
+    assert iosm.download_tiles_by_num(2, 2, 3, 3, max_zoom=5) == 4
+    assert (iosm.CACHE.hits, iosm.CACHE.misses) == (4, 8)
+
+
+def test_deg2num_array():
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(-85, 85, 500)
+    lon = rng.uniform(-180, 180, 500)
+    zoom = rng.integers(0, 19, 500)
+
+    xtile, ytile = iosm.deg2num_array(lat, lon, zoom)
+    assert [tuple(tile) for tile in zip(xtile, ytile)] == \
+        [iosm.deg2num(*point) for point in zip(lat, lon, zoom)]
+
+    lat_nw, lon_nw = iosm.num2deg_array(xtile, ytile, zoom)
+    assert np.allclose(
+        np.column_stack((lat_nw, lon_nw)),
+        [iosm.num2deg(*tile) for tile in zip(xtile, ytile, zoom)])
+
+    # Coordinates of a single point for several zooms
+    xtile, ytile = iosm.deg2num_array(40.4, -3.7, np.arange(4))
+    assert list(zip(xtile, ytile)) == \
+        [iosm.deg2num(40.4, -3.7, zoom) for zoom in range(4)]
@@ -0,0 +1,49 @@
+import os
+import numpy as np
+import pytest
+
+from src import constants as c, iosm, plots, track
+
+TEST_CASES = os.path.join(os.path.dirname(__file__), 'test_cases')
+
+
+def loop_auto_zoom(lat_min: float, lon_min: float,
+                   lat_max: float, lon_max: float) -> int:
+    # Zoom by zoom search of previous versions
+    for zoom in range(c.max_zoom):
+        num_x_min, num_y_min = iosm.deg2num(lat_min, lon_min, zoom)
+        num_x_max, num_y_max = iosm.deg2num(lat_max, lon_max, zoom)
+        width = abs(num_x_max - num_x_min)
+        height = abs(num_y_max - num_y_min)
+        if width > c.map_size or height > c.map_size:
+            return zoom - 1
+        if (width == c.map_size and height < c.map_size) or \
+                (width < c.map_size and height == c.map_size):
+            return zoom
+    return c.max_zoom
+
+
+@pytest.mark.parametrize('filename', sorted(os.listdir(TEST_CASES)))
+def test_auto_zoom_test_cases(filename):
+    obj_track = track.Track()
+    obj_track.add_gpx(os.path.join(TEST_CASES, filename))
+    lat_min, lat_max, lon_min, lon_max = obj_track.extremes
+    assert plots.auto_zoom(lat_min, lon_min, lat_max, lon_max) == \
+        loop_auto_zoom(lat_min, lon_min, lat_max, lon_max)
+
+
+@pytest.mark.parametrize('map_size', [1, 2, 3])
+def test_auto_zoom(map_size, monkeypatch):
+    monkeypatch.setattr(c, 'map_size', map_size)
+    rng = np.random.default_rng(0)
+    for _ in range(2000):
+        lat, lon = rng.uniform(-80, 80), rng.uniform(-179, 179)
+        size = 10 ** rng.uniform(-5, 1.5)
+        box = (lat, lon,
+               lat + size * rng.uniform(), lon + size * rng.uniform())
+        assert plots.auto_zoom(*box) == loop_auto_zoom(*box)
+
+    # Single point and tile aligned boxes
+    for box in [(40, -3, 40, -3), (0, 0, 0, 45), (0, -180, 0, 180),
+                (-85, -180, 85, 180)]:
+        assert plots.auto_zoom(*box) == loop_auto_zoom(*box)
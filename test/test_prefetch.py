@@ -0,0 +1,62 @@
+import os
+import numpy as np
+
+from src import iosm, prefetch
+
+
+def diagonal_route():
+    # Straight diagonal route of about 60 km
+    lat = np.linspace(40.0, 40.4, 50)
+    lon = np.linspace(-3.0, -3.5, 50)
+    return lat, lon
+
+
+def test_corridor_tiles():
+    lat, lon = diagonal_route()
+    for zoom in (0, 10, 14):
+        tiles = prefetch.corridor_tiles(lat, lon, zoom, buffer=0.5)
+        assert tiles == sorted(set(tiles))
+        assert {(zoom, *iosm.deg2num(a, b, zoom))
+                for a, b in zip(lat, lon)} <= set(tiles)
+
+    # Bounding box has much more tiles than the corridor
+    x_min, y_min = iosm.deg2num(lat.max(), lon.min(), 14)
+    x_max, y_max = iosm.deg2num(lat.min(), lon.max(), 14)
+    assert len(tiles) < (x_max - x_min + 1) * (y_max - y_min + 1) / 5
+
+    # Tiles between segments are not included
+    broken = prefetch.corridor_tiles(np.array([40.0, 40.01, np.nan, 40.4]),
+                                     np.array([-3.0, -3.01, np.nan, -3.5]),
+                                     14, buffer=0.1)
+    assert len(broken) < len(prefetch.corridor_tiles(
+        np.array([40.0, 40.4]), np.array([-3.0, -3.5]), 14, buffer=0.1))
+
+
+def test_prefetch_resume(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    requests = []
+
+    def fetch_tile(zoom, xtile, ytile, to_store=False):
+        requests.append((zoom, xtile, ytile))
+        os.makedirs(f'tiles/{zoom}/{xtile}', exist_ok=True)
+        path = f'tiles/{zoom}/{xtile}/{ytile}.png'
+        with open(path, 'wb') as tile:
+            tile.write(b'png')
+        return (zoom, xtile, ytile, True, path, 3), None
+
+    monkeypatch.setattr(iosm, '_fetch_tile', fetch_tile)
+    lat, lon = diagonal_route()
+    calls = []
+
+    result = prefetch.prefetch(lat[:25], lon[:25], max_zoom=12,
+                               progress=lambda *args: calls.append(args))
+    assert result['cached'] == 0
+    assert result['available'] == result['tiles'] == len(requests)
+    assert calls[-1] == (len(requests), len(requests))
+
+    # Tiles of the first half are not requested again
+    requests.clear()
+    result = prefetch.prefetch(lat, lon, max_zoom=12)
+    assert result['available'] == result['tiles']
+    assert result['cached'] + len(requests) == result['tiles']
+    assert result['cached'] > 0
@@ -0,0 +1,162 @@
+import os
+import types
+import numpy as np
+import pytest
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+
+from src import plots, render, track  # noqa: E402
+
+TEST_PATH = os.path.dirname(__file__)
+
+
+@pytest.fixture
+def shared_data(monkeypatch):
+    # Map without tiles
+    def generate_map(ob_track):
+        lat_min, lat_max, lon_min, lon_max = ob_track.extremes
+        return np.ones((4, 4, 3)), (lon_min, lon_max, lat_min, lat_max)
+    monkeypatch.setattr(plots, 'generate_map', generate_map)
+
+    obj_track = track.Track()
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/Innacessible_Island_part1.gpx')
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/Innacessible_Island_part2.gpx')
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/Innacessible_Island_part3.gpx')
+
+    fig = plt.figure(figsize=(8, 6), dpi=50)
+    data = types.SimpleNamespace(
+        obj_track=obj_track, canvas=fig.canvas,
+        ax_track=fig.add_subplot(3, 1, 1), ax_ele=fig.add_subplot(3, 1, 2),
+        ax_track_info=fig.add_subplot(3, 1, 3))
+    data.scheduler = render.RenderScheduler(data)
+    data.draws = []
+    monkeypatch.setattr(fig.canvas, 'draw_idle',
+                        lambda: data.draws.append(1))
+    yield data
+    plt.close(fig)
+
+
+def test_flush_coalesces(shared_data):
+    scheduler = shared_data.scheduler
+    assert not scheduler.flush()
+
+    scheduler.invalidate(render.MAP)
+    scheduler.invalidate(render.ELEVATION)
+    scheduler.invalidate_all()
+    assert scheduler.flush()
+    assert len(shared_data.draws) == 1
+    assert scheduler.renders == {render.MAP: 1, render.ELEVATION: 1,
+                                 render.INFO: 1}
+    assert set(scheduler.artists.lines) == {1, 2, 3}
+    assert not scheduler.flush()
+    assert len(shared_data.draws) == 1
+
+    with pytest.raises(ValueError):
+        scheduler.invalidate('legend')
+
+
+def test_partial_render(shared_data):
+    scheduler = shared_data.scheduler
+    obj_track = shared_data.obj_track
+    scheduler.invalidate_all()
+    scheduler.flush()
+    image = shared_data.ax_track.images[0]
+    lines = dict(scheduler.artists.lines)
+    ele_lines = dict(scheduler.artists.ele_lines)
+
+    # Elevation edits do not touch the map
+    obj_track.fix_elevation(1)
+    scheduler.invalidate(render.ELEVATION, render.INFO)
+    scheduler.flush()
+    assert scheduler.renders[render.MAP] == 1
+    assert scheduler.artists.updated == 6  # elevation line and area
+    assert shared_data.ax_track.images[0] is image
+    assert scheduler.artists.ele_lines == ele_lines
+
+    # Order changes update the lines in place
+    obj_track.change_order({1: 3, 2: 1, 3: 2})
+    scheduler.invalidate(render.ELEVATION, render.INFO,
+                         segments=obj_track.segment_ids)
+    scheduler.flush()
+    assert scheduler.renders == {render.MAP: 1, render.ELEVATION: 3,
+                                 render.INFO: 3}
+    assert scheduler.artists.created == 9
+    assert scheduler.info_updates == 2
+    cells = scheduler.track_info_table.get_celld()
+    assert [cells[row, 0].get_text().get_text() for row in range(4)] == \
+        [str(seg_id) for seg_id in obj_track.segment_ids] + ['TOTAL']
+    assert shared_data.ax_track.images[0] is image
+    zoom = plots._view_zoom(shared_data.ax_track)
+    for seg_id, line in scheduler.artists.lines.items():
+        assert line is lines[seg_id]
+        assert np.array_equal(line.get_xdata(),
+                              obj_track.get_segment_lod(seg_id, zoom)[1])
+
+    # Removed segments lose their line, the map moves with the extremes
+    extremes = obj_track.extremes
+    obj_track.remove_segment(2)
+    scheduler.invalidate(render.ELEVATION, render.INFO, segments=[2])
+    scheduler.flush()
+    assert set(scheduler.artists.lines) == {1, 3}
+    assert scheduler.info_updates == 2
+    assert lines[2] not in shared_data.ax_track.lines
+    assert ele_lines[2] not in shared_data.ax_ele.lines
+    assert scheduler.renders[render.MAP] == \
+        (1 if obj_track.extremes == extremes else 2)
+    assert len(shared_data.draws) == 4
+
+
+def test_render_empty(shared_data, monkeypatch):
+    monkeypatch.setattr(plots, 'create_map_img',
+                        lambda extreme_tiles, zoom: np.ones((4, 4, 3)))
+    scheduler = shared_data.scheduler
+    scheduler.invalidate_all()
+    scheduler.flush()
+
+    shared_data.obj_track = track.Track()
+    scheduler.invalidate_all()
+    scheduler.flush()
+    assert scheduler.artists.lines == {}
+    assert scheduler.track_info_table is None
+    assert not shared_data.ax_track.lines
+    assert not shared_data.ax_ele.lines
+
+
+def test_select(shared_data):
+    scheduler = shared_data.scheduler
+    obj_track = shared_data.obj_track
+    scheduler.invalidate_all()
+    scheduler.flush()
+    artists = scheduler.artists
+    children = list(shared_data.ax_ele.get_children())
+
+    # Selection changes properties, nothing is plotted
+    scheduler.select(2)
+    assert obj_track.selected_segment_idx == [2]
+    assert shared_data.ax_ele.get_children() == children
+    assert [line.get_visible() for line in artists.ele_lines.values()] == \
+        [False, True, False]
+    assert artists.lines[2].get_linewidth() > artists.lines[1].get_linewidth()
+    assert shared_data.ax_ele.get_xlim()[0] > 0
+    bold = [cell.get_text().get_fontweight() for (row, col), cell in
+            scheduler.track_info_table.get_celld().items() if row == 1]
+    assert set(bold) == {'bold'}
+    assert len(shared_data.draws) == 2
+
+    # Selection survives edits until its segment is removed
+    obj_track.reverse_segment(2)
+    scheduler.invalidate(render.ELEVATION, render.INFO, segments=[2])
+    scheduler.flush()
+    assert artists.selected == 2
+    assert not artists.ele_lines[1].get_visible()
+    obj_track.remove_segment(2)
+    scheduler.invalidate(render.ELEVATION, render.INFO, segments=[2])
+    scheduler.flush()
+    assert obj_track.selected_segment_idx == []
+    assert all(line.get_visible() for line in artists.ele_lines.values())
+
+    scheduler.select(0)
+    scheduler.select(7)  # missing segment
+    assert obj_track.selected_segment_idx == []
+    assert scheduler.renders[render.ELEVATION] == 3
@@ -0,0 +1,85 @@
+import os
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+
+from src import plots, track  # noqa: E402
+from src.segment_artists import SegmentArtists  # noqa: E402
+
+TEST_PATH = os.path.dirname(__file__)
+
+
+def many_segments(n_segments: int) -> track.Track:
+    obj_track = track.Track()
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/nominal_route.gpx')
+    size = obj_track.df_track.shape[0]
+    # Last divisions first, the first segment is always divided
+    for index in np.linspace(0, size, n_segments + 1)[-2:0:-1].astype(int):
+        obj_track.divide_segment(1, int(index))
+    return obj_track
+
+
+def registry(obj_track: track.Track) -> SegmentArtists:
+    fig = plt.figure(figsize=(8, 6), dpi=50)
+    artists = SegmentArtists(fig.add_subplot(2, 1, 1),
+                             fig.add_subplot(2, 1, 2))
+    lat_min, lat_max, lon_min, lon_max = obj_track.extremes
+    artists.set_map(np.ones((4, 4, 3)), (lon_min, lon_max, lat_min, lat_max))
+    artists.update(obj_track)
+    return artists
+
+
+def test_many_segments():
+    obj_track = many_segments(20)
+    artists = registry(obj_track)
+    assert len(obj_track.segment_ids) == 20
+    assert set(artists.lines) == set(obj_track.segment_ids)
+    assert artists.created == 60
+
+    # Colors are repeated after the last one
+    colors = [line.get_color() for line in artists.lines.values()]
+    assert colors[len(plots.COLOR_LIST)] == colors[0]
+    assert plots.segment_color(len(plots.COLOR_LIST) + 1) == \
+        plots.COLOR_LIST[1]
+
+    # Updates do not create artists
+    lines = dict(artists.lines)
+    artists.update(obj_track, segments={3})
+    assert artists.created == 60
+    assert artists.lines == lines
+    plt.close(artists.ax_track.figure)
+
+
+def test_cleared_axes():
+    obj_track = many_segments(3)
+    artists = registry(obj_track)
+    assert artists.is_attached()
+
+    # Other plots clear the elevation axes, artists are created again
+    artists.ax_ele.cla()
+    artists.ax_ele.plot([0, 1], [0, 1])
+    assert not artists.is_attached()
+    artists.update(obj_track, segments=set(), elevation=False)
+    assert artists.is_attached()
+    assert len(artists.ax_ele.lines) == 3
+    assert artists.created == 15
+
+    artists.clear()
+    assert not artists.ax_track.lines and not artists.ax_ele.lines
+    assert not artists.ax_track.images
+    plt.close(artists.ax_track.figure)
+
+
+def test_level_of_detail():
+    obj_track = many_segments(2)
+    artists = registry(obj_track)
+    points = sum(len(line.get_xdata()) for line in artists.lines.values())
+
+    # Zooming in the map shows more points
+    xlim = artists.ax_track.get_xlim()
+    artists.ax_track.set_xlim(xlim[0], xlim[0] + (xlim[1] - xlim[0]) / 1000)
+    assert artists.plotted_zoom == plots._view_zoom(artists.ax_track)
+    assert sum(len(line.get_xdata()) for line in artists.lines.values()) > \
+        points
+    plt.close(artists.ax_track.figure)
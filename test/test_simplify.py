@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from src import simplify
+
+
+def recursive_rdp(x, y, tolerance, start, end, kept):
+    # Reference Ramer-Douglas-Peucker
+    if end - start < 2:
+        return
+    chord_x, chord_y = x[end] - x[start], y[end] - y[start]
+    rel_x, rel_y = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+    chord = np.hypot(chord_x, chord_y)
+    if chord > 0:
+        distance = np.abs(chord_x * rel_y - chord_y * rel_x) / chord
+    else:
+        distance = np.hypot(rel_x, rel_y)
+    farthest = start + 1 + np.argmax(distance)
+    if distance.max() >= tolerance:
+        kept.add(farthest)
+        recursive_rdp(x, y, tolerance, start, farthest, kept)
+        recursive_rdp(x, y, tolerance, farthest, end, kept)
+
+
+def test_rdp_importance():
+    rng = np.random.default_rng(0)
+    for n_points in [2, 3, 10, 250]:
+        x = np.cumsum(rng.normal(size=n_points))
+        y = np.cumsum(rng.normal(size=n_points))
+        importance = simplify.rdp_importance(x, y)
+        for tolerance in [0.1, 0.5, 2]:
+            kept = {0, n_points - 1}
+            recursive_rdp(x, y, tolerance, 0, n_points - 1, kept)
+            assert list(simplify.lod_indices(importance, tolerance)) == \
+                sorted(kept)
+
+    # Straight lines, repeated points and sharp corners
+    x = np.array([0, 1, 2, 2, 3, 3, 3, 0.])
+    y = np.array([0, 0, 0, 0, 0, 1, 2, 2.])
+    assert list(simplify.lod_indices(simplify.rdp_importance(x, y), 0.5)) \
+        == [0, 4, 6, 7]
+
+
+def test_view_zoom():
+    # Single tile shown at its own size
+    assert simplify.view_zoom(360, simplify.TILE_PIXELS) == 0
+    assert simplify.view_zoom(360 / 2 ** 10, 600) == 12
+    assert simplify.view_zoom(0, 600) == simplify.c.lod_max_zoom
+    assert simplify.zoom_tolerance(1, 60) == \
+        pytest.approx(simplify.zoom_tolerance(0, 0) / 4)
@@ -0,0 +1,28 @@
+import math
+import numpy as np
+
+from src.spatial_index import GridIndex
+
+
+def test_nearest():
+    rng = np.random.default_rng(0)
+    lat = 40 + np.cumsum(rng.normal(scale=1e-3, size=2000))
+    lon = -3 + np.cumsum(rng.normal(scale=1e-3, size=2000))
+    lat[100] = np.nan  # invalid points are not indexed
+    index = GridIndex(lat, lon)
+
+    for scale in [1e-4, 1e-2, 1]:  # on the track to far away
+        for _ in range(20):
+            q_lat = np.nanmean(lat) + rng.normal(scale=scale)
+            q_lon = np.nanmean(lon) + rng.normal(scale=scale)
+            x, y = index._project(lat, lon)
+            q_x, q_y = index._project(q_lat, q_lon)
+            distance = np.hypot(x - q_x, y - q_y)
+            point, point_distance = index.nearest(q_lat, q_lon)
+            assert point == np.nanargmin(distance)
+            assert point_distance == distance[point]
+
+    # Repeated points, the first one in track order is returned
+    index = GridIndex(np.array([1., 2, 2, 1]), np.array([1., 1, 1, 1]))
+    assert index.nearest(2.1, 1)[0] == 1
+    assert GridIndex(np.empty(0), np.empty(0)).nearest(0, 0) == (-1, math.inf)
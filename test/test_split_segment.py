@@ -0,0 +1,189 @@
+import os
+from bisect import bisect
+import types
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+from matplotlib import widgets  # noqa: E402
+from matplotlib.backend_bases import MouseEvent  # noqa: E402
+
+from src import constants as c, track  # noqa: E402
+from src.event_dispatcher import EventDispatcher  # noqa: E402
+from src.split_segment import SplitSegment, _decimate  # noqa: E402
+
+TEST_PATH = os.path.dirname(__file__)
+
+
+def split_tool() -> SplitSegment:
+    obj_track = track.Track()
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/Innacessible_Island_part1.gpx')
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/Innacessible_Island_part2.gpx')
+
+    fig = plt.figure(figsize=(8, 6), dpi=50)
+    shared_data = types.SimpleNamespace(
+        obj_track=obj_track, fig_track=fig, fig_ele=fig, canvas=fig.canvas,
+        ax_track=fig.add_subplot(2, 1, 1), ax_ele=fig.add_subplot(2, 1, 2),
+        btn_done=widgets.Button(fig.add_axes([0.8, 0.01, 0.1, 0.04]),
+                                '$Done$'))
+    shared_data.dispatcher = EventDispatcher(fig.canvas)
+    tool = SplitSegment(shared_data, obj_track.get_segment(2))
+    tool.connect()
+    return tool
+
+
+def mouse_event(tool: SplitSegment, name: str, distance: float):
+    x, y = tool.ax[1].transData.transform(
+        (distance, sum(tool.ax[1].get_ylim()) / 2))
+    return MouseEvent(name, tool.canvas, x, y, button=1)
+
+
+def test_split_drag(monkeypatch):
+    tool = split_tool()
+    segment = tool.df_segment
+    artists = tool.animated_artists
+    draws = []
+    tool.canvas.mpl_connect('draw_event', draws.append)
+
+    monkeypatch.setattr(c, 'split_max_fps', 1e6)
+    # Split line starts in the second point
+    assert tool.index == segment.index[1]
+    tool.on_press(mouse_event(tool, 'button_press_event',
+                              segment.distance.iloc[1]))
+    assert tool.press is not None
+    for position in [5, 10, 12]:
+        tool.on_motion(mouse_event(tool, 'motion_notify_event',
+                                   segment.distance.iloc[position] + 1e-6))
+        index = segment.index[position + 1]
+        assert tool.index == index
+
+        # Artists are updated in place and blitted without full draws
+        assert tool.animated_artists == artists
+        assert list(tool.ele_line[1].get_xdata()) == \
+            list(segment.distance.loc[index:])
+        assert list(tool.point.get_xdata()) == [segment.lon[index]]
+    assert len(tool.frame_times) == 3
+    assert not draws
+
+    # Events faster than the frame rate are applied on release
+    monkeypatch.setattr(c, 'split_max_fps', 1e-6)
+    tool.on_motion(mouse_event(tool, 'motion_notify_event',
+                               segment.distance.iloc[20] + 1e-6))
+    assert tool.index == segment.index[13]
+    tool.on_release(mouse_event(tool, 'button_release_event',
+                                segment.distance.iloc[20] + 1e-6))
+    assert tool.index == segment.index[21]
+    assert len(tool.frame_times) == 4
+
+    # A one-shot timer shows them if the cursor stops
+    starts = []
+    monkeypatch.setattr(tool.timer, 'start', lambda: starts.append(1))
+    tool.on_press(mouse_event(tool, 'button_press_event',
+                              segment.distance.iloc[21]))
+    for position in (15, 16):
+        tool.on_motion(mouse_event(tool, 'motion_notify_event',
+                                   segment.distance.iloc[position] + 1e-6))
+    assert len(starts) == 1
+    assert tool.index == segment.index[21]
+    tool.on_timer()
+    assert tool.index == segment.index[17]
+    assert len(tool.frame_times) == 5
+    plt.close(tool.shared_data.fig_track)
+
+
+def test_split_cursor(monkeypatch):
+    tool = split_tool()
+    segment = tool.df_segment
+    distance = segment.distance.reset_index(drop=True)
+    monkeypatch.setattr(c, 'split_max_fps', 1e6)
+    press = mouse_event(tool, 'button_press_event', distance.iloc[1])
+    tool.on_press(press)
+
+    # Same point as bisect over the distance, clamped to the segment
+    # without its first point
+    for x in np.linspace(distance.iloc[0], distance.iloc[-1], 50):
+        event = mouse_event(tool, 'motion_notify_event', x)
+        tool.on_motion(event)
+        position = min(max(bisect(distance, distance.iloc[1] +
+                                  event.xdata - press.xdata), 1),
+                       len(segment) - 1)
+        assert tool.index == segment.index[position]
+        assert list(tool.point.get_ydata()) == [segment.lat.iloc[position]]
+    plt.close(tool.shared_data.fig_track)
+
+
+def test_decimate():
+    rng = np.random.default_rng(0)
+    distance = np.cumsum(rng.uniform(size=10000))
+    ele = rng.normal(size=10000)
+    profile = _decimate(distance, ele, 100)
+    assert profile.size <= 400
+    assert profile[0] == 0 and profile[-1] == 9999
+    assert {np.argmin(ele), np.argmax(ele)} <= set(profile)
+    assert np.array_equal(_decimate(distance[:300], ele[:300], 100),
+                          np.arange(300))
+
+
+def test_split_handlers(monkeypatch):
+    tool = split_tool()
+    dispatcher = tool.shared_data.dispatcher
+    btn_done = tool.shared_data.btn_done
+    clicked = []  # callbacks connected to the done button
+    on_clicked = btn_done.on_clicked
+    monkeypatch.setattr(btn_done, 'on_clicked',
+                        lambda func: clicked.append(func) or on_clicked(func))
+    assert dispatcher.handler_count() == 4
+
+    # A new split tool replaces the handlers of the previous one
+    SplitSegment(tool.shared_data, tool.df_segment).connect()
+    assert dispatcher.handler_count() == 4
+
+    # Done button divides once for any number of releases
+    for _ in range(3):
+        tool.on_release(mouse_event(tool, 'button_release_event',
+                                    tool.df_segment.distance.iloc[0]))
+    assert len(clicked) == 1
+    tool.disconnect()
+    assert dispatcher.handler_count() == 0
+    assert tool.cid_done is None
+    plt.close(tool.shared_data.fig_track)
+
+
+def click_done(tool: SplitSegment):
+    # Press and release in the done button, as the canvas does
+    ax_button = tool.shared_data.btn_done.ax
+    x, y = ax_button.transAxes.transform((0.5, 0.5))
+    for name in ('button_press_event', 'button_release_event'):
+        tool.canvas.callbacks.process(
+            name, MouseEvent(name, tool.canvas, x, y, button=1))
+
+
+def test_split_twice(monkeypatch):
+    tool = split_tool()
+    shared_data = tool.shared_data
+    shared_data.scheduler = types.SimpleNamespace(
+        invalidate=lambda *regions, segments=(): None, flush=lambda: None)
+    divisions = []
+    divide_segment = shared_data.obj_track.divide_segment
+    monkeypatch.setattr(
+        shared_data.obj_track, 'divide_segment',
+        lambda *args: divisions.append(args) or divide_segment(*args))
+
+    # Second tool, as the split menu, closes the first one
+    tool.on_release(mouse_event(tool, 'button_release_event',
+                                tool.df_segment.distance.iloc[0]))
+    tool.close()
+    assert tool.point not in shared_data.ax_track.lines
+    second = SplitSegment(shared_data, shared_data.obj_track.get_segment(1))
+    second.connect()
+    second.on_release(mouse_event(second, 'button_release_event',
+                                  second.df_segment.distance.iloc[0]))
+
+    click_done(second)
+    assert divisions == [(1, second.index)]
+    assert second.point not in shared_data.ax_track.lines
+
+    # Done is disabled after the division
+    click_done(second)
+    assert len(divisions) == 1
+    plt.close(shared_data.fig_track)
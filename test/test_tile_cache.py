@@ -0,0 +1,61 @@
+import os
+import time
+
+from src import constants as c, tile_store
+from src.db_handler import DbHandler
+from src.tile_cache import TileCacheManager
+
+
+def write_tile(dbh: DbHandler, zoom: int, x: int, y: int, size: int):
+    os.makedirs(f'tiles/{zoom}/{x}', exist_ok=True)
+    path = f'tiles/{zoom}/{x}/{y}.png'
+    with open(path, 'wb') as tile:
+        tile.write(b'0' * size)
+    dbh.insert_tile(zoom, x, y, True, path, size)
+    time.sleep(0.01)  # distinct access times
+
+
+def test_lru_eviction(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dbh = DbHandler()
+    dbh.open_db()
+    cache = TileCacheManager(dbh, max_bytes=250)
+    for y in range(4):
+        write_tile(dbh, 5, 1, y, 100)
+    dbh.insert_tile(5, 1, 9, False, 'tiles/5/1/9.png', 0)  # failed
+
+    # Oldest tile is used again, next ones are evicted
+    cache.record([(5, 1, 0)], [(5, 2, 0)])
+    assert cache.hit_rate == 0.5
+    assert cache.enforce_budget(keep=[(5, 1, 1)]) == 2
+    assert not os.path.exists('tiles/5/1/2.png')
+    assert os.path.exists('tiles/5/1/0.png')
+    assert dbh.get_tiles_size([(5, 1, y) for y in range(4)]) == \
+        {(5, 1, 0): 100, (5, 1, 1): 100}
+    assert cache.enforce_budget() == 0
+
+    write_tile(dbh, 6, 0, 0, 30)
+    stats = cache.stats()
+    assert stats['by_zoom'] == {5: (3, 200), 6: (1, 30)}
+    assert stats['size'] == 230
+    assert (stats['evictions'], stats['evicted_bytes']) == (2, 200)
+
+    assert cache.clear() == 4
+    assert dbh.get_size_by_zoom() == {}
+    assert not os.listdir('tiles/5/1')
+    dbh.close_db()
+
+
+def test_store_eviction(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(c, 'tile_store_file', 'tiles.mbtiles')
+    store = tile_store.get_store()
+    store.put_tiles([(3, 0, y, b'PNG') for y in range(3)])
+    dbh = DbHandler()
+    dbh.open_db()
+    dbh.insert_tiles([(3, 0, y, True, c.tile_store_file, 3)
+                      for y in range(3)])
+
+    assert TileCacheManager(dbh, max_bytes=4).enforce_budget() == 2
+    assert store.stored_tiles([(3, 0, y) for y in range(3)]) == {(3, 0, 2)}
+    dbh.close_db()
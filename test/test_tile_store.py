@@ -0,0 +1,80 @@
+import os
+import numpy as np
+import matplotlib.image as mpimg
+
+from src import constants as c, plots, tile_store
+from src.db_handler import DbHandler
+from src.image_cache import TileImageCache
+from src.tile_cache import TileCacheManager
+
+
+def write_tiles(zoom: int, xtiles: range, ytiles: range):
+    rng = np.random.default_rng(0)
+    for x in xtiles:
+        os.makedirs(f'tiles/{zoom}/{x}', exist_ok=True)
+        for y in ytiles:
+            mpimg.imsave(f'tiles/{zoom}/{x}/{y}.png',
+                         rng.uniform(size=(16, 16, 3)))
+
+
+def test_migrate(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_tiles(3, range(2), range(5, 7))
+    open('tiles/3/1/7.png', 'w').close()  # failed download
+
+    store = tile_store.TileStore('tiles.mbtiles')
+    assert tile_store.migrate('tiles', store, batch=3) == 4
+    with open('tiles/3/1/6.png', 'rb') as tile:
+        assert store.get(3, 1, 6) == tile.read()
+    assert store.get(3, 1, 7) is None
+
+    # Rows follow TMS scheme
+    assert store.conn.execute('SELECT tile_row FROM tiles WHERE '
+                              'zoom_level=3 AND tile_column=1 ORDER BY '
+                              'tile_row').fetchall() == [(1,), (2,)]
+    assert store.stored_tiles([(3, 0, 5), (3, 0, 7), (4, 0, 5)]) == \
+        {(3, 0, 5)}
+
+    store.remove_tiles([(3, 0, 5)])
+    assert store.get(3, 0, 5) is None
+    store.close()
+
+
+def test_migrate_catalog(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_tiles(3, range(2), range(5, 7))
+    os.utime('tiles/3/0/5.png', (1, 1))  # least recently used
+
+    store = tile_store.TileStore('tiles.mbtiles')
+    assert tile_store.migrate('tiles', store, batch=3,
+                              db_file='catalog.sqlite') == 4
+
+    # Migrated tiles count in the budget and are evicted by access time
+    dbh = DbHandler('catalog.sqlite')
+    dbh.open_db()
+    assert dbh.get_tiles_size([(3, 0, 5), (3, 1, 6)]) == {
+        (3, 0, 5): len(store.get(3, 0, 5)),
+        (3, 1, 6): len(store.get(3, 1, 6))}
+    manager = TileCacheManager(dbh)
+    assert manager.size() == sum(len(store.get(3, x, y)) for x in range(2)
+                                 for y in range(5, 7))
+    assert dbh.get_tiles_by_access(1)[0][:3] == (3, 0, 5)
+    monkeypatch.setattr(c, 'tile_store_file', 'tiles.mbtiles')
+    assert manager.evict(manager.size() - 1) == 1
+    assert store.get(3, 0, 5) is None
+    dbh.close_db()
+    store.close()
+
+
+def test_map_from_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_tiles(7, range(10, 12), range(20, 22))
+    expected = plots.create_map_img((10, 20, 11, 21), 7)
+
+    tile_store.migrate('tiles', tile_store.TileStore('tiles.mbtiles'))
+    monkeypatch.setattr(c, 'tile_store_file', 'tiles.mbtiles')
+    monkeypatch.setattr(plots, 'TILE_IMAGES', TileImageCache())
+    os.rename('tiles', 'old_tiles')
+
+    assert np.array_equal(plots.create_map_img((10, 20, 11, 21), 7),
+                          expected)
@@ -1,8 +1,12 @@
 import pytest
 import os
+import datetime as dt
+import numpy as np
 import pandas as pd
 
-from src import track
+from src import gpx, track
+
+TEST_PATH = os.path.dirname(__file__)
 
 
 def test_divide_segment():
@@ -28,3 +32,279 @@ def test_divide_segment():
     assert obj_track.track.segment.iloc[24] == 2
     assert obj_track.track.segment.iloc[34] == 3
     assert obj_track.track.segment.iloc[47] == 4
+
+
+def load_island(parts: int = 5) -> track.Track:
+    obj_track = track.Track()
+    for i in range(1, parts + 1):
+        obj_track.add_gpx(
+            f'{TEST_PATH}/test_cases/Innacessible_Island_part{i}.gpx')
+    return obj_track
+
+
+def assert_full_summary(obj_track: track.Track):
+    # Incremental summary must match a full recomputation
+    summary = (obj_track.total_distance, obj_track.total_uphill,
+               obj_track.total_downhill, obj_track.extremes)
+    columns = obj_track.df_track[['distance', 'ele_pos_cum',
+                                  'ele_neg_cum']].copy()
+
+    obj_track._update_summary()
+
+    assert summary == (obj_track.total_distance, obj_track.total_uphill,
+                       obj_track.total_downhill, obj_track.extremes)
+    pd.testing.assert_frame_equal(
+        columns, obj_track.df_track[['distance', 'ele_pos_cum',
+                                     'ele_neg_cum']])
+
+
+def test_summary_totals():
+    obj_track = load_island()
+    assert obj_track.total_distance == pytest.approx(12.121018)
+    assert obj_track.total_uphill == pytest.approx(909.72)
+    assert obj_track.total_downhill == pytest.approx(-897.31)
+
+
+def test_incremental_summary():
+    obj_track = load_island()
+    cached = dict(obj_track._segment_summary)
+
+    # Only reversed segment is recomputed
+    obj_track.reverse_segment(3)
+    for seg_id in (1, 2, 4, 5):
+        assert obj_track._segment_summary[seg_id] is cached[seg_id]
+    assert obj_track._segment_summary[3] is not cached[3]
+    assert_full_summary(obj_track)
+
+    cached = dict(obj_track._segment_summary)
+    obj_track.change_order({1: 2, 2: 1, 3: 3, 4: 5, 5: 4})
+    assert obj_track._segment_summary[1] is cached[2]
+    assert_full_summary(obj_track)
+
+    obj_track.remove_segment(4)
+    assert 4 not in obj_track._segment_summary
+    assert_full_summary(obj_track)
+
+
+def test_empty_gpx(tmp_path):
+    obj_track = load_island(2)
+    empty = tmp_path / 'empty.gpx'
+    empty.write_text('<?xml version="1.0"?>\n<gpx version="1.1">'
+                     '<trk><trkseg></trkseg></trk></gpx>')
+
+    # Files without points are rejected before the track is modified
+    with pytest.raises(gpx.LoadGpxError):
+        obj_track.add_gpx(str(empty))
+    assert obj_track.segment_ids == [1, 2]
+    assert obj_track.size == 2
+
+    summary = track.SegmentSummary(*[np.empty(0)] * 3)
+    assert (summary.distance, summary.uphill, summary.downhill) == (0, 0, 0)
+
+
+def test_divide_segment_bounds():
+    obj_track = load_island(2)
+    start, end = obj_track.get_segment_bounds(2)
+    summary = obj_track.total_distance
+
+    # Division points must leave points in both segments
+    for div_index in (start, end, start - 1, end + 10):
+        assert not obj_track.divide_segment(2, div_index)
+        assert obj_track.segment_ids == [1, 2]
+        assert obj_track.total_distance == summary
+    assert obj_track.divide_segment(2, start + 1)
+    assert obj_track.segment_ids == [1, 2, 3]
+
+
+def test_columnar_segment_operations():
+    obj_track = load_island(3)
+    df_initial = obj_track.df_track.copy()
+    part2 = obj_track.get_segment(2)
+    assert list(part2.index) == list(range(24, 47))
+
+    obj_track.reverse_segment(2)
+    assert obj_track.get_segment(2).lat.tolist() == part2.lat.tolist()[::-1]
+
+    obj_track.change_order({1: 3, 2: 1, 3: 2})
+    assert obj_track.df_track.segment.unique().tolist() == [1, 2, 3]
+    assert obj_track.get_segment(3).lat.tolist() == \
+        df_initial[df_initial.segment == 1].lat.tolist()
+
+    obj_track.remove_segment(1)
+    assert obj_track.df_track.shape[0] == df_initial.shape[0] - 23
+    assert obj_track.get_segment(1).shape[0] == 0
+    assert_full_summary(obj_track)
+
+
+def test_df_track_setter():
+    obj_track = load_island(3)
+    obj_track.divide_segment(2, 30)
+    df_track = obj_track.df_track.copy()
+
+    session_track = track.Track()
+    session_track.df_track = df_track
+    pd.testing.assert_frame_equal(session_track.df_track, df_track)
+    assert session_track.total_distance == obj_track.total_distance
+
+
+def test_session_add_gpx():
+    obj_track = load_island(3)
+    obj_track.divide_segment(2, 30)
+
+    # Same steps as load_session, then a new file
+    session_track = track.Track()
+    session_track.df_track = obj_track.df_track.copy()
+    session_track.loaded_files = list(obj_track.loaded_files)
+    assert session_track.size == 4
+    session_track.add_gpx(
+        f'{TEST_PATH}/test_cases/Innacessible_Island_part4.gpx')
+
+    assert session_track.segment_ids == [1, 2, 3, 4, 5]
+    assert session_track.size == 5
+    assert_segment_index(session_track)
+    assert_full_summary(session_track)
+    reference = load_island(4)
+    assert session_track.total_distance == \
+        pytest.approx(reference.total_distance)
+
+
+def assert_segment_index(obj_track: track.Track):
+    # Segment index must match a scan of the segment column
+    df_track = obj_track.df_track
+    assert obj_track.segment_ids == df_track.segment.unique().tolist()
+    for seg_id in obj_track.segment_ids:
+        rows = df_track.index[df_track.segment == seg_id]
+        assert obj_track.get_segment_bounds(seg_id) == \
+            (rows[0], rows[-1] + 1)
+        pd.testing.assert_frame_equal(obj_track.get_segment(seg_id),
+                                      df_track[df_track.segment == seg_id],
+                                      check_index_type=False)
+
+
+def test_segment_index():
+    obj_track = load_island(4)
+    assert_segment_index(obj_track)
+
+    obj_track.divide_segment(2, 30)
+    assert obj_track.segment_ids == [1, 2, 3, 4, 5]
+    assert obj_track.get_segment_bounds(3) == (30, 47)
+    assert_segment_index(obj_track)
+
+    obj_track.change_order({1: 5, 2: 4, 3: 3, 4: 2, 5: 1})
+    assert_segment_index(obj_track)
+
+    obj_track.remove_segment(3)
+    assert obj_track.get_segment_bounds(3) == (0, 0)
+    assert_segment_index(obj_track)
+
+
+def test_insert_timestamp():
+    obj_track = load_island(3)
+    initial_time = dt.datetime(2020, 1, 1, 8, 0, 0)
+
+    # Constant speed as timedelta from cumulative distance
+    obj_track.insert_timestamp(initial_time, 10)
+    expected = obj_track.df_track.apply(
+        lambda row: initial_time + dt.timedelta(hours=row['distance'] / 10),
+        axis=1)
+    elapsed = obj_track.df_track.time - pd.to_datetime(expected)
+    assert elapsed.abs().max() <= pd.Timedelta(1, 'us')
+
+    # Speed by segment
+    obj_track.insert_timestamp(initial_time, {1: 10, 2: 5, 3: 10})
+    step = np.diff(obj_track.df_track.time.to_numpy()) / \
+        np.timedelta64(1, 'h')
+    distance = np.diff(obj_track.df_track.distance.to_numpy(dtype=float))
+    assert np.allclose(distance[30:40] / step[30:40], 5)
+    assert np.allclose(distance[1:20] / step[1:20], 10)
+
+    # Grade dependent models are slower than constant speed in this track
+    for model in ('tobler', 'naismith'):
+        obj_track.insert_timestamp(initial_time, 10, model=model)
+        assert obj_track.df_track.time.iloc[-1] > \
+            initial_time + dt.timedelta(hours=obj_track.total_distance / 10)
+
+
+def test_fix_elevation():
+    from src import utils
+
+    # Segment which does not start at first point of the track
+    obj_track = load_island(1)
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/nominal_route.gpx')
+    start, end = obj_track.get_segment_bounds(2)
+    ele = obj_track.get_segment(2).ele.to_numpy()
+    distance = obj_track.get_segment(2).distance.to_numpy(dtype=float)
+    segment_1 = obj_track.get_segment(1).copy()
+    uphill = obj_track.total_uphill
+
+    obj_track.fix_elevation(2)
+    fixed = obj_track.get_segment(2).ele.to_numpy()
+    pd.testing.assert_frame_equal(obj_track.get_segment(1), segment_1)
+    assert obj_track.total_uphill < uphill
+    assert_full_summary(obj_track)
+
+    # First steep zone matches a cubic fitted by numpy
+    steep = track.Track._steep_mask(ele, distance - distance[0])
+    zone_start, zone_end = utils.mask_runs(steep)
+    r, f = zone_start[0], zone_end[0]
+    x = [i for i in [*range(r - 11, r - 1), *range(f, f + 10)]
+         if not steep[i]]
+    coef = np.polyfit(x, ele[x], 3)
+    assert np.allclose(fixed[r - 2:f], np.polyval(coef, range(r - 2, f)))
+    assert np.array_equal(fixed[:r - 2], ele[:r - 2])
+
+
+def test_smooth_elevation():
+    obj_track = load_island(2)
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/nominal_route.gpx')
+    segment_1 = obj_track.get_segment(1).copy()
+
+    report = obj_track.compare_elevation_filters()
+    assert report['original'] == (obj_track.total_uphill,
+                                  obj_track.total_downhill)
+
+    obj_track.smooth_elevation(3, method='kalman')
+    pd.testing.assert_frame_equal(obj_track.get_segment(1), segment_1)
+    assert obj_track.total_uphill < report['original'][0]
+    assert_full_summary(obj_track)
+
+
+def test_segment_lod():
+    obj_track = load_island(1)
+    obj_track.add_gpx(f'{TEST_PATH}/test_cases/nominal_route.gpx')
+    segment = obj_track.get_segment(2)
+
+    lat_coarse, _ = obj_track.get_segment_lod(2, 10)
+    lat_fine, lon_fine = obj_track.get_segment_lod(2, 18)
+    assert 2 < lat_coarse.size < lat_fine.size < len(segment)
+    assert (lat_fine[0], lon_fine[-1]) == \
+        (segment.lat.iloc[0], segment.lon.iloc[-1])
+    assert set(lat_coarse) <= set(lat_fine)
+
+    # Levels are cached until the segment is modified
+    summary = obj_track._segment_summary[2]
+    assert set(summary.lod) == {10, 18}
+    obj_track.reverse_segment(2)
+    lat_reversed, _ = obj_track.get_segment_lod(2, 18)
+    assert obj_track._segment_summary[2].lod.keys() == {18}
+    assert lat_reversed[0] == segment.lat.iloc[-1]
+
+
+def test_closest_point():
+    import geopy.distance
+    obj_track = load_island(3)
+    df_track = obj_track.df_track.copy()
+    query = (-37.30, -12.68)
+
+    distance, seg_id, point = obj_track.closest_point(*query)
+    reference = [geopy.distance.geodesic((lat, lon), query).km
+                 for lat, lon in zip(df_track.lat, df_track.lon)]
+    assert point == np.argmin(reference)
+    assert distance == pytest.approx(min(reference))
+    assert seg_id == df_track.segment[point]
+    pd.testing.assert_frame_equal(obj_track.df_track, df_track)
+
+    # Index is rebuilt after a modification
+    obj_track.remove_segment(seg_id)
+    assert obj_track.closest_point(*query)[1] != seg_id
+    assert track.Track().closest_point(*query) == (np.inf, 0, -1)